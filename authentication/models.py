@@ -1,3 +1,80 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.signals import post_save, m2m_changed
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from django.utils import timezone
 
-# Create your models here.
+
+class ChangeMarkerManager(models.Manager):
+    def bump(self, user_id, scopes, using=None):
+        """
+        Marks the list responses of the user in `scopes` as changed.
+        """
+        if user_id is None:
+            return
+        self.db_manager(using).filter(user_id=user_id, scope__in=scopes) \
+            .update(version=F('version') + 1, updated_at=timezone.now())
+
+    def get_markers(self, user_id, scopes):
+        """
+        Returns (scope, version, updated_at) of each of `scopes`. Markers are stored along with their user, the
+        missing ones (e.g. of a scope added later) are stored here.
+        """
+        markers = {scope: (version, updated_at) for scope, version, updated_at
+                   in self.filter(user_id=user_id, scope__in=scopes).values_list('scope', 'version', 'updated_at')}
+        for scope in scopes:
+            if scope not in markers:
+                try:
+                    with transaction.atomic():
+                        marker = self.create(user_id=user_id, scope=scope)
+                except IntegrityError:
+                    # stored concurrently in the meantime
+                    marker = self.get(user_id=user_id, scope=scope)
+                markers[scope] = (marker.version, marker.updated_at)
+
+        return [(scope,) + markers[scope] for scope in scopes]
+
+
+class ChangeMarker(models.Model):
+    """
+    Per-user version of the data rendered by the user-scoped list endpoints, bumped by every write to it.
+    Conditional GETs compare it instead of running the list queries.
+    """
+    CATEGORIES = 'categories'
+    TAGS = 'tags'
+    RESOURCES = 'resources'
+    EVENTS = 'events'
+    SCOPES = (CATEGORIES, TAGS, RESOURCES, EVENTS)
+
+    user = models.ForeignKey(User, related_name='change_markers')
+    scope = models.CharField(max_length=20)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ChangeMarkerManager()
+
+    def __str__(self):
+        return '{0} {1}: {2}'.format(self.user.username, self.scope, self.version)
+
+    class Meta:
+        unique_together = ('user', 'scope')
+
+
+@receiver(post_save, sender=User)
+def bump_user_markers(sender, instance, created, update_fields, using, raw, **kwargs):
+    if created and not raw:
+        ChangeMarker.objects.db_manager(using).bulk_create([ChangeMarker(user=instance, scope=scope)
+                                                             for scope in ChangeMarker.SCOPES])
+    # every list nests the user, but logins only update last_login
+    elif update_fields is None or {'username', 'email'} & set(update_fields):
+        ChangeMarker.objects.bump(instance.id, ChangeMarker.SCOPES, using=using)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def bump_user_groups_markers(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    user_ids = (pk_set or ()) if reverse else (instance.id,)
+    for user_id in user_ids:
+        ChangeMarker.objects.bump(user_id, ChangeMarker.SCOPES, using=using)
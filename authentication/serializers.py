@@ -1,8 +1,18 @@
 from django.contrib.auth.models import User, Group
 from rest_framework import serializers
+from ppbudget.fieldsets import FULL, SparseFieldsetMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    @staticmethod
+    def setup_eager_loading(queryset, fieldset=FULL, prefix=''):
+        """
+        Loads what the users at the `prefix` lookup path of the queryset objects render with `fieldset` need.
+        """
+        if fieldset.includes('groups'):
+            queryset = queryset.prefetch_related(prefix + 'groups')
+        return queryset
+
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'groups')
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 08:27
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def break_cycles(Category, parents):
+    # the previous circular reference check let a category become its own parent, or the ancestor of its parent
+    # when that parent was a root; the category of the lowest id in each cycle becomes a root again
+    for category_id in sorted(parents):
+        walk, visited = [], set()
+        ancestor_id = category_id
+        while ancestor_id is not None and ancestor_id not in visited:
+            walk.append(ancestor_id)
+            visited.add(ancestor_id)
+            ancestor_id = parents[ancestor_id]
+        if ancestor_id is not None:
+            root_id = min(walk[walk.index(ancestor_id):])
+            parents[root_id] = None
+            Category.objects.filter(id=root_id).update(parent=None, root_node=True)
+
+
+def build_closure(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+    CategoryClosure = apps.get_model('categories', 'CategoryClosure')
+
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    break_cycles(Category, parents)
+    paths = []
+    for category_id in parents:
+        ancestor_id, depth = category_id, 0
+        while ancestor_id is not None:
+            paths.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+
+    CategoryClosure.objects.bulk_create(paths, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0004_auto_20160515_1154'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_paths', to='categories.Category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_paths', to='categories.Category')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='categoryclosure',
+            unique_together=set([('ancestor', 'descendant')]),
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
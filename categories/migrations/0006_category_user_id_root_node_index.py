@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 08:52
+from __future__ import unicode_literals
+
+from django.db import migrations
+from ppbudget import schema
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0005_categoryclosure'),
+    ]
+
+    operations = [
+        # Django 1.9 cannot declare descending index columns
+        schema.run_sql('categories_category_user_id_root_node_event_type_name'),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.db.models.deletion import ProtectedError
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from authentication.models import ChangeMarker
 from dictionaries.models import EventType
 from rest_framework import exceptions
 
@@ -15,6 +18,12 @@ class Category(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Category, cls).from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
+
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
         if self.parent:
@@ -22,7 +31,29 @@ class Category(models.Model):
         else:
             self.root_node = True
 
-        return super(Category, self).save(force_insert, force_update, using, update_fields)
+        adding = self._state.adding
+        with transaction.atomic(using=using):
+            super(Category, self).save(force_insert, force_update, using, update_fields)
+
+            if adding:
+                CategoryClosure.objects.db_manager(using).insert_node(self)
+            elif self.parent_id != getattr(self, '_loaded_parent_id', self.parent_id):
+                CategoryClosure.objects.db_manager(using).move_subtree(self)
+
+        self._loaded_parent_id = self.parent_id
+
+    def get_descendants(self, include_self=True):
+        """
+        Returns the whole subtree of the category as a single query over the closure table.
+        """
+        return Category.objects.filter(ancestor_paths__ancestor=self,
+                                       ancestor_paths__depth__gte=0 if include_self else 1)
+
+    def is_descendant_of(self, category, include_self=True):
+        paths = CategoryClosure.objects.filter(ancestor=category, descendant=self)
+        if not include_self:
+            paths = paths.filter(depth__gt=0)
+        return paths.exists()
 
     def delete(self, using=None, keep_parents=False):
         try:
@@ -36,3 +67,52 @@ class Category(models.Model):
 
     class Meta:
         unique_together = ('user', 'name', 'event_type')
+
+
+class CategoryClosureManager(models.Manager):
+    def insert_node(self, category):
+        ancestors = self.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth')
+        self.bulk_create(
+            [CategoryClosure(ancestor_id=category.id, descendant_id=category.id, depth=0)] +
+            [CategoryClosure(ancestor_id=ancestor_id, descendant_id=category.id, depth=depth + 1)
+             for ancestor_id, depth in ancestors]
+        )
+
+    def move_subtree(self, category):
+        subtree = list(self.filter(ancestor_id=category.id).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+        self.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+        ancestors = self.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth')
+        self.bulk_create([
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id,
+                            depth=ancestor_depth + 1 + descendant_depth)
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, descendant_depth in subtree
+        ])
+
+
+class CategoryClosure(models.Model):
+    """
+    Ancestor/descendant index of the category tree: one row for every category and each of its ancestors,
+    including the category itself with depth 0. Maintained by Category.save, rows of deleted categories are
+    removed by cascade. Bulk updates of Category.parent bypass it.
+    """
+    ancestor = models.ForeignKey(Category, related_name='descendant_paths', on_delete=models.CASCADE)
+    descendant = models.ForeignKey(Category, related_name='ancestor_paths', on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField()
+
+    objects = CategoryClosureManager()
+
+    def __str__(self):
+        return '{0} > {1} ({2})'.format(self.ancestor.name, self.descendant.name, self.depth)
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_markers(sender, instance, using, **kwargs):
+    ChangeMarker.objects.bump(instance.user_id, (ChangeMarker.CATEGORIES,), using=using)
@@ -5,7 +5,7 @@ from categories.models import Category
 class IsCategoryOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, category: Category):
         if request.user:
-            return category.user == request.user
+            return category.user_id == request.user.id
         return False
 
 
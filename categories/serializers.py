@@ -1,9 +1,10 @@
 from rest_framework import serializers
+from ppbudget.fieldsets import FULL, SparseFieldsetMixin
 from authentication.serializers import UserSerializer
 from categories.models import Category
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True, required=False, default=serializers.CurrentUserDefault())
     children = serializers.SerializerMethodField()
 
@@ -20,26 +21,21 @@ class CategorySerializer(serializers.ModelSerializer):
         if 'parent' in data and data['parent'] and data['parent'].event_type != data['event_type']:
             raise serializers.ValidationError('Parent category event type does not match.')
 
-        if self.instance and 'parent' in data and data['parent'] and \
-                self.__is_circular_reference__(self.instance.id, data['parent']):
+        if self.instance and 'parent' in data and data['parent'] and data['parent'].is_descendant_of(self.instance):
             raise serializers.ValidationError('Circular references are prohibited.')
 
         return super(CategorySerializer, self).validate(data)
 
+    @staticmethod
+    def setup_eager_loading(queryset, fieldset=FULL, prefix=''):
+        if fieldset.expands('user'):
+            queryset = UserSerializer.setup_eager_loading(queryset.select_related(prefix + 'user'),
+                                                          fieldset.child('user'), prefix + 'user__')
+        return queryset
+
     def get_children(self, obj):
-        children = self.instance.filter(parent=obj.id)
-        if children.exists():
-            return [child.id for child in children.all()]
-        else:
-            return []
-
-    def __is_circular_reference__(self, category_id, new_parent):
-        if not new_parent.parent:
-            return False
-        elif new_parent.id == category_id or new_parent.parent.id == category_id:
-            return True
-        else:
-            return self.__is_circular_reference__(category_id, new_parent.parent)
+        # the children map is built once for the whole list by the view, see categories.tree.children_map
+        return list(self.context['children'].get(obj.id, []))
 
     class Meta:
         model = Category
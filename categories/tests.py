@@ -1,9 +1,10 @@
 from django.contrib.auth.models import User
 from dictionaries.models import EventType
-from categories.models import Category
+from categories.models import Category, CategoryClosure
 from categories.views import CategoryViewSet
 from rest_framework import status
 from rest_framework.test import APITestCase
+from ppbudget.testing import QueryBudgetMixin
 
 
 class TagTestCase(APITestCase):
@@ -322,3 +323,155 @@ class TagTestCase(APITestCase):
         self.assertIsNone(response.data)
         # test model
         self.assertFalse(CategoryViewSet.queryset.filter(id=test_category.id).exists())
+
+
+class CategoryTreeTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        food = Category.objects.create(user=test_user, name='food', event_type=EventType.EXPENSE)
+        groceries = Category.objects.create(user=test_user, parent=food, name='groceries',
+                                            event_type=EventType.EXPENSE)
+        Category.objects.create(user=test_user, parent=groceries, name='fruit', event_type=EventType.EXPENSE)
+        Category.objects.create(user=test_user, parent=food, name='restaurants', event_type=EventType.EXPENSE)
+        Category.objects.create(user=test_user, name='salary', event_type=EventType.INCOME)
+
+        self.client.force_login(test_user)
+
+    def get_tree(self, query=''):
+        url = '/api/v1/users/test_user/categories/' + query
+
+        return self.client.get(url)
+
+    def test_get_tree(self):
+        response = self.get_tree()
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals([category['name'] for category in response.data], ['food', 'salary'])
+        self.assertEquals([category['name'] for category in response.data[0]['children']],
+                          ['groceries', 'restaurants'])
+        self.assertEquals(response.data[0]['children'][0]['children'][0]['name'], 'fruit')
+        self.assertEquals(response.data[0]['children'][0]['children'][0]['children'], [])
+        self.assertEquals(response.data[1]['children'], [])
+
+    def test_get_tree_queries(self):
+        def grow():
+            parent = Category.objects.get(name='fruit')
+            for level in range(20):
+                parent = Category.objects.create(user=parent.user, parent=parent, name='level_' + str(level),
+                                                 event_type=EventType.EXPENSE)
+
+        # session, user, change marker, categories, user groups
+        self.assertConstantQueries(5, self.get_tree, grow)
+
+    def test_get_subtree(self):
+        groceries = Category.objects.get(name='groceries')
+
+        response = self.get_tree('?root=' + str(groceries.id))
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(response.data), 1)
+        self.assertEquals(response.data[0]['name'], 'groceries')
+        self.assertEquals(response.data[0]['children'][0]['name'], 'fruit')
+
+    def test_get_tree_depth(self):
+        response = self.get_tree('?depth=2')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        groceries = response.data[0]['children'][0]
+        self.assertEquals(groceries['name'], 'groceries')
+        self.assertEquals(groceries['children'], [Category.objects.get(name='fruit').id])
+
+    def test_get_tree_fields(self):
+        with self.assertMaxQueries(4):
+            response = self.get_tree('?fields=name,children&expand=')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data[0], {'name': 'food', 'children': [
+            {'name': 'groceries', 'children': [{'name': 'fruit', 'children': []}]},
+            {'name': 'restaurants', 'children': []}
+        ]})
+
+        response = self.get_tree('?fields=name')
+        self.assertEquals(response.data, [{'name': 'food'}, {'name': 'salary'}])
+
+    def test_get_tree_invalid_params(self):
+        other_user = User.objects.create(username='other_user')
+        other_category = Category.objects.create(user=other_user, name='other', event_type=EventType.EXPENSE)
+
+        self.assertEquals(self.get_tree('?depth=0').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(self.get_tree('?root=abc').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(self.get_tree('?root=' + str(other_category.id)).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CategoryClosureTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        food = Category.objects.create(user=test_user, name='food', event_type=EventType.EXPENSE)
+        groceries = Category.objects.create(user=test_user, parent=food, name='groceries',
+                                            event_type=EventType.EXPENSE)
+        Category.objects.create(user=test_user, parent=groceries, name='fruit', event_type=EventType.EXPENSE)
+        Category.objects.create(user=test_user, name='home', event_type=EventType.EXPENSE)
+
+    def assertPaths(self, name, ancestors):
+        paths = CategoryClosure.objects.filter(descendant__name=name).order_by('depth')
+        self.assertEquals([(path.ancestor.name, path.depth) for path in paths], ancestors)
+
+    def test_create_paths(self):
+        self.assertPaths('food', [('food', 0)])
+        self.assertPaths('fruit', [('fruit', 0), ('groceries', 1), ('food', 2)])
+        self.assertEquals(set(Category.objects.get(name='food').get_descendants().values_list('name', flat=True)),
+                          {'food', 'groceries', 'fruit'})
+        self.assertEquals(list(Category.objects.get(name='food').get_descendants(include_self=False)
+                               .order_by('name').values_list('name', flat=True)), ['fruit', 'groceries'])
+
+    def test_reparent_paths(self):
+        groceries = Category.objects.get(name='groceries')
+        groceries.parent = Category.objects.get(name='home')
+        groceries.save()
+
+        self.assertPaths('groceries', [('groceries', 0), ('home', 1)])
+        self.assertPaths('fruit', [('fruit', 0), ('groceries', 1), ('home', 2)])
+        self.assertEquals(Category.objects.get(name='food').get_descendants().count(), 1)
+
+        groceries.parent = None
+        groceries.save()
+
+        self.assertPaths('fruit', [('fruit', 0), ('groceries', 1)])
+
+    def test_delete_paths(self):
+        fruit = Category.objects.get(name='fruit')
+        fruit_id = fruit.id
+
+        fruit.delete()
+
+        self.assertFalse(CategoryClosure.objects.filter(descendant_id=fruit_id).exists())
+        self.assertPaths('groceries', [('groceries', 0), ('food', 1)])
+
+    def test_patch_circular_reference_queries(self):
+        user = User.objects.get(username='test_user')
+        food = Category.objects.get(name='food')
+        parent = Category.objects.get(name='fruit')
+        for level in range(10):
+            parent = Category.objects.create(user=user, parent=parent, name='level_' + str(level),
+                                             event_type=EventType.EXPENSE)
+        url = '/api/v1/categories/' + str(food.id) + '/'
+
+        self.client.force_login(user)
+        # session, user, category, its user groups, parent, unique check, parent user, cycle check
+        with self.assertMaxQueries(8):
+            response = self.client.patch(url, {'parent': parent.id})
+
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Circular references are prohibited.', response.data['non_field_errors'])
+        self.assertIsNone(Category.objects.get(id=food.id).parent)
+
+    def test_patch_parent(self):
+        user = User.objects.get(username='test_user')
+        groceries = Category.objects.get(name='groceries')
+        url = '/api/v1/categories/' + str(groceries.id) + '/'
+
+        self.client.force_login(user)
+        response = self.client.patch(url, {'parent': Category.objects.get(name='home').id})
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertPaths('fruit', [('fruit', 0), ('groceries', 1), ('home', 2)])
@@ -0,0 +1,26 @@
+from collections import OrderedDict
+
+
+def children_map(categories):
+    """
+    Maps every category id to the ids of its children, keeping the order in which `categories` are given.
+    """
+    children = OrderedDict((category.id, []) for category in categories)
+    for category in categories:
+        if category.parent_id in children:
+            children[category.parent_id].append(category.id)
+    return children
+
+
+def breadth_first(root_ids, children, max_depth=None):
+    """
+    Yields (category id, depth) for the subtrees under `root_ids` level by level, roots having depth 1.
+    Iterative, so arbitrarily deep trees cannot hit the recursion limit.
+    """
+    level, depth = list(root_ids), 1
+    while level and (max_depth is None or depth <= max_depth):
+        next_level = []
+        for category_id in level:
+            yield category_id, depth
+            next_level.extend(children.get(category_id, ()))
+        level, depth = next_level, depth + 1
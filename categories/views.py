@@ -1,11 +1,16 @@
-from rest_framework import permissions, viewsets
+from rest_framework import exceptions, permissions, viewsets
+from ppbudget.conditional import conditional_list
+from ppbudget.fieldsets import SparseFieldsetViewMixin, fieldset_param
+from ppbudget.params import positive_int_param
+from authentication.models import ChangeMarker
 from categories.models import Category
 from categories.serializers import CategorySerializer
 from categories.permissions import IsCategoryOwner, IsCategoriesOwner
+from categories.tree import children_map, breadth_first
 from rest_framework.response import Response
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Category.objects.order_by('user', '-root_node', 'event_type', 'name')
     serializer_class = CategorySerializer
 
@@ -27,25 +32,58 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
 
 class UserCategoriesViewSet(viewsets.ViewSet):
-    queryset = Category.objects.select_related('user').all()
+    queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
     def get_permissions(self):
         if self.request.method in permissions.SAFE_METHODS:
             return permissions.IsAuthenticated(), IsCategoriesOwner(),
 
+    @conditional_list(ChangeMarker.CATEGORIES, cache=True)
     def list(self, request, user_username=None):
-        queryset = self.queryset.filter(user__username=user_username).order_by('-root_node', 'event_type', 'name')
-        serializer = self.serializer_class(queryset, many=True, with_children=True)
+        """
+        Returns the category tree of the user. `?root=<id>` limits it to one subtree and `?depth=<n>` to n levels,
+        the categories on the last level then list the ids of their children instead of nesting them. Without
+        `children` in `?fields=` only the top categories are listed.
+        """
+        root = positive_int_param(request, 'root')
+        depth = positive_int_param(request, 'depth')
+        fieldset = fieldset_param(request)
 
-        lookup = {category['id']: category for category in serializer.data}
-        tree = [self.__fill_children__(category, lookup) for category in serializer.data if category['root_node']]
+        queryset = self.serializer_class.setup_eager_loading(self.queryset, fieldset) \
+            .filter(user__username=user_username).order_by('-root_node', 'event_type', 'name')
+        if root is not None or depth is not None:
+            # one level more than requested, so the last level can list the ids of its children
+            paths = {'ancestor_paths__ancestor_id': root} if root is not None else \
+                {'ancestor_paths__ancestor__root_node': True}
+            if depth is not None:
+                paths['ancestor_paths__depth__lte'] = depth
+            queryset = queryset.filter(**paths)
 
-        return Response(tree)
+        categories = list(queryset)
+        children = children_map(categories)
+
+        if root is None:
+            root_ids = [category.id for category in categories if category.root_node]
+        elif root in children:
+            root_ids = [root]
+        else:
+            raise exceptions.NotFound()
 
-    def __fill_children__(self, category, lookup):
-        if len(category['children']) > 0:
-            category['children'] = [self.__fill_children__(lookup[child_id], lookup)
-                                    for child_id in category['children']]
+        depths = dict(breadth_first(root_ids, children, depth))
+        # the tree is assembled by the ids and children, they are removed afterwards unless requested
+        serializer = self.serializer_class([category for category in categories if category.id in depths],
+                                           many=True, with_children=True, context={'children': children},
+                                           fieldset=fieldset.including('id', 'children'))
 
-        return category
+        lookup = {category['id']: category for category in serializer.data}
+        for category in lookup.values():
+            if depth is None or depths[category['id']] < depth:
+                category['children'] = [lookup[child_id] for child_id in category['children']]
+
+        tree = [lookup[category_id] for category_id in root_ids]
+        for name in ('id', 'children'):
+            if not fieldset.includes(name):
+                for category in (lookup.values() if name == 'id' else tree):
+                    del category[name]
+        return Response(tree)
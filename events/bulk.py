@@ -0,0 +1,92 @@
+from collections import defaultdict
+from django.db import NotSupportedError, connection, transaction
+from authentication.models import ChangeMarker
+from reports.models import MonthlyTotal
+from events.models import Resource, Event, Operation, BalanceCheckpoint, RecurringEvent
+from events.recurrence import pending_dates
+
+
+@transaction.atomic
+def create_events(user, events_data):
+    """
+    Creates events with their tags and operations using one bulk insert per table.
+
+    `events_data` items hold `description`, `event_type`, `event_date`, `category`, `tags` (Tag instances) and
+    `operations` (dicts with a Resource `resource` and a `flow`), optionally the RecurringEvent `recurring_event`
+    they are occurrences of. Balances are adjusted once per resource.
+    """
+    events = [Event(user=user, description=event['description'], event_type=event['event_type'],
+                    event_date=event['event_date'], category=event['category'],
+                    recurring_event=event.get('recurring_event')) for event in events_data]
+    Event.objects.bulk_create(events)
+    _set_ids(user, events)
+
+    Event.tags.through.objects.bulk_create([
+        Event.tags.through(event_id=event.id, tag_id=tag.id)
+        for event, data in zip(events, events_data) for tag in set(data.get('tags', []))
+    ])
+
+    operations = [Operation(event=event, resource=operation['resource'], flow=operation['flow'],
+                            event_date=event.event_date)
+                  for event, data in zip(events, events_data) for operation in data['operations']]
+    Operation.objects.bulk_create(operations)
+
+    # bulk_create bypasses Operation.save, apply the flows with one update per resource, report total and
+    # checkpointed month instead
+    deltas = defaultdict(int)
+    report_deltas = defaultdict(lambda: (0, 0))
+    checkpoint_deltas = defaultdict(int)
+    for operation in operations:
+        deltas[operation.resource_id] += operation.flow
+        flow, count = report_deltas[operation.event.report_key]
+        report_deltas[operation.event.report_key] = (flow + operation.flow, count + 1)
+        checkpoint_deltas[(operation.resource_id, operation.event_date)] += operation.flow
+    Resource.adjust_balances(deltas)
+    MonthlyTotal.objects.apply_deltas(report_deltas)
+    BalanceCheckpoint.objects.shift(checkpoint_deltas)
+    ChangeMarker.objects.bump(user.id, (ChangeMarker.EVENTS, ChangeMarker.RESOURCES))
+
+    return events
+
+
+@transaction.atomic
+def materialize_occurrences(recurring_event_id, until):
+    """
+    Stores the occurrences of the recurring event dated up to `until` that are not stored yet as events, with
+    create_events. Returns the number of stored events.
+    """
+    # concurrent runs wait for each other, so every occurrence is stored once
+    recurring_event = RecurringEvent.objects.select_for_update().select_related('user', 'category') \
+        .get(id=recurring_event_id)
+    if recurring_event.materialized_until is not None and recurring_event.materialized_until >= until:
+        return 0
+
+    dates = list(pending_dates(recurring_event, until))
+    if dates:
+        tags = list(recurring_event.tags.all())
+        operations = [{'resource': flow.resource, 'flow': flow.flow}
+                      for flow in recurring_event.flows.select_related('resource')]
+        create_events(recurring_event.user, [{
+            'description': recurring_event.description, 'event_type': recurring_event.event_type,
+            'event_date': event_date, 'category': recurring_event.category, 'tags': tags,
+            'operations': operations, 'recurring_event': recurring_event
+        } for event_date in dates])
+
+    recurring_event.materialized_until = until
+    recurring_event.save(update_fields=['materialized_until'])
+    return len(dates)
+
+
+def _set_ids(user, events):
+    # set by bulk_create on backends returning the ids of a bulk insert
+    if all(event.pk is not None for event in events):
+        return
+
+    # Without them, read back the newest ids of the user. The insert holds the write lock of SQLite until the
+    # transaction ends, so no other event can be created in between; elsewhere the ids could be wrong.
+    if connection.vendor != 'sqlite':
+        raise NotSupportedError('Bulk inserted event ids are only read back on SQLite, {0} returns none.'.format(
+            connection.vendor))
+    ids = Event.objects.filter(user=user).order_by('-id').values_list('id', flat=True)[:len(events)]
+    for event, event_id in zip(events, reversed(list(ids))):
+        event.id = event_id
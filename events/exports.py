@@ -0,0 +1,94 @@
+import csv
+import json
+from collections import defaultdict
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework import renderers
+from events.models import Event, Operation
+
+CSV_COLUMNS = ('id', 'event_date', 'event_type', 'description', 'category', 'tags', 'resource', 'flow')
+
+
+def export_events(queryset, chunk_size=500):
+    """
+    Yields the events of `queryset` as plain dicts with their tag names and operations, ordered by date.
+
+    Events are read in keyset chunks of `chunk_size` with three queries per chunk (events, tags, operations),
+    so memory does not depend on the number of exported events.
+    """
+    queryset = queryset.order_by('event_date', 'id')
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(Q(event_date__gt=last[0]) | Q(event_date=last[0], id__gt=last[1]))
+        events = list(chunk.values('id', 'event_date', 'event_type', 'description', 'category__name')[:chunk_size])
+        if not events:
+            return
+
+        ids = [event['id'] for event in events]
+        tags = defaultdict(list)
+        for event_id, name in Event.tags.through.objects.filter(event_id__in=ids).order_by('tag__name') \
+                .values_list('event_id', 'tag__name'):
+            tags[event_id].append(name)
+        operations = defaultdict(list)
+        for event_id, resource, flow in Operation.objects.filter(event_id__in=ids).order_by('resource__name', 'id') \
+                .values_list('event_id', 'resource__name', 'flow'):
+            operations[event_id].append({'resource': resource, 'flow': flow})
+
+        for event in events:
+            yield {
+                'id': event['id'], 'event_date': event['event_date'], 'event_type': event['event_type'],
+                'description': event['description'], 'category': event['category__name'],
+                'tags': tags[event['id']], 'operations': operations[event['id']]
+            }
+
+        last = (events[-1]['event_date'], events[-1]['id'])
+
+
+class _Echo(object):
+    def write(self, value):
+        return value
+
+
+def csv_lines(events):
+    """
+    One line per operation, events without operations get a single line with empty resource and flow.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for event in events:
+        common = [event['id'], event['event_date'].isoformat(), event['event_type'], event['description'],
+                  event['category'], ';'.join(event['tags'])]
+        for operation in event['operations'] or [{'resource': '', 'flow': ''}]:
+            yield writer.writerow(common + [operation['resource'], operation['flow']])
+
+
+def ndjson_lines(events):
+    for event in events:
+        yield json.dumps(event, cls=DjangoJSONEncoder) + '\n'
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    """
+    Registers the `csv` format of the export, the data itself is streamed by the view. Only errors are rendered.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict):
+            return ''
+        writer = csv.writer(_Echo())
+        return writer.writerow(data.keys()) + writer.writerow(data.values())
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """
+    Registers the `ndjson` format of the export, the data itself is streamed by the view. Only errors are rendered.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,59 @@
+from datetime import timedelta
+from django.db.models import Sum
+from reports.models import month_of, next_month
+from events.models import Operation, BalanceCheckpoint
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def period_of(day, granularity):
+    if granularity == 'month':
+        return month_of(day)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def next_period(start, granularity):
+    if granularity == 'month':
+        return next_month(start)
+    return start + timedelta(days=7 if granularity == 'week' else 1)
+
+
+def count_periods(date_from, date_to, granularity):
+    if granularity == 'month':
+        return (date_to.year - date_from.year) * 12 + date_to.month - date_from.month + 1
+    step = 7 if granularity == 'week' else 1
+    return (period_of(date_to, granularity) - period_of(date_from, granularity)).days // step + 1
+
+
+def balance_history(resource, date_from, date_to, granularity='day'):
+    """
+    Returns the balance of the resource at the start of `date_from` and the balance at the end of every day, week
+    (starting on Monday) or month between `date_from` and `date_to`, as (period start, balance) pairs.
+
+    The balance at the start of the month of `date_from` comes from a checkpoint, so only the operations from
+    that month on are read, whatever the length of the history before it.
+    """
+    month = month_of(date_from)
+    balance = resource.initial_balance + BalanceCheckpoint.objects.flows_before(resource.id, month)
+
+    daily = iter(Operation.objects.filter(resource_id=resource.id, event_date__gte=month, event_date__lte=date_to)
+                 .values_list('event_date').annotate(Sum('flow')).order_by('event_date'))
+    pending = next(daily, None)
+    while pending is not None and pending[0] < date_from:
+        balance += pending[1]
+        pending = next(daily, None)
+    opening_balance = balance
+
+    history = []
+    period = period_of(date_from, granularity)
+    while period <= date_to:
+        end = next_period(period, granularity)
+        while pending is not None and pending[0] < end:
+            balance += pending[1]
+            pending = next(daily, None)
+        history.append((period, balance))
+        period = end
+
+    return opening_balance, history
@@ -0,0 +1,178 @@
+"""
+Streaming bank statement import: every stage is a generator, so only one chunk of rows is held in memory.
+
+    parse -> normalize -> map to categories, tags and the resource -> chunk -> create_events
+"""
+import csv
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from categories.models import Category
+from dictionaries.models import EventType
+from tags.models import Tag
+
+
+class StatementError(ValueError):
+    def __init__(self, row, message):
+        self.row = row
+        super(StatementError, self).__init__('Row {0}: {1}'.format(row, message))
+
+
+def parse_csv(lines, date_format='%Y-%m-%d', delimiter=','):
+    """
+    Expects a header with `date`, `amount` and `description` columns, `category` and `tags` (separated with `;`)
+    are optional.
+    """
+    for row in csv.DictReader(lines, delimiter=delimiter):
+        yield {
+            'date': row.get('date'), 'date_format': date_format, 'amount': row.get('amount'),
+            'description': row.get('description'), 'category': row.get('category') or None,
+            'tags': [tag for tag in (row.get('tags') or '').split(';') if tag.strip()]
+        }
+
+
+OFX_TOKEN = re.compile(r'<(/?)(\w+)>([^<]*)')
+
+
+def parse_ofx(lines):
+    """
+    Reads the STMTTRN records of both SGML (OFX 1.x) and XML (OFX 2.x) statements token by token.
+    """
+    transaction = None
+    for line in lines:
+        for closing, name, value in OFX_TOKEN.findall(line):
+            name, value = name.upper(), value.strip()
+            if name == 'STMTTRN':
+                if closing and transaction is not None:
+                    yield _ofx_row(transaction)
+                transaction = None if closing else {}
+            elif not closing and transaction is not None and value:
+                transaction[name] = value
+
+
+def _ofx_row(transaction):
+    return {
+        'date': transaction.get('DTPOSTED', '')[:8], 'date_format': '%Y%m%d', 'amount': transaction.get('TRNAMT'),
+        'description': ' '.join(value for value in (transaction.get('NAME'), transaction.get('MEMO')) if value),
+        'category': None, 'tags': []
+    }
+
+
+def parse_qif(lines, date_format='%m/%d/%Y'):
+    """
+    Reads `!Type:Bank`-like QIF records: D(ate), T (amount), P(ayee), M(emo) and L (category), ended with `^`.
+    """
+    record = {}
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        code, value = line[0], line[1:].strip()
+        if code == '^':
+            if record:
+                yield {
+                    # the 5/20'16 short year form
+                    'date': record.get('D', '').replace("'", '/20').replace(' ', ''), 'date_format': date_format,
+                    'amount': record.get('T') or record.get('U'),
+                    'description': ' '.join(record[key] for key in ('P', 'M') if record.get(key)),
+                    'category': record.get('L') or None, 'tags': []
+                }
+            record = {}
+        else:
+            record[code] = value
+
+
+PARSERS = {'csv': parse_csv, 'ofx': parse_ofx, 'qif': parse_qif}
+
+GROUPED_DIGITS = re.compile(r'^[-+]?\d{1,3}(?:([.,])\d{3}(?:\1\d{3})*)?$')
+
+
+def parse_amount(value):
+    """
+    Reads 1234.56 and 1234,56, and 1,234.56 and 1.234,56 with thousands separators: given both, the last one is the
+    decimal separator. More than two decimal places are rejected rather than rounded, as 1,234 could be 1234 as
+    well.
+    """
+    value = original = (value or '').replace(' ', '').replace('\xa0', '')
+    if '.' in value and ',' in value:
+        point = '.' if value.rindex('.') > value.rindex(',') else ','
+        integer, fraction = value.rsplit(point, 1)
+        if not GROUPED_DIGITS.match(integer):
+            raise ValueError('Misplaced thousands separators in {0!r}.'.format(original))
+        value = '{0}.{1}'.format(re.sub('[.,]', '', integer), fraction)
+    else:
+        value = value.replace(',', '.')
+
+    amount = Decimal(value)
+    if not amount.is_finite() or amount.as_tuple().exponent < -2:
+        raise ValueError('Invalid or ambiguous amount {0!r}.'.format(original))
+    return amount.quantize(Decimal('0.01'))
+
+
+def normalize(rows, start=1):
+    """
+    Converts dates and amounts and derives the event type from the sign of the amount. Rows are numbered from
+    `start`, in the order of the statement.
+    """
+    for number, row in enumerate(rows, start):
+        try:
+            event_date = datetime.strptime((row['date'] or '').strip(), row['date_format']).date()
+        except ValueError:
+            raise StatementError(number, 'invalid date {0!r}.'.format(row['date']))
+        try:
+            amount = parse_amount(row['amount'])
+        except (InvalidOperation, ValueError):
+            raise StatementError(number, 'invalid amount {0!r}.'.format(row['amount']))
+
+        yield number, {
+            'event_date': event_date,
+            'event_type': EventType.EXPENSE if amount < 0 else EventType.INCOME,
+            'flow': amount,
+            'description': (row['description'] or '').strip()[:500],
+            'category': (row['category'] or '').strip()[:50] or None,
+            'tags': [tag.strip()[:20] for tag in row['tags']]
+        }
+
+
+class StatementMapper(object):
+    """
+    Maps normalized rows to the categories and tags of the user, creating the missing ones. Both are cached, so
+    each name costs at most one query per import.
+    """
+
+    def __init__(self, user, resource, default_category='Imported'):
+        self.user = user
+        self.resource = resource
+        self.default_category = default_category
+        self.categories = {(category.name, category.event_type): category
+                           for category in Category.objects.filter(user=user)}
+        self.tags = {tag.name: tag for tag in Tag.objects.filter(user=user)}
+
+    def __call__(self, rows):
+        for number, row in rows:
+            yield number, {
+                'description': row['description'], 'event_type': row['event_type'], 'event_date': row['event_date'],
+                'category': self.get_category(row['category'] or self.default_category, row['event_type']),
+                'tags': [self.get_tag(name) for name in row['tags']],
+                'operations': [{'resource': self.resource, 'flow': row['flow']}]
+            }
+
+    def get_category(self, name, event_type):
+        key = (name, event_type)
+        if key not in self.categories:
+            self.categories[key] = Category.objects.create(user=self.user, name=name, event_type=event_type)
+        return self.categories[key]
+
+    def get_tag(self, name):
+        if name not in self.tags:
+            self.tags[name] = Tag.objects.create(user=self.user, name=name)
+        return self.tags[name]
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    chunk = list(islice(rows, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(rows, size))
@@ -0,0 +1,162 @@
+import json
+import re
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.routers import SimpleRouter
+from ppbudget import urls
+from ppbudget.cache import get_response_cache
+from categories.models import Category
+from tags.models import Tag
+from events.models import Resource, Event
+
+URL_ARGUMENT = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+
+# query strings of the requests of an endpoint besides the plain one, by route
+VARIANTS = {
+    'resources/{pk}/balance-history/': ['granularity=day&from={month_ago}'],
+    'users/{user_username}/events/': ['from={month_ago}', 'q=groc', 'q=market%20card&from={year_ago}',
+                                      'tags_any={tag}', 'category={category}', 'fields=id,event_date,operations.flow',
+                                      'expand='],
+    'users/{user_username}/events/export/': ['format=ndjson'],
+    'users/{user_username}/reports/monthly/': ['from={year_ago}', 'to={year_ahead}&projected=true'],
+    'users/{user_username}/reports/categories/': ['from={year_ago}', 'to={year_ahead}&projected=true'],
+}
+# of the plain request of routes failing without them
+REQUIRED = {'resources/{pk}/balance-history/': 'granularity=month',
+            'users/{user_username}/events/projected/': 'to={year_ahead}'}
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    return values[max(int(round(fraction * len(values) + 0.5)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = ('Requests every GET endpoint of the API routers as a user (see seed_benchmark) and reports latency '
+            'percentiles, query counts and response sizes, optionally as JSON to compare runs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='username', default='bench0')
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per endpoint.')
+        parser.add_argument('--cached', action='store_true',
+                            help='Keep the response cache between requests, it is cleared before each by default.')
+        parser.add_argument('--filter', default=None, help='Regular expression the endpoint paths must match.')
+        parser.add_argument('--output', default=None, help='Path of a JSON file for the results.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist as exc:
+            raise CommandError(exc)
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive.')
+
+        client = Client()
+        client.force_login(user)
+        results = []
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for route, path in self.get_endpoints(user, options['filter']):
+                results.append(self.measure(client, route, path, options))
+                self.stdout.write('{0:<70} {1:3} p50 {2:8.2f}ms p99 {3:8.2f}ms {4:4} queries {5:9} bytes'.format(
+                    path[:70], results[-1]['status'], results[-1]['latency_ms']['p50'],
+                    results[-1]['latency_ms']['p99'], results[-1]['queries'], results[-1]['bytes']))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(OrderedDict([
+                    ('started', timezone.now().isoformat()), ('user', user.username),
+                    ('requests', options['requests']), ('cached', options['cached']),
+                    ('database', connection.settings_dict['ENGINE']), ('endpoints', results)
+                ]), output, indent=2)
+
+    def get_endpoints(self, user, path_filter):
+        """
+        Returns (route, path with a query string) of the GET routes of every router of `ppbudget.urls`, with
+        the url arguments filled in with objects of the user.
+        """
+        routers = [router for router in vars(urls).values() if isinstance(router, SimpleRouter)]
+        arguments = self.get_arguments(user)
+        endpoints = []
+        for router in routers:
+            for pattern in router.urls:
+                view = pattern.callback
+                if 'get' not in getattr(view, 'actions', {}) or 'format' in pattern.regex.groupindex:
+                    continue
+                path_arguments = dict(arguments)
+                lookup_field = getattr(view.cls, 'lookup_field', 'pk')
+                lookup = getattr(view.cls, 'lookup_url_kwarg', None) or lookup_field
+                if lookup in pattern.regex.groupindex and lookup not in path_arguments:
+                    path_arguments[lookup] = self.get_object_key(view.cls.queryset.model, lookup_field, user)
+                if any(path_arguments.get(name) is None for name in pattern.regex.groupindex):
+                    continue
+
+                route = URL_ARGUMENT.sub(r'{\1}', pattern.regex.pattern).lstrip('^').rstrip('$')
+                path = '/api/v1/' + route.format(**path_arguments)
+                queries = [REQUIRED.get(route, '').format(**arguments)] + \
+                    [variant.format(**arguments) for variant in VARIANTS.get(route, [])]
+                for query in queries:
+                    full_path = path + ('?' + query if query else '')
+                    if path_filter is None or re.search(path_filter, full_path):
+                        endpoints.append((route, full_path))
+        return endpoints
+
+    def get_arguments(self, user):
+        event = Event.objects.filter(user=user, operations__isnull=False).order_by('-event_date', 'id').first()
+        category = Category.objects.filter(user=user, root_node=True).order_by('id').first()
+        tag = Tag.objects.filter(user=user).order_by('id').first()
+        today = date.today()
+        return {
+            'user_username': user.username,
+            'resource_pk': Resource.objects.filter(user=user).values_list('id', flat=True).order_by('id').first(),
+            'event_pk': event and event.id,
+            'category': category and category.id,
+            'tag': tag and tag.id,
+            'month_ago': today - timedelta(days=30),
+            'year_ago': today - timedelta(days=365),
+            'year_ahead': today + timedelta(days=365),
+        }
+
+    def get_object_key(self, model, lookup_field, user):
+        if model is User:
+            return getattr(user, lookup_field)
+        if model is Group:
+            group = user.groups.order_by('id').first()
+            return group and getattr(group, lookup_field)
+        return model.objects.filter(user=user).order_by('id').values_list(lookup_field, flat=True).first()
+
+    def measure(self, client, route, path, options):
+        cache = get_response_cache()
+        latencies, queries, size, status = [], [], 0, None
+        # the first request warms up imports and connections, it is not timed
+        for number in range(options['requests'] + 1):
+            if not options['cached']:
+                cache.backend.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(path)
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                elapsed = time.perf_counter() - started
+            if number:
+                latencies.append(elapsed * 1000)
+                queries.append(len(context.captured_queries))
+            size, status = len(content), response.status_code
+
+        latencies.sort()
+        return OrderedDict([
+            ('route', route), ('path', path), ('status', status), ('bytes', size),
+            ('queries', sorted(queries)[len(queries) // 2]),
+            ('latency_ms', OrderedDict([
+                ('min', latencies[0]), ('p50', percentile(latencies, 0.5)), ('p90', percentile(latencies, 0.9)),
+                ('p99', percentile(latencies, 0.99)), ('max', latencies[-1]),
+                ('mean', sum(latencies) / len(latencies))
+            ]))
+        ])
@@ -0,0 +1,58 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from events.models import Resource, Event, Operation
+from events.rows import event_values, event_rows, operation_values, operation_rows
+from events.serializers import EventSerializer, OperationSerializer
+
+
+class Command(BaseCommand):
+    help = ('Compares building and rendering a page of the event and resource operation lists with the '
+            'serializers and with the values() fast path (see events.rows), and checks that both give the same JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='username', default='bench0')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeats', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist as exc:
+            raise CommandError(exc)
+        if min(options['page_size'], options['repeats']) < 1:
+            raise CommandError('--page-size and --repeats must be positive.')
+
+        size = options['page_size']
+        events = Event.objects.filter(user=user).order_by('-event_date', 'description', 'id')
+        resource = Resource.objects.filter(user=user).order_by('id').first()
+        operations = Operation.objects.filter(resource=resource).order_by('-event_date', 'id')
+        self.compare('events', options['repeats'],
+                     lambda: EventSerializer(EventSerializer.setup_eager_loading(events)[:size], many=True).data,
+                     lambda: event_rows(list(event_values(events)[:size])))
+        self.compare('operations', options['repeats'],
+                     lambda: OperationSerializer(OperationSerializer.setup_eager_loading(operations)[:size],
+                                                 many=True).data,
+                     lambda: operation_rows(list(operation_values(operations)[:size])))
+
+    def compare(self, name, repeats, serializer_data, fast_data):
+        """
+        Times reading, building and rendering a page with both paths, the best of `repeats` runs each.
+        """
+        renderer = JSONRenderer()
+        timings, outputs = [], []
+        for build in (serializer_data, fast_data):
+            best = None
+            for _ in range(repeats):
+                started = time.perf_counter()
+                output = renderer.render(build())
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best * 1000)
+            outputs.append(output)
+
+        if outputs[0] != outputs[1]:
+            raise CommandError('The {0} fast path renders a different JSON than the serializer.'.format(name))
+        self.stdout.write('{0:>10}: serializer {1:8.2f}ms fast path {2:8.2f}ms ({3:.1f}x) {4} bytes'.format(
+            name, timings[0], timings[1], timings[0] / timings[1], len(outputs[0])))
@@ -0,0 +1,141 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import date
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.utils import OperationalError
+from categories.models import Category
+from dictionaries.models import EventType
+from events.models import Resource, Event, Operation
+
+MODES = OrderedDict([('default', ''), ('tuned', '1')])
+
+
+class Command(BaseCommand):
+    help = ('Measures the event write and read throughput of concurrent processes on a scratch SQLite database, '
+            'with the default and the tuned (SQLITE_TUNED) backend.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Processes creating events.')
+        parser.add_argument('--readers', type=int, default=4, help='Processes listing events.')
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run.')
+        parser.add_argument('--output', default=None, help='Path of a JSON file for the results.')
+        # internal, the roles of the processes started by the benchmark
+        parser.add_argument('--setup', action='store_true', help='Create the users of the writers and readers.')
+        parser.add_argument('--writer', type=int, default=None, help='Run the writer with this number.')
+        parser.add_argument('--reader', type=int, default=None, help='Run the reader with this number.')
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            return self.setup(options['writers'])
+        if options['writer'] is not None:
+            return self.work(options, self.write, options['writer'])
+        if options['reader'] is not None:
+            return self.work(options, self.read, options['reader'] % max(options['writers'], 1))
+
+        if options['writers'] < 1:
+            raise CommandError('At least one writer is required.')
+        results = OrderedDict((mode, self.run(options, tuned)) for mode, tuned in MODES.items())
+        for mode, result in results.items():
+            self.stdout.write('{0:>8}: {1:8.1f} writes/s {2:8.1f} reads/s {3:6} errors'.format(
+                mode, result['writes_per_second'], result['reads_per_second'], result['errors']))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(OrderedDict([
+                    ('writers', options['writers']), ('readers', options['readers']), ('seconds', options['seconds']),
+                    ('results', results)
+                ]), output, indent=2)
+
+    def run(self, options, tuned):
+        """
+        Runs the writers and readers against a fresh database and sums up what they did.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_NAME=os.path.join(directory, 'db.sqlite3'), SQLITE_TUNED=tuned,
+                       DATABASE_REPLICAS='0')
+            manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+            common = ['--writers', str(options['writers']), '--seconds', str(options['seconds'])]
+            subprocess.check_call(manage + ['migrate', '--verbosity', '0'], env=env)
+            subprocess.check_call(manage + ['benchmark_sqlite', '--setup'] + common, env=env)
+
+            processes = [
+                ('writes', subprocess.Popen(manage + ['benchmark_sqlite', '--writer', str(number)] + common,
+                                            env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE))
+                for number in range(options['writers'])
+            ] + [
+                ('reads', subprocess.Popen(manage + ['benchmark_sqlite', '--reader', str(number)] + common,
+                                           env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE))
+                for number in range(options['readers'])
+            ]
+
+            # all processes start together, once every one of them has loaded Django
+            for _, process in processes:
+                process.stdout.readline()
+            for _, process in processes:
+                process.stdin.write(b'start\n')
+                process.stdin.flush()
+
+            totals = {'writes': 0, 'reads': 0, 'errors': 0}
+            for kind, process in processes:
+                output, _ = process.communicate()
+                if process.returncode:
+                    raise CommandError('A benchmark process failed.')
+                result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+                totals[kind] += result['operations']
+                totals['errors'] += result['errors']
+
+        return OrderedDict([
+            ('writes', totals['writes']), ('reads', totals['reads']), ('errors', totals['errors']),
+            ('writes_per_second', totals['writes'] / options['seconds']),
+            ('reads_per_second', totals['reads'] / options['seconds'])
+        ])
+
+    def setup(self, writers):
+        for number in range(writers):
+            user = User.objects.create(username='benchmark{0}'.format(number))
+            Resource.objects.create(user=user, name='benchmark', initial_balance=0)
+            Category.objects.create(user=user, name='benchmark', event_type=EventType.EXPENSE)
+
+    def work(self, options, step, number):
+        """
+        Repeats `step` for the given seconds once started, printing the number of steps and of the
+        "database is locked" errors as JSON.
+        """
+        user = User.objects.get(username='benchmark{0}'.format(number))
+        resource = Resource.objects.get(user=user)
+        category = Category.objects.get(user=user)
+
+        self.stdout.write('ready')
+        self.stdout.flush()
+        sys.stdin.readline()
+
+        deadline = time.time() + options['seconds']
+        operations = errors = 0
+        while time.time() < deadline:
+            try:
+                step(user, resource, category, operations)
+                operations += 1
+            except OperationalError:
+                errors += 1
+
+        self.stdout.write(json.dumps({'operations': operations, 'errors': errors}))
+
+    def write(self, user, resource, category, sequence):
+        # what creating an event and its operation through the API does
+        with transaction.atomic():
+            event = Event.objects.create(user=user, description='benchmark {0}'.format(sequence),
+                                         event_type=EventType.EXPENSE, category=category,
+                                         event_date=date(2016, 1 + sequence % 12, 1 + sequence % 28))
+            Operation.objects.create(event=event, resource=resource, flow=-1)
+
+    def read(self, user, resource, category, sequence):
+        list(Event.objects.filter(user=user).order_by('-event_date', 'description', 'id')[:10])
+        Resource.objects.get(id=resource.id)
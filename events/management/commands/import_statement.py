@@ -0,0 +1,63 @@
+import os
+import time
+from itertools import islice
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from events.bulk import create_events
+from events.importers import PARSERS, StatementMapper, chunks, normalize
+from events.models import Resource
+
+
+class Command(BaseCommand):
+    help = 'Imports a CSV, OFX or QIF bank statement into events of one resource, committing in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', dest='username', required=True)
+        parser.add_argument('--resource', required=True, help='Name of the resource the statement belongs to.')
+        parser.add_argument('--format', choices=sorted(PARSERS), default=None,
+                            help='Statement format, guessed from the file extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows committed per transaction.')
+        parser.add_argument('--start-row', type=int, default=1,
+                            help='First row to import, to resume after a failed chunk.')
+        parser.add_argument('--date-format', default=None, help='strptime format of CSV and QIF dates.')
+        parser.add_argument('--delimiter', default=',', help='CSV delimiter.')
+        parser.add_argument('--encoding', default='utf-8')
+        parser.add_argument('--default-category', default='Imported',
+                            help='Category of rows without one, created when missing.')
+
+    def handle(self, *args, **options):
+        statement_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if statement_format not in PARSERS:
+            raise CommandError('Unknown statement format {0!r}, use --format.'.format(statement_format))
+        try:
+            user = User.objects.get(username=options['username'])
+            resource = Resource.objects.get(user=user, name=options['resource'])
+        except (User.DoesNotExist, Resource.DoesNotExist) as exc:
+            raise CommandError(exc)
+
+        parser_options = {}
+        if statement_format == 'csv':
+            parser_options['delimiter'] = options['delimiter']
+        if statement_format in ('csv', 'qif') and options['date_format']:
+            parser_options['date_format'] = options['date_format']
+
+        start_row = max(options['start_row'], 1)
+        mapper = StatementMapper(user, resource, options['default_category'])
+        imported, next_row, started = 0, start_row, time.time()
+
+        with open(options['path'], encoding=options['encoding'], newline='') as statement:
+            rows = islice(PARSERS[statement_format](statement, **parser_options), start_row - 1, None)
+            try:
+                for chunk in chunks(mapper(normalize(rows, start=start_row)), options['chunk_size']):
+                    create_events(user, [event for _, event in chunk])
+
+                    imported += len(chunk)
+                    next_row = chunk[-1][0] + 1
+                    self.stdout.write('Rows {0}-{1} imported, {2:.0f} rows/s.'.format(
+                        chunk[0][0], chunk[-1][0], imported / max(time.time() - started, 1e-6)))
+            except Exception as exc:
+                raise CommandError('{0}\n{1} rows imported, resume with --start-row {2}.'.format(
+                    exc, imported, next_row))
+
+        self.stdout.write('Imported {0} rows in {1:.2f}s.'.format(imported, time.time() - started))
@@ -0,0 +1,38 @@
+from datetime import date, datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from events.bulk import materialize_occurrences
+from events.models import RecurringEvent
+
+
+class Command(BaseCommand):
+    help = 'Stores the due occurrences of the recurring events as events, run it daily. The later occurrences ' \
+           'are only projected by the event lists and reports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='username', default=None,
+                            help='Only materialize the recurring events of this user.')
+        parser.add_argument('--until', default=None,
+                            help='Last date (YYYY-MM-DD) to store the occurrences of, today by default.')
+
+    def handle(self, *args, **options):
+        until = date.today()
+        if options['until']:
+            try:
+                until = datetime.strptime(options['until'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--until must be a date in the YYYY-MM-DD format.')
+
+        # the ones stored up to the date already are not locked
+        recurring_events = RecurringEvent.objects.filter(start_date__lte=until) \
+            .filter(Q(materialized_until__isnull=True) | Q(materialized_until__lt=until)).order_by('id')
+        if options['username']:
+            recurring_events = recurring_events.filter(user__username=options['username'])
+
+        due = stored = 0
+        # one transaction per recurring event
+        for recurring_event_id in recurring_events.values_list('id', flat=True):
+            due += 1
+            stored += materialize_occurrences(recurring_event_id, until)
+
+        self.stdout.write('Stored {0} occurrences of {1} recurring events.'.format(stored, due))
@@ -0,0 +1,56 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from authentication.models import ChangeMarker
+from events.models import Resource, Operation, BalanceCheckpoint
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Resource.current_balance from initial_balance and the sum of operation flows, and drops ' \
+           'the balance history checkpoints so they are recomputed on the next read.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of resources reconciled per aggregate query.')
+        parser.add_argument('--user', dest='username', default=None,
+                            help='Only rebuild the resources of this user.')
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            help='Report drifted balances without fixing them.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        resources = Resource.objects.order_by('id')
+        if options['username']:
+            resources = resources.filter(user__username=options['username'])
+
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                batch = list(resources.select_for_update().filter(id__gt=last_id)
+                             .values_list('id', 'initial_balance', 'current_balance', 'user_id')[:batch_size])
+                if not batch:
+                    break
+
+                totals = dict(Operation.objects.filter(resource_id__in=[row[0] for row in batch])
+                              .values('resource_id').annotate(total=Sum('flow'))
+                              .values_list('resource_id', 'total'))
+
+                for resource_id, initial_balance, current_balance, user_id in batch:
+                    expected = initial_balance + (totals.get(resource_id) or Decimal('0'))
+                    if current_balance != expected:
+                        fixed += 1
+                        self.stdout.write('Resource {0}: {1} -> {2}'.format(resource_id, current_balance, expected))
+                        if not options['dry_run']:
+                            Resource.objects.filter(id=resource_id).update(current_balance=expected)
+                            ChangeMarker.objects.bump(user_id, (ChangeMarker.RESOURCES,))
+
+                if not options['dry_run']:
+                    BalanceCheckpoint.objects.filter(resource_id__in=[row[0] for row in batch]).delete()
+
+            checked += len(batch)
+            last_id = batch[-1][0]
+
+        self.stdout.write('Checked {0} resources, {1} {2}.'.format(
+            checked, fixed, 'drifted' if options['dry_run'] else 'fixed'))
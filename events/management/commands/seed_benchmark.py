@@ -0,0 +1,149 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from authentication.models import ChangeMarker
+from categories.models import Category, CategoryClosure
+from dictionaries.models import EventType
+from tags.models import Tag
+from events.bulk import create_events
+from events.importers import chunks
+from events.models import Resource, RecurringEvent, RecurringFlow
+
+PAYEES = ('Grocery Market', 'Corner Bakery', 'City Transport', 'Fuel Station', 'Pharmacy', 'Book Store', 'Cinema',
+          'Restaurant', 'Coffee House', 'Electricity', 'Water Supply', 'Internet Provider', 'Insurance', 'Gym',
+          'Salary', 'Bonus', 'Interest', 'Refund', 'Rent', 'Hardware Store')
+DETAILS = ('monthly', 'weekly', 'card payment', 'transfer', 'invoice', 'groceries', 'snacks', 'tickets', 'fees',
+           'subscription', 'repair', 'gift', 'dinner', 'lunch', 'breakfast', 'online order', 'cash')
+
+
+class Command(BaseCommand):
+    help = ('Generates users with resources, category trees, tags and events with operations for benchmarks, '
+            'using bulk inserts. Users are named <prefix><number>, the first one is a staff member.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--resources', type=int, default=3, help='Resources per user.')
+        parser.add_argument('--depth', type=int, default=3, help='Levels of the category trees.')
+        parser.add_argument('--branching', type=int, default=3,
+                            help='Root categories per event type and subcategories per category.')
+        parser.add_argument('--events', type=int, default=1000, help='Events per user.')
+        parser.add_argument('--tags', type=int, default=20, help='Tags per user.')
+        parser.add_argument('--tags-per-event', type=int, default=2, help='Maximum number of tags of an event.')
+        parser.add_argument('--operations', type=int, default=2, help='Maximum number of operations of an event.')
+        parser.add_argument('--days', type=int, default=730, help='Events are spread over the days before today.')
+        parser.add_argument('--recurring', type=int, default=5,
+                            help='Recurring events per user, starting within a month from today.')
+        parser.add_argument('--prefix', default='bench', help='Username prefix.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Events created per transaction.')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['resources'], options['depth'], options['branching'],
+               options['operations']) < 1:
+            raise CommandError('--users, --resources, --depth, --branching and --operations must be positive.')
+        usernames = ['{0}{1}'.format(options['prefix'], number) for number in range(options['users'])]
+        if User.objects.filter(username__in=usernames).exists():
+            raise CommandError('Users named {0}* exist already, use another --prefix.'.format(options['prefix']))
+
+        generator = random.Random(options['seed'])
+        started = time.time()
+        with transaction.atomic():
+            users = self.create_users(usernames)
+        for user in users:
+            with transaction.atomic():
+                resources = self.create_resources(user, options['resources'])
+                categories = self.create_categories(user, options['depth'], options['branching'])
+                tags = self.create_tags(user, options['tags'])
+                self.create_recurring_events(generator, user, resources, categories, tags, options['recurring'])
+            self.create_events(generator, user, resources, categories, tags, options)
+            self.stdout.write('{0}: {1} events.'.format(user.username, options['events']))
+
+        self.stdout.write('Seeded {0} users in {1:.2f}s.'.format(len(users), time.time() - started))
+
+    def create_users(self, usernames):
+        User.objects.bulk_create([User(username=username, is_staff=number == 0)
+                                  for number, username in enumerate(usernames)])
+        users = list(User.objects.filter(username__in=usernames).order_by('id'))
+        # bulk_create skips the post_save receiver creating the change markers
+        ChangeMarker.objects.bulk_create([ChangeMarker(user=user, scope=scope)
+                                          for user in users for scope in ChangeMarker.SCOPES])
+        return users
+
+    def create_resources(self, user, count):
+        Resource.objects.bulk_create([
+            Resource(user=user, name='Account {0}'.format(number + 1), initial_balance=1000, current_balance=1000)
+            for number in range(count)
+        ])
+        return list(Resource.objects.filter(user=user))
+
+    def create_categories(self, user, depth, branching):
+        """
+        Creates a tree per event type one level at a time, along with its closure table rows. Returns the leaf
+        categories by event type.
+        """
+        leaves = {}
+        for event_type in (EventType.EXPENSE, EventType.INCOME):
+            # (category name, ancestor names, nearest first)
+            level = [('{0} {1}'.format(dict(EventType.EVENT_TYPES)[event_type], number + 1), [])
+                     for number in range(branching)]
+            ids = {}
+            for _ in range(depth):
+                Category.objects.bulk_create([
+                    Category(user=user, name=name, event_type=event_type, root_node=not ancestors,
+                             parent_id=ids[ancestors[0]] if ancestors else None)
+                    for name, ancestors in level
+                ])
+                ids.update(Category.objects.filter(user=user, event_type=event_type,
+                                                   name__in=[name for name, _ in level]).values_list('name', 'id'))
+                CategoryClosure.objects.bulk_create([
+                    CategoryClosure(ancestor_id=ids[ancestor], descendant_id=ids[name], depth=distance)
+                    for name, ancestors in level for distance, ancestor in enumerate([name] + ancestors)
+                ])
+                parents, level = level, [('{0}.{1}'.format(name, number + 1), [name] + ancestors)
+                                         for name, ancestors in level for number in range(branching)]
+            leaves[event_type] = [Category(id=ids[name], user=user) for name, _ in parents]
+        return leaves
+
+    def create_tags(self, user, count):
+        Tag.objects.bulk_create([Tag(user=user, name='tag {0}'.format(number + 1)) for number in range(count)])
+        return list(Tag.objects.filter(user=user))
+
+    def create_recurring_events(self, generator, user, resources, categories, tags, count):
+        today = date.today()
+        for _ in range(count):
+            data = self.event_data(generator, today, resources, categories, tags, {'tags_per_event': 2,
+                                                                                   'operations': 1, 'days': 1})
+            recurring_event = RecurringEvent.objects.create(
+                user=user, description=data['description'], event_type=data['event_type'],
+                category=data['category'], frequency=generator.choice((RecurringEvent.WEEKLY, RecurringEvent.MONTHLY)),
+                start_date=today + timedelta(days=generator.randint(1, 30)))
+            recurring_event.tags.set(data['tags'])
+            RecurringFlow.objects.bulk_create([RecurringFlow(recurring_event=recurring_event, **operation)
+                                               for operation in data['operations']])
+
+    def create_events(self, generator, user, resources, categories, tags, options):
+        today = date.today()
+        for chunk in chunks((self.event_data(generator, today, resources, categories, tags, options)
+                             for _ in range(options['events'])), options['chunk_size']):
+            create_events(user, chunk)
+
+    def event_data(self, generator, today, resources, categories, tags, options):
+        event_type = EventType.INCOME if generator.random() < 0.1 else EventType.EXPENSE
+        sign = 1 if event_type == EventType.INCOME else -1
+        return {
+            'description': '{0} {1}'.format(generator.choice(PAYEES), generator.choice(DETAILS)),
+            'event_type': event_type,
+            'event_date': today - timedelta(days=generator.randrange(max(options['days'], 1))),
+            'category': generator.choice(categories[event_type]),
+            'tags': generator.sample(tags, generator.randint(0, min(options['tags_per_event'], len(tags)))),
+            'operations': [
+                {'resource': resource,
+                 'flow': sign * Decimal(generator.randint(100, 50000)) / 100}
+                for resource in generator.sample(resources, generator.randint(1, min(options['operations'],
+                                                                                   len(resources))))
+            ]
+        }
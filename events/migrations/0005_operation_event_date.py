@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 08:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+from ppbudget import schema
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_balancecheckpoint'),
+    ]
+
+    operations = [
+        # on_delete of the initial migration, before the raw SQL objects a table remake would drop
+        migrations.AlterField(
+            model_name='event',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='categories.Category'),
+        ),
+        migrations.AddField(
+            model_name='operation',
+            name='event_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            ['UPDATE events_operation SET event_date = '
+             '(SELECT event_date FROM events_event WHERE events_event.id = events_operation.event_id)'],
+            migrations.RunSQL.noop
+        ),
+        migrations.AlterField(
+            model_name='operation',
+            name='event_date',
+            field=models.DateField(editable=False),
+        ),
+        # Django 1.9 cannot declare descending index columns
+        schema.run_sql('events_event_user_id_event_date_description', 'events_operation_resource_id_event_date'),
+    ]
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 09:20
+from __future__ import unicode_literals
+
+from django.db import migrations
+from ppbudget import schema
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_operation_event_date'),
+    ]
+
+    operations = [
+        schema.run_sql('events_event_tags_tag_id_event_id'),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 08:50
+from __future__ import unicode_literals
+
+from django.db import migrations
+from ppbudget import schema
+
+
+# external content table: the index stores no copy of the descriptions, the triggers of ppbudget.schema keep it in
+# step with the events; the prefix indexes serve the 2 and 3 character prefix queries of the search
+CREATE_TABLE = "CREATE VIRTUAL TABLE events_event_fts USING fts5(" \
+    "description, content='events_event', content_rowid='id', prefix='2 3')"
+
+TRIGGERS = ['events_event_fts_insert', 'events_event_fts_delete', 'events_event_fts_update']
+
+
+def create_index(apps, schema_editor):
+    # other backends search with a substring match, see events.search
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(CREATE_TABLE)
+        for name in TRIGGERS:
+            schema_editor.execute(schema.BY_NAME[name].create)
+        schema_editor.execute("INSERT INTO events_event_fts (events_event_fts) VALUES ('rebuild')")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for name in reversed(TRIGGERS):
+            schema_editor.execute(schema.BY_NAME[name].drop)
+        schema_editor.execute('DROP TABLE events_event_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_tags_tag_id_event_id_index'),
+    ]
+
+    operations = [
+        # SQLite drops the triggers with the table, migrations remaking events_event use ppbudget.schema.remaking
+        migrations.RunPython(create_index, drop_index),
+    ]
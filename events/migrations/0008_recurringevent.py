@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 09:25
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from ppbudget import schema
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tags', '0003_auto_20160508_1343'),
+        ('categories', '0006_category_user_id_root_node_index'),
+        ('events', '0007_event_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.TextField(max_length=500)),
+                ('event_type', models.CharField(choices=[('EX', 'Expense'), ('IN', 'Income'), ('CH', 'Change')], max_length=2)),
+                ('frequency', models.CharField(choices=[('D', 'Daily'), ('W', 'Weekly'), ('M', 'Monthly'), ('Y', 'Yearly')], max_length=1)),
+                ('interval', models.PositiveIntegerField(default=1)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(blank=True, null=True)),
+                ('materialized_until', models.DateField(blank=True, editable=False, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='categories.Category')),
+                ('tags', models.ManyToManyField(blank=True, to='tags.Tag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecurringFlow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flow', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('recurring_event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flows', to='events.RecurringEvent')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='events.Resource')),
+            ],
+        ),
+        *schema.remaking(
+            'events_event',
+            migrations.AddField(
+                model_name='event',
+                name='recurring_event',
+                field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='events.RecurringEvent'),
+            ),
+        ),
+    ]
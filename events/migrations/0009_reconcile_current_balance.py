@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import F, Sum
+from django.utils import timezone
+
+
+def reconcile_balances(apps, schema_editor):
+    # the balances were set to the initial ones and not kept up to date before, the write paths now only add
+    # deltas to them; the same sums as `manage.py rebuild_balances`
+    Resource = apps.get_model('events', 'Resource')
+    Operation = apps.get_model('events', 'Operation')
+    ChangeMarker = apps.get_model('authentication', 'ChangeMarker')
+
+    totals = dict(Operation.objects.values('resource_id').annotate(total=Sum('flow'))
+                  .values_list('resource_id', 'total'))
+    user_ids = set()
+    for resource_id, initial_balance, current_balance, user_id in Resource.objects.order_by('id') \
+            .values_list('id', 'initial_balance', 'current_balance', 'user_id').iterator():
+        expected = initial_balance + (totals.get(resource_id) or Decimal('0'))
+        if current_balance != expected:
+            Resource.objects.filter(id=resource_id).update(current_balance=expected)
+            user_ids.add(user_id)
+
+    # the cached and conditional resource lists hold the previous balances
+    ChangeMarker.objects.filter(user_id__in=user_ids, scope='resources') \
+        .update(version=F('version') + 1, updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('events', '0008_recurringevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(reconcile_balances, migrations.RunPython.noop),
+    ]
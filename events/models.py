@@ -1,8 +1,17 @@
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+from django.db import DEFAULT_DB_ALIAS, models, transaction, IntegrityError
+from django.db.models import F, Sum, Count
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete, m2m_changed, post_migrate
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from ppbudget import schema
+from authentication.models import ChangeMarker
 from categories.models import Category
 from tags.models import Tag
 from dictionaries.models import EventType
+from reports.models import MonthlyTotal, month_of, next_month
 
 
 class Resource(models.Model):
@@ -14,12 +23,52 @@ class Resource(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Resource, cls).from_db(db, field_names, values)
+        instance._loaded_initial_balance = instance.__dict__.get('initial_balance')
+        return instance
+
+    @classmethod
+    def adjust_balances(cls, deltas, using=None):
+        """
+        Applies {resource_id: delta} to the stored current balances with atomic UPDATE statements,
+        so concurrent writers never overwrite each other's changes.
+        """
+        for resource_id, delta in deltas.items():
+            if resource_id is None or not delta:
+                continue
+            cls.objects.using(using).filter(id=resource_id).update(
+                current_balance=Coalesce(F('current_balance'), F('initial_balance')) + delta
+            )
+
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
-        if self.current_balance is None:
-            self.current_balance = self.initial_balance
+        if self._state.adding or force_insert:
+            if self.current_balance is None:
+                self.current_balance = self.initial_balance
+
+            super(Resource, self).save(force_insert, force_update, using, update_fields)
+            self._loaded_initial_balance = to_decimal(self.initial_balance)
+            return
+
+        # current_balance is maintained by operation writes, never overwrite it with a possibly stale value
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields
+                             if not field.primary_key and field.name != 'current_balance']
+        else:
+            update_fields = [name for name in update_fields if name != 'current_balance']
+
+        with transaction.atomic(using=using):
+            super(Resource, self).save(force_insert, force_update, using, update_fields)
+
+            previous = getattr(self, '_loaded_initial_balance', None)
+            if 'initial_balance' in update_fields and previous is not None:
+                delta = to_decimal(self.initial_balance) - previous
+                Resource.adjust_balances({self.id: delta}, using=using)
+                self.refresh_from_db(using=using, fields=['current_balance'])
 
-        return super(Resource, self).save(force_insert, force_update, using, update_fields)
+        self._loaded_initial_balance = to_decimal(self.initial_balance)
 
     def __str__(self):
         return '{0} ({1})'.format(self.name, self.user.username)
@@ -28,6 +77,53 @@ class Resource(models.Model):
         unique_together = ('user', 'name')
 
 
+class RecurringEvent(models.Model):
+    """
+    Template of events repeated on a schedule (see events.recurrence) with the same category, tags and flows.
+
+    Its occurrences up to `materialized_until` are stored as events by `manage.py materialize_recurring`, the later
+    ones are only projected. Changes of the template apply to the occurrences not stored yet.
+    """
+    DAILY = 'D'
+    WEEKLY = 'W'
+    MONTHLY = 'M'
+    YEARLY = 'Y'
+    FREQUENCIES = (
+        (DAILY, 'Daily'),
+        (WEEKLY, 'Weekly'),
+        (MONTHLY, 'Monthly'),
+        (YEARLY, 'Yearly')
+    )
+
+    user = models.ForeignKey(User)
+    description = models.TextField(max_length=500)
+    event_type = models.CharField(max_length=2, choices=EventType.EVENT_TYPES)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    tags = models.ManyToManyField(Tag, blank=True)
+    frequency = models.CharField(max_length=1, choices=FREQUENCIES)
+    interval = models.PositiveIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True)
+    materialized_until = models.DateField(null=True, blank=True, editable=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{0} every {1} {2}: {3} ({4})'.format(self.start_date, self.interval, self.get_frequency_display(),
+                                                     self.description, self.user.username)
+
+
+class RecurringFlow(models.Model):
+    recurring_event = models.ForeignKey(RecurringEvent, related_name='flows')
+    resource = models.ForeignKey(Resource)
+    flow = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return '{0} - {1}: {2}'.format(self.recurring_event.description, self.resource.name, self.flow)
+
+
 class Event(models.Model):
     user = models.ForeignKey(User)
     description = models.TextField(max_length=500)
@@ -35,10 +131,59 @@ class Event(models.Model):
     event_date = models.DateField()
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
     tags = models.ManyToManyField(Tag)
+    # the template the event is an occurrence of
+    recurring_event = models.ForeignKey(RecurringEvent, related_name='occurrences', null=True, blank=True,
+                                        on_delete=models.SET_NULL)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Event, cls).from_db(db, field_names, values)
+        instance._loaded_report_key = instance.report_key
+        return instance
+
+    @property
+    def report_key(self):
+        """
+        Identifies the MonthlyTotal row the operations of the event are summed into. The date is converted, as
+        it may still be the string it was assigned as.
+        """
+        event_date = self._meta.get_field('event_date').to_python(self.__dict__.get('event_date'))
+        return self.__dict__.get('user_id'), event_date, self.__dict__.get('category_id'), \
+            self.__dict__.get('event_type')
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        previous_key = getattr(self, '_loaded_report_key', None)
+
+        with transaction.atomic(using=using):
+            super(Event, self).save(force_insert, force_update, using, update_fields)
+
+            if previous_key is not None and None not in previous_key and previous_key != self.report_key:
+                # move the operations of the event to the totals of its new month, category or type
+                flows = list(self.operations.using(using).order_by().values_list('resource_id')
+                             .annotate(flow=Sum('flow'), operations=Count('id')))
+                if flows:
+                    total = sum(flow for _, flow, _ in flows)
+                    operations = sum(count for _, _, count in flows)
+                    MonthlyTotal.objects.apply_deltas({
+                        previous_key: (-total, -operations),
+                        self.report_key: (total, operations)
+                    }, using=using)
+
+                    previous_date, event_date = previous_key[1], self.report_key[1]
+                    if previous_date != event_date:
+                        self.operations.using(using).update(event_date=event_date)
+                        deltas = {}
+                        for resource_id, flow, _ in flows:
+                            deltas[(resource_id, previous_date)] = -flow
+                            deltas[(resource_id, event_date)] = flow
+                        BalanceCheckpoint.objects.shift(deltas, using=using)
+
+        self._loaded_report_key = self.report_key
+
     def __str__(self):
         return '{0} - {1}: {2} ({3})'.format(self.event_date, self.get_event_type_display(), self.description,
                                              self.user.username)
@@ -48,9 +193,203 @@ class Operation(models.Model):
     event = models.ForeignKey(Event, related_name='operations')
     resource = models.ForeignKey(Resource)
     flow = models.DecimalField(max_digits=10, decimal_places=2)
+    # copy of event.event_date, so the operations of a resource can be read in date order from an index
+    event_date = models.DateField(editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Operation, cls).from_db(db, field_names, values)
+        instance._loaded_balance_state = (instance.__dict__.get('resource_id'), instance.__dict__.get('flow'),
+                                          instance.__dict__.get('event_id'))
+        return instance
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if update_fields is not None and \
+                not {'resource', 'resource_id', 'flow', 'event', 'event_id'} & set(update_fields):
+            return super(Operation, self).save(force_insert, force_update, using, update_fields)
+
+        previous_resource_id, previous_flow, previous_event_id = \
+            getattr(self, '_loaded_balance_state', (None, None, None))
+        flow = to_decimal(self.flow)
+        self.event_date = self.event.event_date
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'event_date'}
+
+        with transaction.atomic(using=using):
+            super(Operation, self).save(force_insert, force_update, using, update_fields)
+
+            report_key = self.event.report_key
+            deltas = {self.resource_id: flow}
+            report_deltas = {report_key: (flow, 1)}
+            checkpoint_deltas = {(self.resource_id, report_key[1]): flow}
+            if previous_resource_id is not None and previous_flow is not None:
+                deltas[previous_resource_id] = deltas.get(previous_resource_id, 0) - previous_flow
+                previous_key = report_key if previous_event_id == self.event_id else \
+                    get_report_key(previous_event_id, using)
+                flow_delta, operations_delta = report_deltas.get(previous_key, (0, 0))
+                report_deltas[previous_key] = (flow_delta - previous_flow, operations_delta - 1)
+                checkpoint_key = (previous_resource_id, previous_key[1])
+                checkpoint_deltas[checkpoint_key] = checkpoint_deltas.get(checkpoint_key, 0) - previous_flow
+            Resource.adjust_balances(deltas, using=using)
+            MonthlyTotal.objects.apply_deltas(report_deltas, using=using)
+            BalanceCheckpoint.objects.shift(checkpoint_deltas, using=using)
+            ChangeMarker.objects.bump(report_key[0], (ChangeMarker.EVENTS, ChangeMarker.RESOURCES), using=using)
+
+        self._loaded_balance_state = (self.resource_id, flow, self.event_id)
+
     def __str__(self):
         return '{0} - {1}: {2}'.format(self.event.description, self.resource.name, self.flow)
+
+
+class BalanceCheckpointManager(models.Manager):
+    def shift(self, deltas, using=None):
+        """
+        Adds {(resource_id, event_date): flow} to the checkpoints the flows dated `event_date` are part of.
+        """
+        merged = defaultdict(int)
+        for (resource_id, event_date), flow in deltas.items():
+            if resource_id is not None and event_date is not None:
+                merged[(resource_id, month_of(event_date))] += flow
+        merged = {key: flow for key, flow in merged.items() if flow}
+
+        manager = self.db_manager(using)
+        if len(merged) > 1:
+            # skip the resources without checkpoints with a single query
+            resource_ids = set(manager.filter(resource_id__in={resource_id for resource_id, _ in merged})
+                               .values_list('resource_id', flat=True).distinct())
+            merged = {key: flow for key, flow in merged.items() if key[0] in resource_ids}
+
+        for (resource_id, month), flow in merged.items():
+            manager.filter(resource_id=resource_id, month__gt=month).update(flows=F('flows') + flow)
+
+    def flows_before(self, resource_id, month, using=None):
+        """
+        Returns the sum of the flows of the resource dated before `month` (the first day of a month).
+
+        Only the operations after the latest checkpoint are read, and checkpoints for every month from there up to
+        `month` are stored, so the same or a later window never rescans them. Both happen on the primary unless
+        `using` says otherwise, as checkpoints computed from a lagging replica would stay wrong once stored.
+        """
+        manager = self.db_manager(using or DEFAULT_DB_ALIAS)
+        with transaction.atomic(using=manager.db):
+            # operation writes update the resource row as well, so they wait until the checkpoints are stored
+            list(Resource.objects.using(manager.db).select_for_update().filter(id=resource_id).values_list('id'))
+
+            latest = manager.filter(resource_id=resource_id, month__lte=month).order_by('-month') \
+                .values_list('month', 'flows').first()
+            if latest is not None and latest[0] == month:
+                return latest[1]
+
+            operations = Operation.objects.using(manager.db).filter(resource_id=resource_id, event_date__lt=month)
+            if latest is not None:
+                operations = operations.filter(event_date__gte=latest[0])
+            monthly = defaultdict(Decimal)
+            for event_date, flow in operations.order_by().values_list('event_date').annotate(Sum('flow')):
+                monthly[month_of(event_date)] += flow
+
+            current, flows = latest if latest is not None else (min(monthly, default=month), Decimal('0'))
+            checkpoints = []
+            while current < month:
+                flows += monthly.get(current, 0)
+                current = next_month(current)
+                checkpoints.append(self.model(resource_id=resource_id, month=current, flows=flows))
+            if not checkpoints:
+                checkpoints.append(self.model(resource_id=resource_id, month=month, flows=flows))
+
+            try:
+                with transaction.atomic(using=manager.db):
+                    manager.bulk_create(checkpoints)
+            except IntegrityError:
+                # stored concurrently in the meantime
+                pass
+
+        return flows
+
+
+class BalanceCheckpoint(models.Model):
+    """
+    Sum of the operation flows of a resource dated before the first day of `month`. Stored lazily by balance
+    history reads and kept up to date by the operation and event write paths.
+    """
+    resource = models.ForeignKey(Resource, related_name='checkpoints')
+    month = models.DateField()
+    flows = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = BalanceCheckpointManager()
+
+    def __str__(self):
+        return '{0} {1:%Y-%m}: {2}'.format(self.resource.name, self.month, self.flows)
+
+    class Meta:
+        unique_together = ('resource', 'month')
+
+
+def to_decimal(value):
+    return value if value is None or isinstance(value, Decimal) else Decimal(str(value))
+
+
+def get_report_key(event_id, using=None):
+    return Event.objects.using(using).filter(id=event_id) \
+        .values_list('user_id', 'event_date', 'category_id', 'event_type').first()
+
+
+@receiver(post_delete, sender=Operation)
+def revert_operation_balance(sender, instance, using, **kwargs):
+    # Also fired for operations removed by cascade (e.g. when their event is deleted), before the event itself.
+    Resource.adjust_balances({instance.resource_id: -to_decimal(instance.flow)}, using=using)
+
+    report_key = get_report_key(instance.event_id, using)
+    if report_key is not None:
+        MonthlyTotal.objects.apply_deltas({report_key: (-to_decimal(instance.flow), -1)}, using=using)
+        BalanceCheckpoint.objects.shift({(instance.resource_id, report_key[1]): -to_decimal(instance.flow)},
+                                        using=using)
+        ChangeMarker.objects.bump(report_key[0], (ChangeMarker.EVENTS, ChangeMarker.RESOURCES), using=using)
+
+
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def bump_resource_markers(sender, instance, using, **kwargs):
+    # operations of events nest their resource
+    ChangeMarker.objects.bump(instance.user_id, (ChangeMarker.RESOURCES, ChangeMarker.EVENTS), using=using)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def bump_event_markers(sender, instance, using, **kwargs):
+    ChangeMarker.objects.bump(instance.user_id, (ChangeMarker.EVENTS,), using=using)
+
+
+@receiver(m2m_changed, sender=Event.tags.through)
+def bump_event_tags_markers(sender, instance, action, using, **kwargs):
+    # the instance is the tag when the relation is changed from its side, both belong to the same user
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        ChangeMarker.objects.bump(instance.user_id, (ChangeMarker.EVENTS,), using=using)
+
+
+@receiver(post_save, sender=RecurringEvent)
+@receiver(post_delete, sender=RecurringEvent)
+def bump_recurring_event_markers(sender, instance, using, **kwargs):
+    # the projected occurrences are part of the event lists and reports
+    ChangeMarker.objects.bump(instance.user_id, (ChangeMarker.EVENTS,), using=using)
+
+
+@receiver(post_save, sender=RecurringFlow)
+@receiver(post_delete, sender=RecurringFlow)
+def bump_recurring_flow_markers(sender, instance, using, **kwargs):
+    user_id = RecurringEvent.objects.using(using).filter(id=instance.recurring_event_id) \
+        .values_list('user_id', flat=True).first()
+    ChangeMarker.objects.bump(user_id, (ChangeMarker.EVENTS,), using=using)
+
+
+@receiver(m2m_changed, sender=RecurringEvent.tags.through)
+def bump_recurring_event_tags_markers(sender, instance, action, using, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        ChangeMarker.objects.bump(instance.user_id, (ChangeMarker.EVENTS,), using=using)
+
+
+# fails migrate when a table remake dropped the raw SQL indexes or full-text triggers of the migrations
+post_migrate.connect(schema.check_raw_sql, dispatch_uid='ppbudget.schema.check_raw_sql')
@@ -1,11 +1,11 @@
 from rest_framework import permissions
-from events.models import Resource, Event, Operation
+from events.models import Operation
 
 
 class IsResourceOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, resource):
         if request.user:
-            return resource.user == request.user
+            return resource.user_id == request.user.id
         return False
 
 
@@ -19,7 +19,7 @@ class IsResourcesOwner(permissions.BasePermission):
 class IsEventOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, event):
         if request.user:
-            return event.user == request.user
+            return event.user_id == request.user.id
         return False
 
 
@@ -32,24 +32,21 @@ class IsEventsOwner(permissions.BasePermission):
 
 class IsOperationOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, operation: Operation):
+        # expects the view to select_related the resource and the event of the operation
         if request.user:
-            resource = Resource.objects.get(id=operation.resource.id)
-            event = Event.objects.get(id=operation.event.id)
-            return (resource.user == request.user) and (event.user == request.user)
+            return (operation.resource.user_id == request.user.id) and (operation.event.user_id == request.user.id)
         return False
 
 
-class IsOperationsResourceOwner(permissions.BasePermission):
-    def has_permission(self, request, view):
+class IsRecurringEventOwner(permissions.BasePermission):
+    def has_object_permission(self, request, view, recurring_event):
         if request.user:
-            resource = Resource.objects.get(id=view.kwargs['resource_pk'])
-            return request.user.username == resource.user.username
+            return recurring_event.user_id == request.user.id
         return False
 
 
-class IsOperationsEventOwner(permissions.BasePermission):
+class IsRecurringEventsOwner(permissions.BasePermission):
     def has_permission(self, request, view):
-        if request.user:
-            event = Event.objects.get(id=view.kwargs['event_pk'])
-            return request.user.username == event.user.username
+        if request.user and view.kwargs['user_username']:
+            return request.user.username == view.kwargs['user_username']
         return False
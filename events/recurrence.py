@@ -0,0 +1,113 @@
+"""
+Schedules of the recurring events and their occurrences.
+
+A schedule repeats its start date every `interval` days, weeks, months or years, until its end date or count of
+occurrences. Monthly and yearly occurrences keep the day of the start date, clamped to the end of shorter months
+(a schedule starting on the 31st falls on Feb 28 or 29). The n-th occurrence is computed from the start date, so a
+window of dates is reached without stepping through the occurrences before it.
+
+Occurrences up to the `materialized_until` date of a RecurringEvent are stored as events (see
+events.bulk.materialize_occurrences), the later ones are projected on demand and never stored.
+"""
+import calendar
+import heapq
+from collections import defaultdict
+from datetime import date, timedelta
+from reports.models import month_of
+from events.models import RecurringEvent
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def nth_occurrence(start, frequency, interval, n):
+    if frequency == RecurringEvent.DAILY:
+        return start + timedelta(days=n * interval)
+    if frequency == RecurringEvent.WEEKLY:
+        return start + timedelta(weeks=n * interval)
+    if frequency == RecurringEvent.MONTHLY:
+        return add_months(start, n * interval)
+    return add_months(start, 12 * n * interval)
+
+
+def first_index(start, frequency, interval, date_from):
+    """
+    Index of the first occurrence on or after `date_from`.
+    """
+    if date_from <= start:
+        return 0
+    if frequency in (RecurringEvent.DAILY, RecurringEvent.WEEKLY):
+        step = interval * (1 if frequency == RecurringEvent.DAILY else 7)
+        return -(-(date_from - start).days // step)
+
+    # a lower bound from the months in between, clamping moves an occurrence back by a few days at most
+    months = (date_from.year - start.year) * 12 + date_from.month - start.month
+    index = max(months // (interval * (1 if frequency == RecurringEvent.MONTHLY else 12)) - 1, 0)
+    while nth_occurrence(start, frequency, interval, index) < date_from:
+        index += 1
+    return index
+
+
+def occurrence_dates(recurring_event, date_from, date_to):
+    """
+    Yields the dates of the occurrences of the schedule between `date_from` and `date_to` (inclusive).
+    """
+    if recurring_event.end_date is not None:
+        date_to = min(date_to, recurring_event.end_date)
+    start, frequency, interval = recurring_event.start_date, recurring_event.frequency, recurring_event.interval
+    index = first_index(start, frequency, interval, date_from)
+    while recurring_event.count is None or index < recurring_event.count:
+        day = nth_occurrence(start, frequency, interval, index)
+        if day > date_to:
+            return
+        yield day
+        index += 1
+
+
+def pending_dates(recurring_event, date_to, date_from=None):
+    """
+    The occurrence dates after the materialized ones, from `date_from` to `date_to`.
+    """
+    first = recurring_event.start_date
+    if recurring_event.materialized_until is not None:
+        first = max(first, recurring_event.materialized_until + timedelta(days=1))
+    if date_from is not None:
+        first = max(first, date_from)
+    return occurrence_dates(recurring_event, first, date_to)
+
+
+def projected_occurrences(user_id, date_to, date_from=None):
+    """
+    Yields (recurring event, date) of the occurrences of the user's recurring events from `date_from` to `date_to`
+    that are not stored as events yet, ordered by date. The recurring events have their category, tags and flows
+    loaded.
+    """
+    recurring_events = RecurringEvent.objects.filter(user_id=user_id, start_date__lte=date_to) \
+        .select_related('category').prefetch_related('tags', 'flows').order_by('description', 'id')
+    def keyed(position, recurring_event):
+        # the position breaks the ties of a date
+        for day in pending_dates(recurring_event, date_to, date_from):
+            yield day, position, recurring_event
+
+    for day, _, recurring_event in heapq.merge(*[keyed(position, recurring_event)
+                                                 for position, recurring_event in enumerate(recurring_events)]):
+        yield recurring_event, day
+
+
+def projected_totals(user_id, date_to, date_from=None):
+    """
+    Returns {(month, category_id, event_type): (total, operations)} of the projected occurrences, like the
+    MonthlyTotal rows the events would add to once stored.
+    """
+    totals = defaultdict(lambda: (0, 0))
+    for recurring_event, day in projected_occurrences(user_id, date_to, date_from):
+        flows = recurring_event.flows.all()
+        if not flows:
+            continue
+        key = (month_of(day), recurring_event.category_id, recurring_event.event_type)
+        total, operations = totals[key]
+        totals[key] = (total + sum(flow.flow for flow in flows), operations + len(flows))
+    return dict(totals)
@@ -0,0 +1,176 @@
+"""
+Fast path of the read-only event and operation lists.
+
+The pages are read as `values()` rows joined with the columns of their nested users and resources, and built with
+the RowFormats of the serializers, so the output is the one of EventSerializer and OperationSerializer given the
+same Fieldset. The users, resources and tags repeated across the rows are built once per page and shared by the
+rows. Relations left out by the fieldset are not read, collapsed ones only as primary keys.
+
+The projected occurrences of the recurring events are built the same way, each recurring event once.
+"""
+from collections import OrderedDict, defaultdict
+from django.contrib.auth.models import User
+from ppbudget.fieldsets import FULL, COLLAPSED
+from ppbudget.rows import RowFormat
+from authentication.serializers import UserSerializer
+from tags.models import Tag
+from tags.serializers import TagSerializer
+from events.models import Event, Operation
+from events.serializers import ResourceSerializer, OperationSerializer, EventSerializer, RecurringFlowSerializer
+
+# the nested objects read from joined columns, by serializer and field
+JOINS = {
+    EventSerializer: {'user': UserSerializer},
+    TagSerializer: {'user': UserSerializer},
+    OperationSerializer: {'resource': ResourceSerializer},
+    ResourceSerializer: {'user': UserSerializer},
+}
+
+
+class PageBuilder(object):
+    """
+    Builds the representations of one page, each nested object once.
+    """
+    # of the FULL and COLLAPSED fieldsets, the ones of the requests are compiled per page
+    constant_formats = {}
+
+    def __init__(self):
+        self.formats = {}
+        self.objects = {}
+        self.user_groups = defaultdict(list)
+
+    def format(self, serializer_class, fieldset, prefix=''):
+        # compiled on first use, the serializer fields need the app registry
+        formats = self.constant_formats if fieldset is FULL or fieldset is COLLAPSED else self.formats
+        key = serializer_class, fieldset, prefix
+        if key not in formats:
+            formats[key] = RowFormat(serializer_class(fieldset=fieldset), prefix)
+        return formats[key]
+
+    def columns(self, serializer_class, fieldset, prefix=''):
+        """
+        The values() columns of the representation with the `prefix` joined ones of its nested objects.
+        """
+        columns = [prefix + 'id'] + self.format(serializer_class, fieldset, prefix).columns
+        for name, nested_class in JOINS.get(serializer_class, {}).items():
+            if fieldset.expands(name):
+                columns += self.columns(nested_class, fieldset.child(name), prefix + name + '__')
+        return columns
+
+    def build(self, serializer_class, fieldset, row, prefix='', **nested):
+        """
+        The representation of the row with its joined nested objects, the others are given as `nested`.
+        """
+        row_format = self.format(serializer_class, fieldset, prefix)
+        for name, nested_class in JOINS.get(serializer_class, {}).items():
+            if fieldset.expands(name):
+                nested[name] = self.shared(nested_class, fieldset.child(name), row, prefix + name + '__')
+        if serializer_class is UserSerializer and 'groups' in row_format.nested:
+            # filled in by load_groups once all users of the page are known
+            nested['groups'] = self.user_groups[row[prefix + 'id']]
+        return row_format(row, **nested)
+
+    def shared(self, serializer_class, fieldset, row, prefix):
+        # the same object read through another join is the same representation
+        key = serializer_class, fieldset, row[prefix + 'id']
+        if key not in self.objects:
+            self.objects[key] = self.build(serializer_class, fieldset, row, prefix)
+        return self.objects[key]
+
+    def load_groups(self):
+        """
+        Reads the groups of the users of the page that render them.
+        """
+        if not self.user_groups:
+            return
+        for user_id, group_id in User.groups.through.objects.filter(user_id__in=list(self.user_groups)) \
+                .order_by('user_id', 'group_id').values_list('user_id', 'group_id'):
+            self.user_groups[user_id].append(group_id)
+
+
+def event_values(queryset, fieldset=FULL):
+    """
+    The values() rows of the events of `queryset` with everything `event_rows` needs. The rows keep the fields
+    the queryset is ordered by, for the pagination cursors.
+    """
+    return queryset.values(*unique(PageBuilder().columns(EventSerializer, fieldset) +
+                                   ordering_columns(queryset)))
+
+
+def event_rows(events, fieldset=FULL):
+    """
+    Representations of the `event_values` rows, with their tags and operations.
+    """
+    builder = PageBuilder()
+    ids = [event['id'] for event in events]
+
+    tags = defaultdict(list)
+    if events and fieldset.expands('tags'):
+        tag_fieldset = fieldset.child('tags')
+        for row in Tag.objects.filter(event__in=ids).order_by('event', 'id') \
+                .values('event', *builder.columns(TagSerializer, tag_fieldset)):
+            tags[row['event']].append(builder.shared(TagSerializer, tag_fieldset, row, ''))
+    elif events and fieldset.includes('tags'):
+        for event_id, tag_id in Event.tags.through.objects.filter(event_id__in=ids).order_by('event_id', 'tag_id') \
+                .values_list('event_id', 'tag_id'):
+            tags[event_id].append(tag_id)
+
+    operations = defaultdict(list)
+    if events and fieldset.expands('operations'):
+        operation_fieldset = fieldset.child('operations')
+        for row in Operation.objects.filter(event_id__in=ids).order_by('event_id', 'id') \
+                .values('event_id', *builder.columns(OperationSerializer, operation_fieldset)):
+            operations[row['event_id']].append(builder.build(OperationSerializer, operation_fieldset, row))
+    elif events and fieldset.includes('operations'):
+        for event_id, operation_id in Operation.objects.filter(event_id__in=ids).order_by('event_id', 'id') \
+                .values_list('event_id', 'id'):
+            operations[event_id].append(operation_id)
+
+    rows = [builder.build(EventSerializer, fieldset, event, tags=tags[event['id']],
+                          operations=operations[event['id']]) for event in events]
+    builder.load_groups()
+    return rows
+
+
+def operation_values(queryset, fieldset=FULL):
+    """
+    The values() rows of the operations of `queryset` with everything `operation_rows` needs.
+    """
+    return queryset.values(*unique(PageBuilder().columns(OperationSerializer, fieldset) +
+                                   ordering_columns(queryset)))
+
+
+def operation_rows(operations, fieldset=FULL):
+    builder = PageBuilder()
+    rows = [builder.build(OperationSerializer, fieldset, operation) for operation in operations]
+    builder.load_groups()
+    return rows
+
+
+def ordering_columns(queryset):
+    return [order.lstrip('-') for order in queryset.query.order_by]
+
+
+def unique(columns):
+    return list(OrderedDict.fromkeys(columns))
+
+
+def projected_rows(occurrences):
+    """
+    Representations of the (recurring event, date) occurrences of events.recurrence.projected_occurrences.
+    """
+    shared = {}
+    rows = []
+    for recurring_event, event_date in occurrences:
+        if recurring_event.id not in shared:
+            shared[recurring_event.id] = (
+                recurring_event.description, recurring_event.event_type, recurring_event.category_id,
+                [tag.id for tag in recurring_event.tags.all()],
+                RecurringFlowSerializer(recurring_event.flows.all(), many=True).data)
+        description, event_type, category, tags, operations = shared[recurring_event.id]
+        rows.append(OrderedDict([
+            ('recurring_event', recurring_event.id), ('description', description), ('event_type', event_type),
+            ('event_date', event_date.isoformat()), ('category', category), ('tags', tags),
+            ('operations', operations)
+        ]))
+    return rows
@@ -0,0 +1,55 @@
+"""
+Full-text search of the event descriptions.
+
+On SQLite the descriptions are indexed by the `events_event_fts` FTS5 table, kept up to date by triggers on
+`events_event` (see the 0007 migration), so every write path including bulk inserts and updates is covered.
+Matches are ranked with bm25, best first. Other backends fall back to a case-insensitive substring search
+ordered like the unfiltered list.
+"""
+import re
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+TERM = re.compile(r'\w+', re.UNICODE)
+RANKED_ORDERING = ('search_rank', 'id')
+
+
+def search_terms(text):
+    """
+    Words of the search text, everything else (including the FTS5 query syntax) is ignored.
+    """
+    return TERM.findall(text)
+
+
+def match_query(terms):
+    """
+    FTS5 query matching events with all of the terms, each of them as a word prefix.
+    """
+    return ' '.join('"{0}"*'.format(term) for term in terms)
+
+
+def search_events(queryset, text):
+    """
+    Filters the events by the words (or word prefixes) of the text. On SQLite the result is annotated with
+    `search_rank` and ordered by it.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+
+    if connections[queryset.db].vendor == 'sqlite':
+        # The unary + keeps the index from being probed by event id. Probing runs the whole full-text query for
+        # every event passing the other filters (e.g. a date range), so the planner has to read the matches of
+        # the index first and look the events up by id.
+        return queryset.extra(tables=['events_event_fts'],
+                              where=['"events_event"."id" = +"events_event_fts"."rowid"',
+                                     '"events_event_fts" MATCH %s'],
+                              params=[match_query(terms)]) \
+            .annotate(search_rank=RawSQL('"events_event_fts"."rank"', (), output_field=FloatField())) \
+            .order_by(*RANKED_ORDERING)
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(description__icontains=term)
+    return queryset.filter(condition)
@@ -1,32 +1,88 @@
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
+from ppbudget.fields import NestedPrimaryKeyRelatedField
+from ppbudget.fieldsets import FULL, SparseFieldsetMixin
 from authentication.serializers import UserSerializer
+from categories.models import Category
+from tags.models import Tag
 from tags.serializers import TagSerializer
-from events.models import Resource, Event, Operation
+from events.models import Resource, Event, Operation, RecurringEvent, RecurringFlow
+from events.bulk import create_events
 
 
-class ResourceSerializer(serializers.ModelSerializer):
+class ResourceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True, required=False, default=serializers.CurrentUserDefault())
 
+    @staticmethod
+    def setup_eager_loading(queryset, fieldset=FULL, prefix=''):
+        if fieldset.expands('user'):
+            queryset = UserSerializer.setup_eager_loading(queryset.select_related(prefix + 'user'),
+                                                          fieldset.child('user'), prefix + 'user__')
+        return queryset
+
     class Meta:
         model = Resource
         fields = ('id', 'user', 'name', 'initial_balance', 'current_balance', 'created_at', 'updated_at')
         read_only_fields = ('id', 'current_balance', 'created_at', 'updated_at')
 
 
-class OperationSerializer(serializers.ModelSerializer):
-    resource = ResourceSerializer(read_only=True)
+class OperationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    resource = NestedPrimaryKeyRelatedField(queryset=Resource.objects.select_related('user'),
+                                            serializer_class=ResourceSerializer)
+
+    @staticmethod
+    def setup_eager_loading(queryset, fieldset=FULL, prefix=''):
+        if fieldset.expands('resource'):
+            queryset = ResourceSerializer.setup_eager_loading(queryset.select_related(prefix + 'resource'),
+                                                              fieldset.child('resource'), prefix + 'resource__')
+        return queryset
 
     class Meta:
         model = Operation
         fields = ('id', 'resource', 'event', 'flow', 'created_at', 'updated_at')
-        read_only_fields = ('id', 'resource', 'event', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'event', 'created_at', 'updated_at')
+
+
+def prefetch(queryset, name, related):
+    """
+    Prefetches the `name` relation as `related`, whose own prefetches are made lookups of the queryset, Django
+    runs the longer ones nested in a Prefetch twice.
+    """
+    lookups = ['{0}__{1}'.format(name, lookup) for lookup in related._prefetch_related_lookups]
+    return queryset.prefetch_related(Prefetch(name, queryset=related.prefetch_related(None)), *lookups)
 
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True, required=False, default=serializers.CurrentUserDefault())
-    tags = TagSerializer(many=True)
+    tags = NestedPrimaryKeyRelatedField(many=True, queryset=Tag.objects.select_related('user'),
+                                        serializer_class=TagSerializer)
     operations = OperationSerializer(many=True)
 
+    @staticmethod
+    def setup_eager_loading(queryset, fieldset=FULL):
+        """
+        Loads everything the nested representation touches in a fixed number of queries, whatever the number
+        of events, tags and operations. Collapsed relations only load the primary keys.
+        """
+        if fieldset.expands('user'):
+            queryset = UserSerializer.setup_eager_loading(queryset.select_related('user'), fieldset.child('user'),
+                                                          'user__')
+        if fieldset.expands('tags'):
+            tags = TagSerializer.setup_eager_loading(Tag.objects.all(), fieldset.child('tags'))
+        else:
+            tags = Tag.objects.only('id')
+        if fieldset.expands('operations'):
+            operations = OperationSerializer.setup_eager_loading(Operation.objects.all(), fieldset.child('operations'))
+        else:
+            operations = Operation.objects.only('id', 'event')
+
+        if fieldset.includes('tags'):
+            queryset = prefetch(queryset, 'tags', tags)
+        if fieldset.includes('operations'):
+            queryset = prefetch(queryset, 'operations', operations)
+        return queryset
+
     def validate(self, data):
         if data['category'].event_type != data['event_type']:
             raise serializers.ValidationError('Event type and category type do not match.')
@@ -35,15 +91,18 @@ class EventSerializer(serializers.ModelSerializer):
         if 'tags' in data and data['tags'] and len([tag for tag in data['tags'] if tag.user != data['user']]) > 0:
             raise serializers.ValidationError('Event user and at least one tag user do not match.')
         if 'operations' in data and data['operations'] and \
-                len([operation for operation in data['operations'] if operation.resource.user != data['user']]) > 0:
+                len([operation for operation in data['operations'] if operation['resource'].user != data['user']]) > 0:
             raise serializers.ValidationError('Event user and at least one operation resource user do not match.')
 
+        return data
+
     class Meta:
         model = Event
         fields = ('id', 'user', 'description', 'event_type', 'event_date', 'category', 'tags', 'operations',
-                  'created_at', 'updated_at')
-        read_only_fields = ('id', 'created_at', 'updated_at')
+                  'recurring_event', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'recurring_event', 'created_at', 'updated_at')
 
+    @transaction.atomic
     def create(self, validated_data):
         operations_data = validated_data.pop('operations')
         tags_data = validated_data.pop('tags')
@@ -53,9 +112,161 @@ class EventSerializer(serializers.ModelSerializer):
         for tag_data in tags_data:
             event.tags.add(tag_data)
 
+        # Operation.save applies each flow to its resource's current balance within this transaction
         for operation_data in operations_data:
             Operation.objects.create(event=event, **operation_data)
 
         return event
 
     # TODO update method
+
+
+class RecurringFlowSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecurringFlow
+        fields = ('resource', 'flow')
+
+
+class RecurringEventSerializer(serializers.ModelSerializer):
+    user = UserSerializer(read_only=True, required=False, default=serializers.CurrentUserDefault())
+    flows = RecurringFlowSerializer(many=True)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return UserSerializer.setup_eager_loading(queryset.select_related('user'), prefix='user__') \
+            .prefetch_related('tags', 'flows')
+
+    def validate(self, data):
+        # a partial update validates the changed fields against the stored ones
+        instance = self.instance
+        category = data.get('category', instance and instance.category)
+        event_type = data.get('event_type', instance and instance.event_type)
+        user = instance.user if instance is not None else data['user']
+        if category.event_type != event_type:
+            raise serializers.ValidationError('Event type and category type do not match.')
+        if category.user_id != user.id:
+            raise serializers.ValidationError('Event user and category user do not match.')
+        if any(tag.user_id != user.id for tag in data.get('tags', [])):
+            raise serializers.ValidationError('Event user and at least one tag user do not match.')
+        if any(flow['resource'].user_id != user.id for flow in data.get('flows', [])):
+            raise serializers.ValidationError('Event user and at least one flow resource user do not match.')
+
+        start_date = data.get('start_date', instance and instance.start_date)
+        end_date = data.get('end_date', instance and instance.end_date)
+        if end_date is not None and end_date < start_date:
+            raise serializers.ValidationError('The end date must not be earlier than the start date.')
+        if data.get('interval') == 0 or data.get('count') == 0:
+            raise serializers.ValidationError('The interval and count must be positive.')
+
+        return data
+
+    class Meta:
+        model = RecurringEvent
+        fields = ('id', 'user', 'description', 'event_type', 'category', 'tags', 'flows', 'frequency', 'interval',
+                  'start_date', 'end_date', 'count', 'materialized_until', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'materialized_until', 'created_at', 'updated_at')
+
+    @transaction.atomic
+    def create(self, validated_data):
+        flows_data = validated_data.pop('flows')
+        tags = validated_data.pop('tags', [])
+
+        recurring_event = RecurringEvent.objects.create(**validated_data)
+        recurring_event.tags.set(tags)
+        RecurringFlow.objects.bulk_create([RecurringFlow(recurring_event=recurring_event, **flow_data)
+                                           for flow_data in flows_data])
+
+        return recurring_event
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        """
+        Replaces the tags and flows when given, the stored occurrences are kept.
+        """
+        flows_data = validated_data.pop('flows', None)
+        tags = validated_data.pop('tags', None)
+
+        recurring_event = super(RecurringEventSerializer, self).update(instance, validated_data)
+        if tags is not None:
+            recurring_event.tags.set(tags)
+        if flows_data is not None:
+            recurring_event.flows.all().delete()
+            RecurringFlow.objects.bulk_create([RecurringFlow(recurring_event=recurring_event, **flow_data)
+                                               for flow_data in flows_data])
+
+        return recurring_event
+
+
+class BalanceSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class EventBatchOperationSerializer(serializers.Serializer):
+    resource = serializers.IntegerField()
+    flow = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class EventBatchListSerializer(serializers.ListSerializer):
+    max_length = 1000
+
+    def validate(self, data):
+        """
+        Resolves the categories, tags and resources of the whole batch with one query per model.
+        """
+        if not data:
+            raise serializers.ValidationError('At least one event is required.')
+        if len(data) > self.max_length:
+            raise serializers.ValidationError('At most {0} events can be created at once.'.format(self.max_length))
+
+        user = self.context['request'].user
+        categories = Category.objects.in_bulk({event['category'] for event in data})
+        tags = Tag.objects.in_bulk({tag_id for event in data for tag_id in event.get('tags', [])})
+        resources = Resource.objects.in_bulk({operation['resource'] for event in data
+                                              for operation in event['operations']})
+
+        errors = []
+        for index, event in enumerate(data):
+            category = categories.get(event['category'])
+            if category is None:
+                errors.append('Event {0}: Category {1} does not exist.'.format(index, event['category']))
+            elif category.event_type != event['event_type']:
+                errors.append('Event {0}: Event type and category type do not match.'.format(index))
+            elif category.user_id != user.id:
+                errors.append('Event {0}: Event user and category user do not match.'.format(index))
+            if any(tags.get(tag_id) is None or tags[tag_id].user_id != user.id for tag_id in event.get('tags', [])):
+                errors.append('Event {0}: Event user and at least one tag user do not match.'.format(index))
+            if any(resources.get(operation['resource']) is None or
+                   resources[operation['resource']].user_id != user.id for operation in event['operations']):
+                errors.append('Event {0}: Event user and at least one operation resource user do not match.'
+                              .format(index))
+            if errors:
+                continue
+
+            event['category'] = category
+            event['tags'] = [tags[tag_id] for tag_id in event.get('tags', [])]
+            for operation in event['operations']:
+                operation['resource'] = resources[operation['resource']]
+
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        return data
+
+    def create(self, validated_data):
+        return create_events(validated_data[0]['user'], validated_data)
+
+
+class EventBatchSerializer(serializers.ModelSerializer):
+    """
+    Input of a single event of the batch endpoint, related objects are given by id and resolved for the whole
+    batch by EventBatchListSerializer.
+    """
+    category = serializers.IntegerField()
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+    operations = EventBatchOperationSerializer(many=True)
+
+    class Meta:
+        model = Event
+        fields = ('description', 'event_type', 'event_date', 'category', 'tags', 'operations')
+        list_serializer_class = EventBatchListSerializer
@@ -1,10 +1,36 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+from django.test import RequestFactory, SimpleTestCase, TestCase
 from datetime import date
-from django.contrib.auth.models import User
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.db import NotSupportedError, connection
+from django.db.models import Sum
+from django.contrib.auth.models import User, Group
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APITestCase
+from ppbudget.fieldsets import fieldset_param
+from ppbudget.testing import QueryBudgetMixin
+from authentication.models import ChangeMarker
 from dictionaries.models import EventType
-from categories.models import Category
+from categories.models import Category, CategoryClosure
+from reports.models import MonthlyTotal
 from tags.models import Tag
-from events.models import Resource, Operation, Event
+from jobs.models import Job
+from events.models import Resource, Operation, Event, BalanceCheckpoint, RecurringEvent, RecurringFlow
+from events.bulk import create_events
+from events.exports import export_events
+from events.importers import parse_amount
+from events.recurrence import occurrence_dates, projected_occurrences
+from events.rows import event_values, event_rows, operation_values, operation_rows
+from events.serializers import EventSerializer, OperationSerializer
 
 
 class EventTestCase(TestCase):
@@ -41,3 +67,1105 @@ class EventTestCase(TestCase):
         self.assertIsNotNone(event.tags.get(name='test_tag_2'))
         self.assertEquals(len(event.operations.all()), 2)
         self.assertEquals(event.operations.get(flow=-9.99).resource.name, 'test_resource_1')
+
+
+class ResourceBalanceTestCase(APITestCase):
+    def setUp(self):
+        test_user_1 = User.objects.create(username='test_user_1')
+        test_user_2 = User.objects.create(username='test_user_2')
+        Category.objects.create(user=test_user_1, name='test_category_1', event_type=EventType.EXPENSE)
+        Category.objects.create(user=test_user_2, name='test_category_2', event_type=EventType.EXPENSE)
+        Tag.objects.create(user=test_user_1, name='test_tag_1')
+        Resource.objects.create(user=test_user_1, name='test_resource_1', initial_balance=100)
+        Resource.objects.create(user=test_user_1, name='test_resource_2', initial_balance=50)
+        Resource.objects.create(user=test_user_2, name='test_resource_3', initial_balance=10)
+
+    def post_event(self, user, operations, category_name='test_category_1'):
+        url = '/api/v1/events/'
+        data = {
+            'description': 'test_description', 'event_type': EventType.EXPENSE, 'event_date': '2016-05-20',
+            'category': Category.objects.get(name=category_name).id,
+            'tags': [Tag.objects.get(name='test_tag_1').id],
+            'operations': [{'resource': Resource.objects.get(name=name).id, 'flow': flow}
+                           for name, flow in operations]
+        }
+
+        self.client.force_login(user)
+        return self.client.post(url, data, format='json')
+
+    def assertBalance(self, name, balance):
+        self.assertEquals(Resource.objects.get(name=name).current_balance, Decimal(balance))
+
+    def test_post_event_updates_balances(self):
+        user = User.objects.get(username='test_user_1')
+
+        response = self.post_event(user, [('test_resource_1', '-10.25'), ('test_resource_2', '20.00')])
+
+        # test view and serializer
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(len(response.data['operations']), 2)
+        self.assertEquals(response.data['tags'][0]['name'], 'test_tag_1')
+        self.assertEquals(response.data['operations'][0]['resource']['name'], 'test_resource_1')
+        # test model
+        self.assertBalance('test_resource_1', '89.75')
+        self.assertBalance('test_resource_2', '70.00')
+
+    def test_post_event_foreign_resource(self):
+        user = User.objects.get(username='test_user_1')
+
+        response = self.post_event(user, [('test_resource_1', '-10.00'), ('test_resource_3', '-5.00')])
+
+        # test view and serializer
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Event user and at least one operation resource user do not match.',
+                      response.data['non_field_errors'])
+        # test model
+        self.assertFalse(Operation.objects.exists())
+        self.assertBalance('test_resource_1', '100.00')
+        self.assertBalance('test_resource_3', '10.00')
+
+    def test_delete_event_reverts_balances(self):
+        user = User.objects.get(username='test_user_1')
+        response = self.post_event(user, [('test_resource_1', '-10.00'), ('test_resource_2', '-5.00')])
+        url = '/api/v1/events/' + str(response.data['id']) + '/'
+
+        response = self.client.delete(url)
+
+        self.assertEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Operation.objects.exists())
+        self.assertBalance('test_resource_1', '100.00')
+        self.assertBalance('test_resource_2', '50.00')
+
+    def test_operation_update_moves_delta(self):
+        user = User.objects.get(username='test_user_1')
+        self.post_event(user, [('test_resource_1', '-10.00')])
+
+        operation = Operation.objects.get()
+        operation.flow = Decimal('-15.00')
+        operation.save()
+        self.assertBalance('test_resource_1', '85.00')
+
+        operation.resource = Resource.objects.get(name='test_resource_2')
+        operation.save()
+        self.assertBalance('test_resource_1', '100.00')
+        self.assertBalance('test_resource_2', '35.00')
+
+        operation.delete()
+        self.assertBalance('test_resource_2', '50.00')
+
+    def test_resource_update_keeps_balance(self):
+        user = User.objects.get(username='test_user_1')
+        self.post_event(user, [('test_resource_1', '-10.00')])
+        stale_resource = Resource.objects.get(name='test_resource_1')
+        self.post_event(user, [('test_resource_1', '-20.00')])
+
+        stale_resource.name = 'renamed_test_resource_1'
+        stale_resource.save()
+        self.assertBalance('renamed_test_resource_1', '70.00')
+
+        stale_resource.initial_balance = Decimal('200.00')
+        stale_resource.save()
+        self.assertEquals(stale_resource.current_balance, Decimal('170.00'))
+        self.assertBalance('renamed_test_resource_1', '170.00')
+
+    def test_rebuild_balances_command(self):
+        user = User.objects.get(username='test_user_1')
+        self.post_event(user, [('test_resource_1', '-10.00'), ('test_resource_2', '-5.00')])
+        Resource.objects.update(current_balance=0)
+        out = StringIO()
+
+        call_command('rebuild_balances', batch_size=2, stdout=out)
+
+        self.assertIn('Checked 3 resources, 3 fixed.', out.getvalue())
+        self.assertBalance('test_resource_1', '90.00')
+        self.assertBalance('test_resource_2', '45.00')
+        self.assertBalance('test_resource_3', '10.00')
+
+
+class UserEventsPaginationTestCase(APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        test_category = Category.objects.create(user=test_user, name='test_category', event_type=EventType.EXPENSE)
+        test_resource = Resource.objects.create(user=test_user, name='test_resource', initial_balance=100)
+
+        # two events share each date and the same description to exercise every tie-breaker
+        for day, description in [(1, 'a'), (1, 'b'), (2, 'a'), (2, 'a'), (3, 'c'), (3, 'a'), (4, 'b')]:
+            event = Event.objects.create(user=test_user, description=description, event_type=EventType.EXPENSE,
+                                         event_date=date(2016, 5, day), category=test_category)
+            Operation.objects.create(event=event, resource=test_resource, flow=-day)
+
+    def get_pages(self, url, link='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            url = response.data[link]
+        return pages
+
+    def test_get_user_events_pages(self):
+        user = User.objects.get(username='test_user')
+        expected = list(Event.objects.order_by('-event_date', 'description', 'id').values_list('id', flat=True))
+
+        self.client.force_login(user)
+        pages = self.get_pages('/api/v1/users/' + user.username + '/events/?page_size=3')
+
+        self.assertEquals([len(page['results']) for page in pages], [3, 3, 1])
+        self.assertIsNone(pages[0]['previous'])
+        self.assertEquals([event['id'] for page in pages for event in page['results']], expected)
+
+        backwards = self.get_pages(pages[-1]['previous'], link='previous')
+        self.assertEquals([event['id'] for page in reversed(backwards) for event in page['results']], expected[:6])
+        self.assertIsNotNone(backwards[0]['next'])
+
+    def test_get_resource_operations_pages(self):
+        user = User.objects.get(username='test_user')
+        resource = Resource.objects.get(name='test_resource')
+        expected = list(Operation.objects.order_by('-event__event_date', 'id').values_list('id', flat=True))
+
+        self.client.force_login(user)
+        pages = self.get_pages('/api/v1/resources/' + str(resource.id) + '/operations/?page_size=2')
+
+        self.assertEquals(len(pages), 4)
+        self.assertEquals([operation['id'] for page in pages for operation in page['results']], expected)
+
+    def test_get_user_events_in_category_subtree(self):
+        user = User.objects.get(username='test_user')
+        parent = Category.objects.get(name='test_category')
+        child = Category.objects.create(user=user, parent=parent, name='test_child_category',
+                                        event_type=EventType.EXPENSE)
+        other = Category.objects.create(user=user, name='test_other_category', event_type=EventType.EXPENSE)
+        Event.objects.filter(description='b').update(category=child)
+        Event.objects.filter(description='c').update(category=other)
+        url = '/api/v1/users/' + user.username + '/events/?page_size=100&category='
+
+        self.client.force_login(user)
+
+        response = self.client.get(url + str(parent.id))
+        self.assertEquals(len(response.data['results']), 6)
+        response = self.client.get(url + str(child.id))
+        self.assertEquals({event['description'] for event in response.data['results']}, {'b'})
+        self.assertEquals(len(response.data['results']), 2)
+
+    def test_get_user_events_invalid_cursor(self):
+        user = User.objects.get(username='test_user')
+
+        self.client.force_login(user)
+        response = self.client.get('/api/v1/users/' + user.username + '/events/?cursor=invalid')
+
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class EventQueriesTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user', is_staff=True)
+        test_user.groups.add(Group.objects.create(name='test_group'))
+        Category.objects.create(user=test_user, name='test_category', event_type=EventType.EXPENSE)
+        Tag.objects.create(user=test_user, name='test_tag_1')
+        Tag.objects.create(user=test_user, name='test_tag_2')
+        Resource.objects.create(user=test_user, name='test_resource_1', initial_balance=100)
+        Resource.objects.create(user=test_user, name='test_resource_2', initial_balance=100)
+        self.add_events(3)
+
+        self.client.force_login(test_user)
+
+    def add_events(self, count):
+        user = User.objects.get(username='test_user')
+        category = Category.objects.get(name='test_category')
+        tags = list(Tag.objects.all())
+        resources = list(Resource.objects.all())
+
+        for _ in range(count):
+            event = Event.objects.create(user=user, description='test_description', event_type=EventType.EXPENSE,
+                                         event_date=date.today(), category=category)
+            event.tags.add(*tags)
+            for resource in resources:
+                Operation.objects.create(event=event, resource=resource, flow=-1)
+
+    def add_operation(self, event):
+        resource = Resource.objects.create(user=event.user, name='test_resource_3', initial_balance=100)
+        Operation.objects.create(event=event, resource=resource, flow=-1)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_get_user_events_queries(self):
+        # session, user, change marker, events, tags, operations, user groups
+        self.assertConstantQueries(7, lambda: self.get('/api/v1/users/test_user/events/?page_size=100'),
+                                   lambda: self.add_events(5))
+
+    def test_get_event_queries(self):
+        event = Event.objects.first()
+
+        with self.assertMaxQueries(8):
+            response = self.get('/api/v1/events/' + str(event.id) + '/')
+
+        self.assertEquals(len(response.data['tags']), 2)
+        self.assertEquals(len(response.data['operations']), 2)
+        self.assertEquals(response.data['operations'][0]['resource']['user']['groups'], [Group.objects.get().id])
+
+    def test_get_all_events_queries(self):
+        self.assertConstantQueries(9, lambda: self.get('/api/v1/events/'), lambda: self.add_events(5))
+
+    def test_get_resource_operations_queries(self):
+        resource = Resource.objects.get(name='test_resource_1')
+
+        # session, user, operations, user groups
+        self.assertConstantQueries(4, lambda: self.get('/api/v1/resources/' + str(resource.id) + '/operations/'),
+                                   lambda: self.add_events(5))
+
+    def test_get_event_operations_queries(self):
+        event = Event.objects.first()
+
+        self.assertConstantQueries(4, lambda: self.get('/api/v1/events/' + str(event.id) + '/operations/'),
+                                   lambda: self.add_operation(event))
+
+    def test_get_operations_not_owned(self):
+        other_user = User.objects.create(username='other_user')
+        resource = Resource.objects.get(name='test_resource_1')
+        event = Event.objects.first()
+        empty_resource = Resource.objects.create(user=resource.user, name='test_resource_3', initial_balance=0)
+
+        self.assertEquals(self.client.get('/api/v1/resources/999/operations/').status_code,
+                          status.HTTP_404_NOT_FOUND)
+        self.assertEquals(self.client.get('/api/v1/events/abc/operations/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEquals(self.get('/api/v1/resources/' + str(empty_resource.id) + '/operations/').data['results'],
+                          [])
+
+        self.client.force_login(other_user)
+        self.assertEquals(self.client.get('/api/v1/resources/' + str(resource.id) + '/operations/').status_code,
+                          status.HTTP_404_NOT_FOUND)
+        self.assertEquals(self.client.get('/api/v1/events/' + str(event.id) + '/operations/').status_code,
+                          status.HTTP_404_NOT_FOUND)
+
+    def test_get_user_resources_and_tags_queries(self):
+        with self.assertMaxQueries(5):
+            self.get('/api/v1/users/test_user/resources/')
+        with self.assertMaxQueries(5):
+            self.get('/api/v1/users/test_user/tags/')
+
+
+class EventRowsTestCase(TestCase):
+    def setUp(self):
+        self.test_user = User.objects.create(username='test_user', email='test@example.com')
+        self.test_user.groups.add(Group.objects.create(name='test_group_1'), Group.objects.create(name='test_group_2'))
+        other_user = User.objects.create(username='other_user')
+        category = Category.objects.create(user=self.test_user, name='food', event_type=EventType.EXPENSE)
+        tags = [Tag.objects.create(user=self.test_user, name=name) for name in ('b', 'a')]
+        resources = [Resource.objects.create(user=self.test_user, name=name, initial_balance=balance)
+                     for name, balance in (('cash', Decimal('10.5')), ('card', 0))]
+        # a resource without a current balance
+        Resource.objects.filter(name='card').update(current_balance=None)
+        other_tag = Tag.objects.create(user=other_user, name='c')
+
+        for day, flows in ((1, ['-1.25', '-3']), (1, []), (2, ['0.1'])):
+            event = Event.objects.create(user=self.test_user, description='event {0}'.format(day),
+                                         event_type=EventType.EXPENSE, event_date=date(2016, 1, day),
+                                         category=category)
+            event.tags.add(*tags[:len(flows)])
+            for resource, flow in zip(resources, flows):
+                Operation.objects.create(event=event, resource=resource, flow=Decimal(flow))
+        event.tags.add(other_tag)
+
+    def test_event_rows(self):
+        queryset = Event.objects.filter(user=self.test_user).order_by('-event_date', 'description', 'id')
+
+        expected = EventSerializer(EventSerializer.setup_eager_loading(queryset), many=True).data
+
+        self.assertEquals(JSONRenderer().render(event_rows(list(event_values(queryset)))),
+                          JSONRenderer().render(expected))
+
+    def test_event_rows_fieldsets(self):
+        queryset = Event.objects.filter(user=self.test_user).order_by('-event_date', 'description', 'id')
+
+        for query in ('fields=id,event_date,operations.flow', 'expand=', 'expand=tags,operations',
+                      'fields=user.username,tags.name,tags.user&expand=operations.resource',
+                      'fields=description,operations.resource.user.groups'):
+            fieldset = fieldset_param(Request(RequestFactory().get('/?' + query)))
+
+            expected = EventSerializer(EventSerializer.setup_eager_loading(queryset, fieldset), many=True,
+                                       fieldset=fieldset).data
+
+            self.assertEquals(JSONRenderer().render(event_rows(list(event_values(queryset, fieldset)), fieldset)),
+                              JSONRenderer().render(expected), query)
+
+    def test_operation_rows(self):
+        queryset = Operation.objects.filter(resource__user=self.test_user).order_by('-event_date', 'id')
+
+        expected = OperationSerializer(OperationSerializer.setup_eager_loading(queryset), many=True).data
+
+        self.assertEquals(JSONRenderer().render(operation_rows(list(operation_values(queryset)))),
+                          JSONRenderer().render(expected))
+
+    def test_shared_nested_objects(self):
+        rows = event_rows(list(event_values(Event.objects.filter(user=self.test_user).order_by('id'))))
+
+        self.assertIs(rows[0]['user'], rows[1]['user'])
+        self.assertIs(rows[0]['operations'][0]['resource']['user'], rows[0]['user'])
+        self.assertIs(rows[0]['tags'][0], rows[2]['tags'][0])
+
+
+class SparseFieldsetTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user', is_staff=True)
+        category = Category.objects.create(user=test_user, name='food', event_type=EventType.EXPENSE)
+        tag = Tag.objects.create(user=test_user, name='bread')
+        self.resource = Resource.objects.create(user=test_user, name='cash', initial_balance=100)
+        for day in range(1, 6):
+            event = Event.objects.create(user=test_user, description='bakery', event_type=EventType.EXPENSE,
+                                         event_date=date(2016, 1, day), category=category)
+            event.tags.add(tag)
+            Operation.objects.create(event=event, resource=self.resource, flow=-day)
+        self.event = event
+
+        self.client.force_login(test_user)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_user_events_fields(self):
+        full = self.get('/api/v1/users/test_user/events/')
+
+        # session, user, change marker, events
+        with self.assertMaxQueries(4):
+            response = self.get('/api/v1/users/test_user/events/?fields=id,event_date,category')
+
+        self.assertEquals(list(response.data['results'][0]), ['id', 'event_date', 'category'])
+        self.assertLess(len(response.content) * 5, len(full.content))
+
+    def test_user_events_expand(self):
+        # session, user, change marker, events, tag ids, operations with their resources
+        with self.assertMaxQueries(6):
+            response = self.get('/api/v1/users/test_user/events/?expand=operations.resource')
+
+        event = response.data['results'][0]
+        self.assertEquals(event['user'], self.event.user_id)
+        self.assertEquals(event['tags'], [Tag.objects.get().id])
+        self.assertEquals(event['operations'][0]['resource']['name'], 'cash')
+        self.assertEquals(event['operations'][0]['resource']['user'], self.event.user_id)
+
+    def test_user_events_nested_fields(self):
+        response = self.get('/api/v1/users/test_user/events/?fields=description,operations.flow&page_size=2')
+
+        self.assertEquals(response.data['results'][0], {'description': 'bakery', 'operations': [{'flow': '-5.00'}]})
+        self.assertEquals(len(self.get(response.data['next']).data['results']), 2)
+
+    def test_resource_operations_fields(self):
+        response = self.get('/api/v1/resources/{0}/operations/?fields=flow,resource.name'.format(self.resource.id))
+
+        self.assertEquals(response.data['results'][0], {'flow': '-5.00', 'resource': {'name': 'cash'}})
+
+    def test_serializer_views(self):
+        # session, user, event, tag ids
+        with self.assertMaxQueries(4):
+            response = self.get('/api/v1/events/{0}/?fields=id,tags,user&expand='.format(self.event.id))
+
+        self.assertEquals(response.data, {'id': self.event.id, 'tags': [Tag.objects.get().id],
+                                          'user': self.event.user_id})
+        response = self.get('/api/v1/events/{0}/operations/?expand='.format(self.event.id))
+        self.assertEquals(response.data['results'][0]['resource'], self.resource.id)
+        response = self.get('/api/v1/resources/?fields=name')
+        self.assertEquals(response.data['results'], [{'name': 'cash'}])
+        response = self.get('/api/v1/users/test_user/tags/?fields=name,user.username')
+        self.assertEquals(response.data['results'], [{'name': 'bread', 'user': {'username': 'test_user'}}])
+
+    def test_invalid_fields(self):
+        for query in ('fields=unknown', 'fields=', 'fields=operations.', 'expand=description',
+                      'fields=operations.unknown'):
+            response = self.client.get('/api/v1/users/test_user/events/?' + query)
+            self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+        response = self.client.get('/api/v1/events/?fields=unknown')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EventTagsTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        other_user = User.objects.create(username='other_user')
+        category = Category.objects.create(user=test_user, name='test_category', event_type=EventType.EXPENSE)
+        self.tags = {name: Tag.objects.create(user=test_user, name=name) for name in ('a', 'b', 'c')}
+
+        for description, names in [('none', ''), ('a', 'a'), ('ab', 'ab'), ('abc', 'abc'), ('bc', 'bc')]:
+            event = Event.objects.create(user=test_user, description=description, event_type=EventType.EXPENSE,
+                                         event_date=date(2016, 5, 1), category=category)
+            event.tags.add(*[self.tags[name] for name in names])
+
+        self.other_user = other_user
+        self.client.force_login(test_user)
+
+    def get_descriptions(self, query):
+        response = self.client.get('/api/v1/users/test_user/events/' + query)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return sorted(event['description'] for event in response.data['results'])
+
+    def ids(self, names):
+        return ','.join(str(self.tags[name].id) for name in names)
+
+    def test_tags_all(self):
+        self.assertEquals(self.get_descriptions('?tags_all=' + self.ids('ab')), ['ab', 'abc'])
+        self.assertEquals(self.get_descriptions('?tags_all=' + self.ids('abc')), ['abc'])
+        # repeated ids count once
+        self.assertEquals(self.get_descriptions('?tags_all=' + self.ids('cc')), ['abc', 'bc'])
+
+    def test_tags_any(self):
+        self.assertEquals(self.get_descriptions('?tags_any=' + self.ids('ac')), ['a', 'ab', 'abc', 'bc'])
+
+    def test_tags_none(self):
+        self.assertEquals(self.get_descriptions('?tags_none=' + self.ids('a')), ['bc', 'none'])
+
+    def test_tags_combined(self):
+        query = '?tags_any={0}&tags_none={1}'.format(self.ids('ab'), self.ids('c'))
+
+        self.assertEquals(self.get_descriptions(query), ['a', 'ab'])
+
+    def test_tags_queries(self):
+        # session, user, change marker, events, tags, operations, user groups
+        with self.assertMaxQueries(7):
+            self.get_descriptions('?tags_all={0}&tags_any={1}&tags_none={1}'.format(self.ids('ab'), self.ids('c')))
+
+    def test_tags_invalid(self):
+        for query in ('?tags_all=a', '?tags_any=', '?tags_none=1,-2'):
+            response = self.client.get('/api/v1/users/test_user/events/' + query)
+            self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_event_tags(self):
+        event = Event.objects.get(description='abc')
+
+        response = self.client.get('/api/v1/events/{0}/tags/?page_size=2'.format(event.id))
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals([tag['name'] for tag in response.data['results']], ['a', 'b'])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_get_event_tags_other_user(self):
+        event = Event.objects.get(description='abc')
+        self.client.force_login(self.other_user)
+
+        response = self.client.get('/api/v1/events/{0}/tags/'.format(event.id))
+
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class EventSearchTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        other_user = User.objects.create(username='other_user')
+        category = Category.objects.create(user=test_user, name='test_category', event_type=EventType.EXPENSE)
+        other_category = Category.objects.create(user=other_user, name='test_category',
+                                                 event_type=EventType.EXPENSE)
+
+        for day, description in [(1, 'Groceries at the market'), (2, 'Market fees'), (3, 'Rent'),
+                                 (4, 'Market groceries, market snacks'), (5, "Grocer's bill")]:
+            Event.objects.create(user=test_user, description=description, event_type=EventType.EXPENSE,
+                                 event_date=date(2016, 5, day), category=category)
+        Event.objects.create(user=other_user, description='Groceries', event_type=EventType.EXPENSE,
+                             event_date=date(2016, 5, 1), category=other_category)
+
+        self.client.force_login(test_user)
+
+    def search(self, query):
+        response = self.client.get('/api/v1/users/test_user/events/?q=' + query)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return [event['description'] for event in response.data['results']]
+
+    def test_search_prefixes(self):
+        self.assertEquals(sorted(self.search('groc')),
+                          ["Grocer's bill", 'Groceries at the market', 'Market groceries, market snacks'])
+        # every word has to match
+        self.assertEquals(sorted(self.search('MAR gro')),
+                          ['Groceries at the market', 'Market groceries, market snacks'])
+
+    def test_search_ranked(self):
+        # two matches in the shortest description rank first
+        self.assertEquals(self.search('market')[0], 'Market groceries, market snacks')
+        self.assertEquals(self.search('market')[1], 'Market fees')
+
+    def test_search_with_dates(self):
+        self.assertEquals(self.search('market&from=2016-05-02&to=2016-05-03'), ['Market fees'])
+
+    def test_search_query_syntax_ignored(self):
+        self.assertEquals(self.search('"rent" OR'), [])
+        self.assertEquals(self.search('rent*'), ['Rent'])
+        self.assertEquals(self.search('%22%28'), [])
+
+    def test_search_follows_writes(self):
+        event = Event.objects.get(description='Rent')
+        event.description = 'Rent and utilities'
+        event.save()
+        Event.objects.filter(description='Market fees').delete()
+
+        self.assertEquals(self.search('util'), ['Rent and utilities'])
+        self.assertEquals(self.search('fees'), [])
+
+    def test_search_pages(self):
+        response = self.client.get('/api/v1/users/test_user/events/?q=market&page_size=2')
+        first = [event['description'] for event in response.data['results']]
+        response = self.client.get(response.data['next'])
+        second = [event['description'] for event in response.data['results']]
+
+        self.assertEquals(first + second, self.search('market'))
+        self.assertIsNone(response.data['next'])
+
+    def test_search_queries(self):
+        # session, user, change marker, events, tags, operations, user groups
+        with self.assertMaxQueries(7):
+            self.search('market')
+
+
+class EventBatchTestCase(QueryBudgetMixin, APITestCase):
+    url = '/api/v1/events/batch/'
+
+    def setUp(self):
+        test_user_1 = User.objects.create(username='test_user_1')
+        test_user_2 = User.objects.create(username='test_user_2')
+        Category.objects.create(user=test_user_1, name='test_category_1', event_type=EventType.EXPENSE)
+        Category.objects.create(user=test_user_1, name='test_category_2', event_type=EventType.INCOME)
+        Tag.objects.create(user=test_user_1, name='test_tag_1')
+        Tag.objects.create(user=test_user_1, name='test_tag_2')
+        Tag.objects.create(user=test_user_2, name='test_tag_3')
+        Resource.objects.create(user=test_user_1, name='test_resource_1', initial_balance=100)
+        Resource.objects.create(user=test_user_1, name='test_resource_2', initial_balance=100)
+
+        self.client.force_login(test_user_1)
+
+    def event_data(self, index, category='test_category_1', event_type=EventType.EXPENSE, tags=('test_tag_1',),
+                   resource='test_resource_1', flow='-1.50'):
+        return {
+            'description': 'test_description_' + str(index), 'event_type': event_type, 'event_date': '2016-05-20',
+            'category': Category.objects.get(name=category).id,
+            'tags': [Tag.objects.get(name=name).id for name in tags],
+            'operations': [{'resource': Resource.objects.get(name=resource).id, 'flow': flow}]
+        }
+
+    def test_post_batch(self):
+        data = [self.event_data(index) for index in range(50)]
+        data.append(self.event_data(50, category='test_category_2', event_type=EventType.INCOME,
+                                    tags=('test_tag_1', 'test_tag_2'), resource='test_resource_2', flow='200.00'))
+
+        # session, user, 3 lookups, savepoint, 3 inserts, id read back, 2 balance updates, 2 report updates,
+        # savepoint, report insert, release, checkpoint lookup, change marker update, release,
+        # 6 to render the created events
+        with self.assertMaxQueries(26):
+            response = self.client.post(self.url, data, format='json')
+
+        # test view and serializer
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(len(response.data), 51)
+        self.assertEquals(response.data[0]['description'], 'test_description_0')
+        self.assertEquals(response.data[50]['description'], 'test_description_50')
+        self.assertEquals(len(response.data[50]['tags']), 2)
+        self.assertEquals(response.data[50]['operations'][0]['resource']['name'], 'test_resource_2')
+        # test model
+        self.assertEquals(Event.objects.count(), 51)
+        self.assertEquals(Operation.objects.count(), 51)
+        self.assertEquals(Event.objects.get(description='test_description_50').tags.count(), 2)
+        self.assertEquals(Resource.objects.get(name='test_resource_1').current_balance, Decimal('25.00'))
+        self.assertEquals(Resource.objects.get(name='test_resource_2').current_balance, Decimal('300.00'))
+
+    def test_post_batch_invalid(self):
+        data = [self.event_data(0), self.event_data(1, event_type=EventType.INCOME),
+                self.event_data(2, tags=('test_tag_3',))]
+
+        response = self.client.post(self.url, data, format='json')
+
+        # test view and serializer
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(response.data['non_field_errors'], [
+            'Event 1: Event type and category type do not match.',
+            'Event 2: Event user and at least one tag user do not match.'
+        ])
+        # test model
+        self.assertFalse(Event.objects.exists())
+        self.assertEquals(Resource.objects.get(name='test_resource_1').current_balance, Decimal('100.00'))
+
+    def test_post_batch_empty(self):
+        response = self.client.post(self.url, [], format='json')
+
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ids_not_returned(self):
+        user = User.objects.get(username='test_user_1')
+        events = [{'description': 'test', 'event_type': EventType.EXPENSE, 'event_date': date(2016, 5, 20),
+                   'category': Category.objects.get(name='test_category_1'), 'operations': []}]
+
+        # the newest ids of the user are only read back under the write lock of SQLite
+        with mock.patch.object(connection, 'vendor', 'other'), self.assertRaises(NotSupportedError):
+            create_events(user, events)
+        self.assertFalse(Event.objects.exists())
+
+
+class ImportStatementTestCase(TestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        Category.objects.create(user=test_user, name='food', event_type=EventType.EXPENSE)
+        Resource.objects.create(user=test_user, name='test_resource', initial_balance=100)
+
+    def import_statement(self, content, suffix, **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as statement:
+            statement.write(content)
+        self.addCleanup(os.remove, statement.name)
+        out = StringIO()
+
+        call_command('import_statement', statement.name, '--user=test_user', '--resource=test_resource', stdout=out,
+                     **options)
+        return out.getvalue()
+
+    def test_import_csv(self):
+        content = 'date,amount,description,category,tags\n' \
+                  '2016-05-01,-10.50,Groceries,food,shop;weekly\n' \
+                  '2016-05-02,"1,000.00",Salary,,\n' \
+                  '2016-05-03,-2,Bread,food,shop\n'
+
+        out = self.import_statement(content, '.csv', chunk_size=2)
+
+        self.assertIn('Rows 1-2 imported', out)
+        self.assertIn('Rows 3-3 imported', out)
+        self.assertIn('Imported 3 rows', out)
+        self.assertEquals(Event.objects.count(), 3)
+        self.assertEquals(Event.objects.get(description='Groceries').category.name, 'food')
+        self.assertEquals(Event.objects.get(description='Groceries').tags.count(), 2)
+        self.assertEquals(Event.objects.get(description='Salary').category.name, 'Imported')
+        self.assertEquals(Event.objects.get(description='Salary').event_type, EventType.INCOME)
+        self.assertEquals(Tag.objects.count(), 2)
+        self.assertEquals(Resource.objects.get().current_balance, Decimal('1087.50'))
+
+    def test_import_csv_resume(self):
+        content = 'date,amount,description\n' \
+                  '2016-05-01,-1,first\n' \
+                  '2016-05-02,-2,second\n' \
+                  '2016-05-03,-3,third\n' \
+                  '2016-05-04,invalid,fourth\n' \
+                  '2016-05-05,-5,fifth\n'
+
+        with self.assertRaisesRegex(CommandError, "Row 4: invalid amount 'invalid'.\n2 rows imported, "
+                                                  "resume with --start-row 3."):
+            self.import_statement(content, '.csv', chunk_size=2)
+        self.assertEquals(Event.objects.count(), 2)
+
+        self.import_statement(content.replace('invalid', '-4'), '.csv', chunk_size=2, start_row=3)
+        self.assertEquals(list(Event.objects.order_by('event_date').values_list('description', flat=True)),
+                          ['first', 'second', 'third', 'fourth', 'fifth'])
+        self.assertEquals(Resource.objects.get().current_balance, Decimal('85.00'))
+
+    def test_parse_amount(self):
+        self.assertEquals(parse_amount('1.234,56'), Decimal('1234.56'))
+        self.assertEquals(parse_amount('1,234.56'), Decimal('1234.56'))
+        self.assertEquals(parse_amount('-1.234.567,8'), Decimal('-1234567.80'))
+        self.assertEquals(parse_amount('1 234,5'), Decimal('1234.50'))
+        self.assertEquals(parse_amount('-10.50'), Decimal('-10.50'))
+
+        for ambiguous in ('1,234', '1.234', '1,23.45', '1.234,5,6', '0.005'):
+            with self.assertRaises(ValueError):
+                parse_amount(ambiguous)
+
+    def test_import_ofx(self):
+        content = 'OFXHEADER:100\nDATA:OFXSGML\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n' \
+                  '<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20160501120000\n<TRNAMT>-12.34\n<NAME>Shop\n' \
+                  '<MEMO>card payment\n</STMTTRN>\n' \
+                  '<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20160502</DTPOSTED><TRNAMT>50.00</TRNAMT>' \
+                  '<NAME>Refund</NAME></STMTTRN>\n' \
+                  '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+
+        self.import_statement(content, '.ofx')
+
+        self.assertEquals(Event.objects.get(event_date=date(2016, 5, 1)).description, 'Shop card payment')
+        self.assertEquals(Event.objects.get(event_date=date(2016, 5, 2)).operations.get().flow, Decimal('50.00'))
+        self.assertEquals(Resource.objects.get().current_balance, Decimal('137.66'))
+
+    def test_import_qif(self):
+        content = "!Type:Bank\nD05/01/2016\nT-20.00\nPMarket\nLfood\n^\nD5/02'16\nT5.00\nPCashback\n^\n"
+
+        self.import_statement(content, '.qif')
+
+        self.assertEquals(Event.objects.get(description='Market').category.name, 'food')
+        self.assertEquals(Event.objects.get(description='Cashback').event_date, date(2016, 5, 2))
+        self.assertEquals(Resource.objects.get().current_balance, Decimal('85.00'))
+
+
+class ExportEventsTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        food = Category.objects.create(user=test_user, name='food', event_type=EventType.EXPENSE)
+        Category.objects.create(user=test_user, parent=food, name='groceries', event_type=EventType.EXPENSE)
+        Category.objects.create(user=test_user, name='home', event_type=EventType.EXPENSE)
+        Tag.objects.create(user=test_user, name='a')
+        Tag.objects.create(user=test_user, name='b')
+        Resource.objects.create(user=test_user, name='cash', initial_balance=100)
+        Resource.objects.create(user=test_user, name='card', initial_balance=100)
+
+        for day, category in [(1, 'food'), (2, 'groceries'), (3, 'home'), (4, 'groceries')]:
+            event = Event.objects.create(user=test_user, description='event "' + str(day) + '"',
+                                         event_type=EventType.EXPENSE, event_date=date(2016, 5, day),
+                                         category=Category.objects.get(name=category))
+            event.tags.add(*Tag.objects.all())
+            for resource in Resource.objects.all():
+                Operation.objects.create(event=event, resource=resource, flow=-day)
+
+        self.client.force_login(test_user)
+
+    def export(self, query):
+        response = self.client.get('/api/v1/users/test_user/events/export/' + query)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_export_csv(self):
+        content = self.export('?format=csv')
+        self.assertEquals(self.export(''), content)
+
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEquals(rows[0], ['id', 'event_date', 'event_type', 'description', 'category', 'tags',
+                                    'resource', 'flow'])
+        self.assertEquals(len(rows), 9)
+        self.assertEquals(rows[1][1:], ['2016-05-01', EventType.EXPENSE, 'event "1"', 'food', 'a;b', 'card', '-1.00'])
+        self.assertEquals(rows[2][6], 'cash')
+
+    def test_export_ndjson_filters(self):
+        food = Category.objects.get(name='food')
+
+        content = self.export('?format=ndjson&category=' + str(food.id) + '&from=2016-05-02')
+
+        events = [json.loads(line) for line in content.splitlines()]
+        self.assertEquals([event['event_date'] for event in events], ['2016-05-02', '2016-05-04'])
+        self.assertEquals(events[0]['tags'], ['a', 'b'])
+        self.assertEquals(events[0]['operations'], [{'resource': 'card', 'flow': '-2.00'},
+                                                    {'resource': 'cash', 'flow': '-2.00'}])
+
+    def test_export_chunks(self):
+        user = User.objects.get(username='test_user')
+        queryset = Event.objects.filter(user=user)
+
+        # three queries per chunk of two events and a last empty chunk
+        with self.assertMaxQueries(7):
+            events = list(export_events(queryset, chunk_size=2))
+
+        self.assertEquals([event['event_date'].day for event in events], [1, 2, 3, 4])
+
+    def test_export_errors(self):
+        self.assertEquals(self.client.get('/api/v1/users/test_user/events/export/?format=csv&from=x').status_code,
+                          status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(self.client.get('/api/v1/users/test_user/events/export/?format=json').status_code,
+                          status.HTTP_406_NOT_ACCEPTABLE)
+        self.assertEquals(self.client.get('/api/v1/users/test_user/events/export/', HTTP_ACCEPT='application/json')
+                          .status_code, status.HTTP_406_NOT_ACCEPTABLE)
+        self.client.logout()
+        self.assertEquals(self.client.get('/api/v1/users/test_user/events/export/?format=ndjson').status_code,
+                          status.HTTP_403_FORBIDDEN)
+
+
+class BalanceHistoryTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        User.objects.create(username='other_user')
+        self.category = Category.objects.create(user=test_user, name='food', event_type=EventType.EXPENSE)
+        self.resource = Resource.objects.create(user=test_user, name='cash', initial_balance=100)
+
+        for event_date, flow in [(date(2016, 1, 15), -10), (date(2016, 2, 10), -20), (date(2016, 3, 5), 50),
+                                 (date(2016, 3, 20), -5)]:
+            self.create_event(event_date, flow)
+
+        self.url = '/api/v1/resources/{0}/balance-history/'.format(self.resource.id)
+        self.client.force_login(test_user)
+
+    def create_event(self, event_date, flow):
+        event = Event.objects.create(user=self.resource.user, description='test_description',
+                                     event_type=EventType.EXPENSE, event_date=event_date, category=self.category)
+        Operation.objects.create(event=event, resource=self.resource, flow=flow)
+        return event
+
+    def history(self, query):
+        response = self.client.get(self.url + query)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response.data['opening_balance'], [(row['period'], row['balance']) for row in response.data['results']]
+
+    def test_get_monthly(self):
+        self.assertEquals(self.history('?granularity=month&to=2016-04-10'), ('100.00', [
+            ('2016-01-01', '90.00'), ('2016-02-01', '70.00'), ('2016-03-01', '115.00'), ('2016-04-01', '115.00')
+        ]))
+
+    def test_get_daily(self):
+        self.assertEquals(self.history('?from=2016-03-04&to=2016-03-06'), ('70.00', [
+            ('2016-03-04', '70.00'), ('2016-03-05', '120.00'), ('2016-03-06', '120.00')
+        ]))
+
+    def test_get_weekly(self):
+        self.assertEquals(self.history('?granularity=week&from=2016-02-10&to=2016-02-22'), ('90.00', [
+            ('2016-02-08', '70.00'), ('2016-02-15', '70.00'), ('2016-02-22', '70.00')
+        ]))
+
+    def test_checkpoints(self):
+        self.history('?from=2016-03-10&to=2016-03-31')
+        self.assertEquals(list(BalanceCheckpoint.objects.order_by('month').values_list('month', 'flows')), [
+            (date(2016, 2, 1), Decimal('-10.00')), (date(2016, 3, 1), Decimal('-30.00'))
+        ])
+
+        # session, user, resource, savepoint, lock, checkpoint, operations, release
+        with self.assertMaxQueries(8):
+            self.assertEquals(self.history('?from=2016-03-10&to=2016-03-31')[0], '120.00')
+
+        # writes before the checkpoints keep them up to date
+        event = self.create_event(date(2016, 1, 20), -1)
+        Event.objects.filter(description='test_description', event_date=date(2016, 2, 10)).get().delete()
+        event = Event.objects.get(id=event.id)
+        event.event_date = date(2016, 2, 28)
+        event.save()
+
+        self.assertEquals(list(BalanceCheckpoint.objects.order_by('month').values_list('month', 'flows')), [
+            (date(2016, 2, 1), Decimal('-10.00')), (date(2016, 3, 1), Decimal('-11.00'))
+        ])
+        self.assertEquals(self.history('?from=2016-02-01&to=2016-03-31')[0], '90.00')
+        self.assertEquals(self.history('?from=2016-03-10&to=2016-03-31')[0], '139.00')
+
+    def test_get_invalid(self):
+        response = self.client.get(self.url + '?granularity=year')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.url + '?from=2016-03-01&to=2016-02-01')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.url + '?from=2000-01-01&to=2016-01-01')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_other_user(self):
+        self.client.force_login(User.objects.get(username='other_user'))
+
+        response = self.client.get(self.url)
+
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class RecurrenceTestCase(SimpleTestCase):
+    def dates(self, date_from, date_to, **schedule):
+        schedule.setdefault('interval', 1)
+        schedule.setdefault('end_date', None)
+        schedule.setdefault('count', None)
+        return list(occurrence_dates(RecurringEvent(**schedule), date_from, date_to))
+
+    def test_monthly_end_of_month(self):
+        self.assertEquals(self.dates(date(2016, 1, 1), date(2016, 4, 30), frequency=RecurringEvent.MONTHLY,
+                                     start_date=date(2016, 1, 31)),
+                          [date(2016, 1, 31), date(2016, 2, 29), date(2016, 3, 31), date(2016, 4, 30)])
+
+    def test_window(self):
+        # the window is reached without the occurrences before it
+        self.assertEquals(self.dates(date(2116, 3, 1), date(2116, 8, 31), frequency=RecurringEvent.MONTHLY,
+                                     interval=2, start_date=date(2016, 1, 31)),
+                          [date(2116, 3, 31), date(2116, 5, 31), date(2116, 7, 31)])
+        self.assertEquals(self.dates(date(2016, 1, 12), date(2016, 1, 31), frequency=RecurringEvent.WEEKLY,
+                                     interval=2, start_date=date(2016, 1, 1)),
+                          [date(2016, 1, 15), date(2016, 1, 29)])
+        self.assertEquals(self.dates(date(2017, 1, 1), date(2020, 12, 31), frequency=RecurringEvent.YEARLY,
+                                     start_date=date(2016, 2, 29)),
+                          [date(2017, 2, 28), date(2018, 2, 28), date(2019, 2, 28), date(2020, 2, 29)])
+
+    def test_end(self):
+        self.assertEquals(self.dates(date(2016, 1, 1), date(2016, 12, 31), frequency=RecurringEvent.DAILY,
+                                     interval=3, start_date=date(2016, 1, 1), count=3),
+                          [date(2016, 1, 1), date(2016, 1, 4), date(2016, 1, 7)])
+        self.assertEquals(self.dates(date(2016, 1, 5), date(2016, 12, 31), frequency=RecurringEvent.DAILY,
+                                     interval=3, start_date=date(2016, 1, 1), count=3),
+                          [date(2016, 1, 7)])
+        self.assertEquals(self.dates(date(2016, 1, 1), date(2016, 12, 31), frequency=RecurringEvent.WEEKLY,
+                                     start_date=date(2016, 1, 1), end_date=date(2016, 1, 20)),
+                          [date(2016, 1, 1), date(2016, 1, 8), date(2016, 1, 15)])
+
+
+class RecurringEventTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.test_user = User.objects.create(username='test_user')
+        self.other_user = User.objects.create(username='other_user')
+        self.rent = Category.objects.create(user=self.test_user, name='rent', event_type=EventType.EXPENSE)
+        self.salary = Category.objects.create(user=self.test_user, name='salary', event_type=EventType.INCOME)
+        self.tag = Tag.objects.create(user=self.test_user, name='fixed')
+        self.cash = Resource.objects.create(user=self.test_user, name='cash', initial_balance=100)
+
+        self.recurring_event = RecurringEvent.objects.create(
+            user=self.test_user, description='rent', event_type=EventType.EXPENSE, category=self.rent,
+            frequency=RecurringEvent.MONTHLY, start_date=date(2016, 1, 31))
+        self.recurring_event.tags.add(self.tag)
+        RecurringFlow.objects.create(recurring_event=self.recurring_event, resource=self.cash, flow=-10)
+
+        self.client.force_login(self.test_user)
+
+    def materialize(self, until):
+        out = StringIO()
+        call_command('materialize_recurring', until=until, stdout=out)
+        return out.getvalue()
+
+    def test_materialize(self):
+        self.assertIn('Stored 3 occurrences of 1 recurring events.', self.materialize('2016-03-31'))
+        self.assertIn('Stored 0 occurrences of 0 recurring events.', self.materialize('2016-03-31'))
+        self.assertIn('Stored 1 occurrences of 1 recurring events.', self.materialize('2016-04-30'))
+
+        events = Event.objects.filter(recurring_event=self.recurring_event).order_by('event_date')
+        self.assertEquals([event.event_date for event in events],
+                          [date(2016, 1, 31), date(2016, 2, 29), date(2016, 3, 31), date(2016, 4, 30)])
+        self.assertEquals([tag.name for tag in events[0].tags.all()], ['fixed'])
+        self.assertEquals(Resource.objects.get(id=self.cash.id).current_balance, Decimal('60.00'))
+        self.assertEquals(MonthlyTotal.objects.get(month=date(2016, 2, 1)).total, Decimal('-10.00'))
+        self.assertEquals(RecurringEvent.objects.get(id=self.recurring_event.id).materialized_until,
+                          date(2016, 4, 30))
+
+    def test_projected(self):
+        salary = RecurringEvent.objects.create(
+            user=self.test_user, description='salary', event_type=EventType.INCOME, category=self.salary,
+            frequency=RecurringEvent.MONTHLY, start_date=date(2016, 3, 10), count=2)
+        RecurringFlow.objects.create(recurring_event=salary, resource=self.cash, flow=1000)
+        self.materialize('2016-02-29')
+
+        # session, user, change markers, recurring events, tags, flows
+        with self.assertMaxQueries(6):
+            response = self.client.get('/api/v1/users/test_user/events/projected/?to=2016-05-31')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals([(occurrence['description'], occurrence['event_date']) for occurrence in response.data], [
+            ('salary', '2016-03-10'), ('rent', '2016-03-31'), ('salary', '2016-04-10'), ('rent', '2016-04-30'),
+            ('rent', '2016-05-31')
+        ])
+        self.assertEquals(response.data[1], {
+            'recurring_event': self.recurring_event.id, 'description': 'rent', 'event_type': EventType.EXPENSE,
+            'event_date': '2016-03-31', 'category': self.rent.id, 'tags': [self.tag.id],
+            'operations': [{'resource': self.cash.id, 'flow': '-10.00'}]
+        })
+        response = self.client.get('/api/v1/users/test_user/events/projected/?from=2016-04-15&to=2016-05-31')
+        self.assertEquals([occurrence['event_date'] for occurrence in response.data], ['2016-04-30', '2016-05-31'])
+
+    def test_projected_invalid(self):
+        self.assertEquals(self.client.get('/api/v1/users/test_user/events/projected/').status_code,
+                          status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/v1/users/test_user/events/projected/?to=9999-12-31')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('more than 5000 occurrences', response.data['detail'])
+
+    def test_projected_invalidation(self):
+        path = '/api/v1/users/test_user/events/projected/?to=2016-03-31'
+        etag = self.client.get(path)['ETag']
+
+        RecurringFlow.objects.filter(recurring_event=self.recurring_event).get().delete()
+
+        self.assertEquals(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_create(self):
+        response = self.client.post('/api/v1/recurring-events/', {
+            'description': 'gym', 'event_type': EventType.EXPENSE, 'category': self.rent.id, 'tags': [self.tag.id],
+            'flows': [{'resource': self.cash.id, 'flow': '-30.00'}], 'frequency': RecurringEvent.WEEKLY,
+            'interval': 2, 'start_date': '2016-01-01', 'end_date': '2016-01-31'
+        }, format='json')
+
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(response.data['flows'], [{'resource': self.cash.id, 'flow': '-30.00'}])
+        self.assertIsNone(response.data['materialized_until'])
+        # the past occurrences are stored by a worker
+        self.assertEquals(Job.objects.get().kind, 'materialize_recurring')
+
+        listed = self.client.get('/api/v1/users/test_user/recurring-events/')
+        self.assertEquals([item['description'] for item in listed.data['results']], ['gym', 'rent'])
+
+    def test_create_invalid(self):
+        other_resource = Resource.objects.create(user=self.other_user, name='cash', initial_balance=0)
+        data = {
+            'description': 'gym', 'event_type': EventType.INCOME, 'category': self.rent.id,
+            'flows': [{'resource': self.cash.id, 'flow': '-30.00'}], 'frequency': RecurringEvent.WEEKLY,
+            'start_date': '2016-01-01'
+        }
+
+        self.assertEquals(self.client.post('/api/v1/recurring-events/', data, format='json').status_code,
+                          status.HTTP_400_BAD_REQUEST)
+        data.update(event_type=EventType.EXPENSE, flows=[{'resource': other_resource.id, 'flow': '-1.00'}])
+        self.assertEquals(self.client.post('/api/v1/recurring-events/', data, format='json').status_code,
+                          status.HTTP_400_BAD_REQUEST)
+        data.update(flows=[], end_date='2015-12-31')
+        self.assertEquals(self.client.post('/api/v1/recurring-events/', data, format='json').status_code,
+                          status.HTTP_400_BAD_REQUEST)
+
+    def test_update(self):
+        self.materialize('2016-02-29')
+
+        response = self.client.patch('/api/v1/recurring-events/{0}/'.format(self.recurring_event.id), {
+            'flows': [{'resource': self.cash.id, 'flow': '-12.00'}]
+        }, format='json')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data['flows'], [{'resource': self.cash.id, 'flow': '-12.00'}])
+        self.assertEquals([tag.name for tag in RecurringEvent.objects.get().tags.all()], ['fixed'])
+        # the stored occurrences are kept as they are
+        self.assertEquals(set(Operation.objects.values_list('flow', flat=True)), {Decimal('-10.00')})
+        occurrence = next(projected_occurrences(self.test_user.id, date(2016, 12, 31)))
+        self.assertEquals(occurrence[1], date(2016, 3, 31))
+        self.assertEquals([flow.flow for flow in occurrence[0].flows.all()], [Decimal('-12.00')])
+
+    def test_update_other_user(self):
+        self.client.force_login(self.other_user)
+
+        response = self.client.patch('/api/v1/recurring-events/{0}/'.format(self.recurring_event.id),
+                                     {'description': 'mine'}, format='json')
+
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEquals(self.client.get('/api/v1/users/test_user/recurring-events/').status_code,
+                          status.HTTP_403_FORBIDDEN)
+
+    def test_event_links_occurrence(self):
+        self.materialize('2016-01-31')
+        event = Event.objects.get()
+
+        response = self.client.get('/api/v1/users/test_user/events/')
+
+        self.assertEquals(response.data['results'][0]['recurring_event'], self.recurring_event.id)
+        self.recurring_event.delete()
+        self.assertIsNone(Event.objects.get(id=event.id).recurring_event)
+
+
+class BenchmarkCommandsTestCase(TestCase):
+    def seed(self, **options):
+        out = StringIO()
+        call_command('seed_benchmark', users=2, resources=2, depth=2, branching=2, events=30, tags=3, stdout=out,
+                     **options)
+        return out.getvalue()
+
+    def test_seed_benchmark(self):
+        out = self.seed()
+
+        self.assertIn('Seeded 2 users', out)
+        self.assertTrue(User.objects.get(username='bench0').is_staff)
+        user = User.objects.get(username='bench1')
+        self.assertEquals(user.change_markers.count(), len(ChangeMarker.SCOPES))
+        # 2 roots with 2 children each, per event type
+        self.assertEquals(Category.objects.filter(user=user).count(), 12)
+        self.assertEquals(CategoryClosure.objects.filter(descendant__user=user).count(), 20)
+        self.assertEquals(Event.objects.filter(user=user).count(), 30)
+        self.assertFalse(Event.objects.filter(user=user, category__root_node=True).exists())
+
+        flows = Operation.objects.filter(event__user=user).aggregate(total=Sum('flow'))['total']
+        balances = Resource.objects.filter(user=user).aggregate(total=Sum('current_balance'))['total']
+        self.assertEquals(balances, 2000 + flows)
+        self.assertEquals(MonthlyTotal.objects.filter(user=user).aggregate(total=Sum('total'))['total'], flows)
+
+    def test_seed_benchmark_existing_users(self):
+        self.seed()
+
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed(prefix='other')
+
+    def test_benchmark_endpoints(self):
+        self.seed()
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command('benchmark_endpoints', requests=1, output=output.name, stdout=StringIO())
+            results = json.load(output)
+
+        self.assertEquals({endpoint['status'] for endpoint in results['endpoints']}, {200})
+        self.assertIn('/api/v1/users/bench0/events/?q=groc', [endpoint['path'] for endpoint in results['endpoints']])
+        self.assertIn('p99', results['endpoints'][0]['latency_ms'])
+
+    def test_benchmark_serialization(self):
+        self.seed()
+        out = StringIO()
+
+        call_command('benchmark_serialization', page_size=20, repeats=1, stdout=out)
+
+        self.assertIn('events: serializer', out.getvalue())
+        self.assertIn('operations: serializer', out.getvalue())
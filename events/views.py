@@ -1,18 +1,41 @@
-from rest_framework import permissions, viewsets
-from events.models import Resource, Event, Operation
-from events.serializers import ResourceSerializer, EventSerializer, OperationSerializer
-from events.permissions import IsResourceOwner, IsResourcesOwner, IsEventOwner, IsEventsOwner, \
-    IsOperationOwner, IsOperationsResourceOwner, IsOperationsEventOwner
+from datetime import date
+from collections import OrderedDict
+from itertools import islice
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+from rest_framework import exceptions, permissions, renderers, status, viewsets
+from rest_framework.decorators import detail_route, list_route
 from rest_framework.response import Response
+from ppbudget.conditional import conditional_list
+from ppbudget.fieldsets import SparseFieldsetViewMixin, fieldset_param
+from ppbudget.pagination import KeysetPagination
+from ppbudget.params import positive_int_param, date_param, id_list_param
+from authentication.models import ChangeMarker
+from tags.models import Tag
+from tags.serializers import TagSerializer
+from jobs.models import Job
+from events.models import Resource, Event, Operation, RecurringEvent
+from events.serializers import ResourceSerializer, EventSerializer, OperationSerializer, EventBatchSerializer, \
+    BalanceSerializer, RecurringEventSerializer
+from events.history import GRANULARITIES, balance_history, count_periods
+from events.recurrence import projected_occurrences
+from events.search import search_events
+from events.rows import event_values, event_rows, operation_values, operation_rows, projected_rows
+from events.exports import CSVRenderer, NDJSONRenderer, export_events, csv_lines, ndjson_lines
+from events.permissions import IsResourceOwner, IsResourcesOwner, IsEventOwner, IsEventsOwner, \
+    IsRecurringEventOwner, IsRecurringEventsOwner
 
 
-class ResourceViewSet(viewsets.ModelViewSet):
+class ResourceViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Resource.objects.order_by('user', 'name')
     serializer_class = ResourceSerializer
+    max_periods = 1000
 
     def get_permissions(self):
         if self.request.method == 'OPTIONS':
             return permissions.AllowAny(),
+        elif self.action == 'balance_history':
+            return permissions.IsAuthenticated(), IsResourceOwner(),
         elif self.request.method in ('GET', 'HEAD'):
             return permissions.IsAuthenticated(), permissions.IsAdminUser(),
         elif self.request.method in ('PUT', 'PATCH', 'DELETE'):
@@ -20,41 +43,97 @@ class ResourceViewSet(viewsets.ModelViewSet):
         else:  # self.request.method == 'POST'
             return permissions.IsAuthenticated(),
 
+    def get_queryset(self):
+        if self.action == 'balance_history':
+            # only the balance fields are read, the nested user is not rendered
+            return Resource.objects.all()
+        return super(ResourceViewSet, self).get_queryset()
+
     def perform_create(self, serializer: ResourceSerializer):
         serializer.save(user=self.request.user)
 
         return super(ResourceViewSet, self).perform_create(serializer)
 
+    @detail_route(methods=['get'], url_path='balance-history')
+    def balance_history(self, request, pk=None):
+        """
+        Balance of the resource at the end of every `granularity` (day, week or month) period between `from`
+        (defaults to the date of its first operation) and `to` (defaults to today).
+        """
+        resource = self.get_object()
+
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            raise exceptions.ParseError('granularity must be one of: {0}.'.format(', '.join(GRANULARITIES)))
+
+        date_to = date_param(request, 'to') or date.today()
+        date_from = date_param(request, 'from')
+        if date_from is None:
+            date_from = Operation.objects.filter(resource=resource).order_by('event_date') \
+                .values_list('event_date', flat=True).first() or date_to
+        if date_from > date_to:
+            raise exceptions.ParseError('from must not be later than to.')
+        if count_periods(date_from, date_to, granularity) > self.max_periods:
+            raise exceptions.ParseError('The range spans more than {0} periods, use a coarser granularity.'
+                                        .format(self.max_periods))
+
+        opening_balance, history = balance_history(resource, date_from, date_to, granularity)
+        return Response(OrderedDict([
+            ('resource', resource.id),
+            ('granularity', granularity),
+            ('from', date_from),
+            ('to', date_to),
+            ('opening_balance', BalanceSerializer().fields['balance'].to_representation(opening_balance)),
+            ('results', BalanceSerializer([{'period': period, 'balance': balance} for period, balance in history],
+                                          many=True).data)
+        ]))
+
 
 class UserResourcesViewSet(viewsets.ViewSet):
-    queryset = Resource.objects.select_related('user').all()
+    queryset = Resource.objects.all()
     serializer_class = ResourceSerializer
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         if self.request.method in permissions.SAFE_METHODS:
             return permissions.IsAuthenticated(), IsResourcesOwner(),
 
+    @conditional_list(ChangeMarker.RESOURCES, cache=True)
     def list(self, request, user_username=None):
-        queryset = self.queryset.filter(user__username=user_username).order_by('name')
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        fieldset = fieldset_param(request)
+        queryset = self.serializer_class.setup_eager_loading(self.queryset, fieldset) \
+            .filter(user__username=user_username).order_by('name', 'id')
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.serializer_class(page, many=True, fieldset=fieldset)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class ResourceOperationsViewSet(viewsets.ViewSet):
-    queryset = Operation.objects.select_related('resource').all()
+    # listed through the values() fast path, see events.rows
+    queryset = Operation.objects.all()
     serializer_class = OperationSerializer
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         if self.request.method in permissions.SAFE_METHODS:
-            return permissions.IsAuthenticated(), IsOperationsResourceOwner(),
+            return permissions.IsAuthenticated(),
 
     def list(self, request, resource_pk=None):
-        queryset = self.queryset.filter(resource__id=resource_pk).order_by('-event__event_date')
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        resource_id = get_pk(resource_pk)
+        # ownership is part of the query, operations of other users' resources are never loaded
+        queryset = self.queryset.filter(resource__id=resource_id, resource__user=request.user) \
+            .order_by('-event_date', 'id')
+        paginator = self.pagination_class()
+        fieldset = fieldset_param(request)
+        page = paginator.paginate_queryset(operation_values(queryset, fieldset), request, view=self)
+        # only an empty page needs telling an unknown or foreign resource from one without operations
+        if not page and not Resource.objects.filter(id=resource_id, user=request.user).exists():
+            raise exceptions.NotFound()
+        return paginator.get_paginated_response(operation_rows(page, fieldset))
 
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Event.objects.order_by('user', '-event_date', 'description')
     serializer_class = EventSerializer
 
@@ -69,37 +148,210 @@ class EventViewSet(viewsets.ModelViewSet):
             return permissions.IsAuthenticated(),
 
     def perform_create(self, serializer: EventSerializer):
+        # a second save() would route the nested tags and operations through update()
         serializer.save(user=self.request.user)
 
-        return super(EventViewSet, self).perform_create(serializer)
+    @list_route(methods=['post'])
+    def batch(self, request):
+        """
+        Creates a list of events with their tags and operations in one transaction using bulk inserts.
+        """
+        serializer = EventBatchSerializer(data=request.data, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        events = serializer.save(user=request.user)
+
+        queryset = EventSerializer.setup_eager_loading(Event.objects.filter(id__in=[event.id for event in events]))
+        return Response(EventSerializer(queryset.order_by('id'), many=True).data, status=status.HTTP_201_CREATED)
 
 
 class UserEventsViewSet(viewsets.ViewSet):
-    queryset = Event.objects.select_related('user').all()
+    # listed through the values() fast path, see events.rows
+    queryset = Event.objects.all()
     serializer_class = EventSerializer
+    pagination_class = KeysetPagination
+    max_projected = 5000
 
     def get_permissions(self):
         if self.request.method in permissions.SAFE_METHODS:
             return permissions.IsAuthenticated(), IsEventsOwner(),
 
+    @conditional_list(ChangeMarker.EVENTS)
     def list(self, request, user_username=None):
-        queryset = self.queryset.filter(user__username=user_username).order_by('-event_date', 'description')
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        queryset = self.filter_queryset(request, self.queryset.filter(user__username=user_username))
+        if not queryset.query.order_by:
+            # unless ranked by the search
+            queryset = queryset.order_by('-event_date', 'description', 'id')
+        fieldset = fieldset_param(request)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(event_values(queryset, fieldset), request, view=self)
+        return paginator.get_paginated_response(event_rows(page, fieldset))
+
+    @list_route(methods=['get'], renderer_classes=(CSVRenderer, NDJSONRenderer, renderers.JSONRenderer))
+    def export(self, request, user_username=None):
+        """
+        Streams all events of the user matching the list filters as `?format=csv` (one line per operation, the
+        default) or `?format=ndjson` (one event per line). JSON only renders the errors of clients asking for it.
+        """
+        if request.accepted_renderer.format == 'json':
+            raise exceptions.NotAcceptable('Events are exported as csv or ndjson.')
+        if request.accepted_renderer.format == 'ndjson':
+            lines, renderer = ndjson_lines, NDJSONRenderer
+        else:
+            lines, renderer = csv_lines, CSVRenderer
+
+        queryset = self.filter_queryset(request, self.queryset.filter(user__username=user_username))
+        response = StreamingHttpResponse(lines(export_events(queryset)), content_type=renderer.media_type)
+        response['Content-Disposition'] = 'attachment; filename="events.{0}"'.format(renderer.format)
+        return response
+
+    @list_route(methods=['get'])
+    @conditional_list(ChangeMarker.EVENTS)
+    def projected(self, request, user_username=None):
+        """
+        The occurrences of the recurring events of the user between `from` and `to` (required) that are not
+        stored as events yet, by date.
+        """
+        date_to = date_param(request, 'to')
+        if date_to is None:
+            raise exceptions.ParseError('to is required.')
+        occurrences = list(islice(projected_occurrences(request.user.id, date_to, date_param(request, 'from')),
+                                  self.max_projected + 1))
+        if len(occurrences) > self.max_projected:
+            raise exceptions.ParseError('The range holds more than {0} occurrences, narrow it.'
+                                        .format(self.max_projected))
+        return Response(projected_rows(occurrences))
+
+    def filter_queryset(self, request, queryset):
+        category = positive_int_param(request, 'category')
+        if category is not None:
+            # the category and all of its subcategories, through the closure table
+            queryset = queryset.filter(category__ancestor_paths__ancestor_id=category)
+
+        date_from = date_param(request, 'from')
+        if date_from is not None:
+            queryset = queryset.filter(event_date__gte=date_from)
+        date_to = date_param(request, 'to')
+        if date_to is not None:
+            queryset = queryset.filter(event_date__lte=date_to)
+
+        # each tag filter is a single subquery over the (tag_id, event_id) index of the through table
+        event_tags = Event.tags.through.objects
+        tags_all = id_list_param(request, 'tags_all')
+        if tags_all is not None:
+            queryset = queryset.filter(id__in=event_tags.filter(tag_id__in=tags_all).values('event_id')
+                                       .annotate(matched=Count('tag_id')).filter(matched=len(tags_all))
+                                       .values('event_id'))
+        tags_any = id_list_param(request, 'tags_any')
+        if tags_any is not None:
+            queryset = queryset.filter(id__in=event_tags.filter(tag_id__in=tags_any).values('event_id'))
+        tags_none = id_list_param(request, 'tags_none')
+        if tags_none is not None:
+            queryset = queryset.exclude(id__in=event_tags.filter(tag_id__in=tags_none).values('event_id'))
+
+        text = request.query_params.get('q', '').strip()
+        if text:
+            queryset = search_events(queryset, text)
+
+        return queryset
+
+
+class RecurringEventViewSet(viewsets.ModelViewSet):
+    queryset = RecurringEventSerializer.setup_eager_loading(RecurringEvent.objects.order_by('user', 'description'))
+    serializer_class = RecurringEventSerializer
+
+    def get_permissions(self):
+        if self.request.method == 'OPTIONS':
+            return permissions.AllowAny(),
+        elif self.request.method in ('GET', 'HEAD'):
+            return permissions.IsAuthenticated(), permissions.IsAdminUser(),
+        elif self.request.method in ('PUT', 'PATCH', 'DELETE'):
+            return permissions.IsAuthenticated(), IsRecurringEventOwner(),
+        else:  # self.request.method == 'POST'
+            return permissions.IsAuthenticated(),
+
+    def perform_create(self, serializer: RecurringEventSerializer):
+        serializer.save(user=self.request.user)
+        self.materialize(serializer.instance)
+
+    def perform_update(self, serializer: RecurringEventSerializer):
+        serializer.save()
+        self.materialize(serializer.instance)
+
+    def materialize(self, recurring_event):
+        # the past occurrences are stored by a worker, a start date years ago can mean thousands of events
+        if recurring_event.start_date <= date.today():
+            Job.objects.enqueue(recurring_event.user, 'materialize_recurring')
+
+
+class UserRecurringEventsViewSet(viewsets.ViewSet):
+    queryset = RecurringEvent.objects.all()
+    serializer_class = RecurringEventSerializer
+    pagination_class = KeysetPagination
+
+    def get_permissions(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return permissions.IsAuthenticated(), IsRecurringEventsOwner(),
+
+    @conditional_list(ChangeMarker.EVENTS)
+    def list(self, request, user_username=None):
+        queryset = self.serializer_class.setup_eager_loading(self.queryset) \
+            .filter(user__username=user_username).order_by('description', 'id')
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class EventOperationsViewSet(viewsets.ViewSet):
-    queryset = Operation.objects.select_related('event').all()
+    queryset = Operation.objects.all()
     serializer_class = OperationSerializer
+    pagination_class = KeysetPagination
+
+    def get_permissions(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return permissions.IsAuthenticated(),
+
+    def list(self, request, event_pk=None):
+        event_id = get_pk(event_pk)
+        # ownership is part of the query, operations of other users' events are never loaded
+        fieldset = fieldset_param(request)
+        queryset = self.serializer_class.setup_eager_loading(self.queryset, fieldset) \
+            .filter(event__id=event_id, event__user=request.user).order_by('resource__name', 'id')
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        if not page and not Event.objects.filter(id=event_id, user=request.user).exists():
+            raise exceptions.NotFound()
+        serializer = self.serializer_class(page, many=True, fieldset=fieldset)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class EventTagsViewSet(viewsets.ViewSet):
+    queryset = Tag.objects.all()
+    serializer_class = TagSerializer
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         if self.request.method in permissions.SAFE_METHODS:
-            return permissions.IsAuthenticated(), IsOperationsEventOwner(),
+            return permissions.IsAuthenticated(),
 
     def list(self, request, event_pk=None):
-        queryset = self.queryset.filter(event__id=event_pk).order_by('resource__name')
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        event_id = get_pk(event_pk)
+        # ownership is part of the query, tags of other users' events are never loaded
+        fieldset = fieldset_param(request)
+        queryset = self.serializer_class.setup_eager_loading(self.queryset, fieldset) \
+            .filter(event__id=event_id, event__user=request.user).order_by('name', 'id')
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        if not page and not Event.objects.filter(id=event_id, user=request.user).exists():
+            raise exceptions.NotFound()
+        serializer = self.serializer_class(page, many=True, fieldset=fieldset)
+        return paginator.get_paginated_response(serializer.data)
+
+
+def get_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise exceptions.NotFound()
 
-# TODO EventTagsViewSet
 # TODO OperationViewSet
@@ -0,0 +1,122 @@
+"""
+The kinds of background jobs.
+
+A kind is a function of the job and its params returning the JSON result, registered with `kind`. Its params
+are validated by a serializer when the job is enqueued. Raising JobError fails the job without retrying it.
+"""
+from io import StringIO
+from itertools import islice
+from django.core.management import call_command
+from rest_framework import serializers
+from events.bulk import create_events
+from events.importers import PARSERS, StatementMapper, chunks, normalize
+from events.models import Resource
+
+KINDS = {}
+
+
+class JobError(Exception):
+    pass
+
+
+class Kind(object):
+    def __init__(self, name, run, params_serializer, max_attempts):
+        self.name = name
+        self.run = run
+        self.params_serializer = params_serializer
+        self.max_attempts = max_attempts
+
+
+def kind(name, params_serializer=serializers.Serializer, max_attempts=None):
+    """
+    Registers the decorated function as the job kind `name`, retried up to `max_attempts` times
+    (settings.JOB_MAX_ATTEMPTS by default).
+    """
+    def register(run):
+        KINDS[name] = Kind(name, run, params_serializer, max_attempts)
+        return run
+    return register
+
+
+def run_job(job):
+    """
+    Runs the job and returns its result.
+    """
+    if job.kind not in KINDS:
+        raise JobError('Unknown job kind {0!r}.'.format(job.kind))
+    return KINDS[job.kind].run(job, job.get_params())
+
+
+def command_summary(name, **options):
+    # the last line of the output of these commands sums up what they did
+    output = StringIO()
+    call_command(name, stdout=output, **options)
+    lines = output.getvalue().splitlines()
+    return {'summary': lines[-1] if lines else ''}
+
+
+@kind('rebuild_balances')
+def rebuild_balances(job, params):
+    """
+    Reconciles the current balances of the user's resources, see `manage.py rebuild_balances`.
+    """
+    return command_summary('rebuild_balances', username=job.user.username)
+
+
+@kind('rebuild_reports')
+def rebuild_reports(job, params):
+    """
+    Recomputes the monthly report totals of the user, see `manage.py rebuild_reports`.
+    """
+    return command_summary('rebuild_reports', username=job.user.username)
+
+
+@kind('materialize_recurring')
+def materialize_recurring(job, params):
+    """
+    Stores the due occurrences of the user's recurring events, see `manage.py materialize_recurring`.
+    """
+    return command_summary('materialize_recurring', username=job.user.username)
+
+
+class ImportStatementParamsSerializer(serializers.Serializer):
+    resource = serializers.CharField(help_text='Name of the resource the statement belongs to.')
+    format = serializers.ChoiceField(choices=sorted(PARSERS))
+    statement = serializers.CharField(trim_whitespace=False)
+    start_row = serializers.IntegerField(min_value=1, default=1)
+    date_format = serializers.CharField(required=False)
+    delimiter = serializers.CharField(min_length=1, max_length=1, trim_whitespace=False, default=',')
+    default_category = serializers.CharField(default='Imported')
+
+
+@kind('import_statement', ImportStatementParamsSerializer, max_attempts=1)
+def import_statement(job, params, chunk_size=500):
+    """
+    Imports the statement like `manage.py import_statement`. Not retried, as the chunks imported before a failure
+    are kept: the error tells the start_row to enqueue the rest with.
+    """
+    try:
+        resource = Resource.objects.get(user=job.user, name=params['resource'])
+    except Resource.DoesNotExist:
+        raise JobError('Unknown resource {0!r}.'.format(params['resource']))
+
+    parser_options = {}
+    if params['format'] == 'csv':
+        parser_options['delimiter'] = params['delimiter']
+    if params['format'] in ('csv', 'qif') and params.get('date_format'):
+        parser_options['date_format'] = params['date_format']
+
+    start_row = params['start_row']
+    mapper = StatementMapper(job.user, resource, params['default_category'])
+    rows = islice(PARSERS[params['format']](StringIO(params['statement'], newline=''), **parser_options),
+                  start_row - 1, None)
+    imported, next_row = 0, start_row
+    try:
+        for chunk in chunks(mapper(normalize(rows, start=start_row)), chunk_size):
+            create_events(job.user, [event for _, event in chunk])
+            imported += len(chunk)
+            next_row = chunk[-1][0] + 1
+    except Exception as exc:
+        raise JobError('{0}\n{1} rows imported, resume with start_row {2}.'.format(exc, imported, next_row))
+
+    return {'imported': imported}
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from jobs.worker import Pool, Worker
+
+
+class Command(BaseCommand):
+    help = 'Runs the pending background jobs with a pool of worker processes, polling the database for them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Number of worker processes, 1 runs the worker in this process.')
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Seconds an idle worker waits before looking for due jobs again.')
+        parser.add_argument('--stale-after', type=int, default=3600,
+                            help='Seconds after which a running job is assumed lost with its worker and retried.')
+        parser.add_argument('--burst', action='store_true', default=False,
+                            help='Exit once no job is due instead of waiting for new ones.')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['poll'] <= 0 or options['stale_after'] < 1:
+            raise CommandError('--processes, --poll and --stale-after must be positive.')
+
+        worker_options = {'poll_seconds': options['poll'], 'stale_seconds': options['stale_after'],
+                          'burst': options['burst'], 'log': self.stdout.write}
+        if options['processes'] == 1:
+            Worker(**worker_options).run()
+        else:
+            Pool(options['processes'], **worker_options).run()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+def pending_key(kind, params):
+    return hashlib.sha1('{0}\n{1}'.format(kind, params).encode('utf-8')).hexdigest()
+
+
+class JobManager(models.Manager):
+    def enqueue(self, user, kind, params=None, max_attempts=None):
+        """
+        Adds a pending job, unless the user has a pending one of the same kind and params. Returns (job, created)
+        with the added or the already pending job.
+        """
+        params = json.dumps(params or {}, sort_keys=True, cls=DjangoJSONEncoder)
+        key = pending_key(kind, params)
+        for retry in (True, False):
+            job = self.filter(user=user, pending_key=key).first()
+            if job is not None:
+                return job, False
+            try:
+                with transaction.atomic():
+                    return self.create(user=user, kind=kind, params=params, pending_key=key,
+                                       max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS), True
+            except IntegrityError:
+                # enqueued concurrently in the meantime, read on the next pass; any other violation fails again
+                if not retry:
+                    raise
+
+    def claim(self, worker, batch_size=10):
+        """
+        Marks the oldest due pending job as run by `worker` and returns it, None when no job is due. The claim is
+        a conditional UPDATE, so concurrent workers never run the same job.
+        """
+        now = timezone.now()
+        due = self.filter(status=Job.PENDING, run_after__lte=now).order_by('run_after', 'id')
+        for job_id in due.values_list('id', flat=True)[:batch_size]:
+            # identical jobs may be enqueued again once this one started
+            if self.filter(id=job_id, status=Job.PENDING).update(
+                    status=Job.RUNNING, pending_key=None, attempts=F('attempts') + 1, worker=worker, started=now):
+                return self.select_related('user').get(id=job_id)
+        return None
+
+    def requeue_stale(self, seconds):
+        """
+        Fails the jobs running for more than `seconds`, whose worker is assumed lost. They are retried like the
+        jobs that raised. Returns their number.
+        """
+        stale = list(self.filter(status=Job.RUNNING, started__lt=timezone.now() - timedelta(seconds=seconds)))
+        for job in stale:
+            job.fail('The worker {0} did not finish the job in {1}s.'.format(job.worker, seconds))
+        return len(stale)
+
+
+class Job(models.Model):
+    """
+    A unit of background work of a user, run by `manage.py run_worker`. The kinds and what they do are registered
+    in jobs.kinds, `params` and `result` are JSON.
+
+    A pending job keeps `pending_key`, the hash of its kind and params, unique per user, so identical pending jobs
+    are enqueued once. Every claim increments `attempts`, which identifies the run: a run only records its outcome
+    while the job is still running the same attempt.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(User, related_name='jobs')
+    kind = models.CharField(max_length=50)
+    params = models.TextField(default='{}')
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    pending_key = models.CharField(max_length=40, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True)
+    result = models.TextField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    objects = JobManager()
+
+    def __str__(self):
+        return '{0} #{1} ({2}): {3}'.format(self.kind, self.id, self.user.username, self.status)
+
+    def get_params(self):
+        return json.loads(self.params)
+
+    def get_result(self):
+        return None if self.result is None else json.loads(self.result)
+
+    def succeed(self, result=None):
+        """
+        Records the result of the current attempt, returns False when the job is not running it anymore.
+        """
+        return self.finish(status=Job.SUCCEEDED, result=json.dumps(result, cls=DjangoJSONEncoder), error='')
+
+    def fail(self, error, retry=True):
+        """
+        Records the error of the current attempt. The job is pending again after a delay doubled with every
+        attempt, unless `retry` is False or it ran out of attempts. Returns False when the job is not running the
+        attempt anymore.
+        """
+        if not retry or self.attempts >= self.max_attempts:
+            return self.finish(status=Job.FAILED, error=error)
+
+        delay = settings.JOB_RETRY_SECONDS * 2 ** (self.attempts - 1)
+        key = pending_key(self.kind, self.params)
+        try:
+            with transaction.atomic():
+                return self.finish(status=Job.PENDING, pending_key=key, error=error,
+                                   run_after=timezone.now() + timedelta(seconds=delay))
+        except IntegrityError:
+            # the same job was enqueued again in the meantime and is retried as that one
+            return self.finish(status=Job.FAILED, error=error)
+
+    def finish(self, **fields):
+        if fields['status'] != Job.PENDING:
+            fields['finished'] = timezone.now()
+        updated = Job.objects.filter(id=self.id, status=Job.RUNNING, attempts=self.attempts).update(**fields)
+        if updated:
+            for name, value in fields.items():
+                setattr(self, name, value)
+        return bool(updated)
+
+    class Meta:
+        unique_together = ('user', 'pending_key')
+        # the due pending jobs are claimed in the order of run_after
+        index_together = ('status', 'run_after')
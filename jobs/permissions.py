@@ -0,0 +1,8 @@
+from rest_framework import permissions
+
+
+class IsJobsOwner(permissions.BasePermission):
+    def has_permission(self, request, view):
+        if request.user and view.kwargs['user_username']:
+            return request.user.username == view.kwargs['user_username']
+        return False
@@ -0,0 +1,37 @@
+from rest_framework import serializers
+from jobs.kinds import KINDS
+from jobs.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    kind = serializers.ChoiceField(choices=sorted(KINDS))
+    # write only, the params of an import hold the whole statement
+    params = serializers.DictField(write_only=True, required=False, default=dict)
+    result = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'kind', 'params', 'status', 'attempts', 'max_attempts', 'run_after', 'created', 'started',
+                  'finished', 'result', 'error')
+        read_only_fields = ('status', 'attempts', 'max_attempts', 'run_after', 'created', 'started', 'finished',
+                            'error')
+
+    def get_result(self, job):
+        return job.get_result()
+
+    def validate(self, data):
+        params = KINDS[data['kind']].params_serializer(data=data['params'])
+        if not params.is_valid():
+            raise serializers.ValidationError({'params': params.errors})
+        data['params'] = params.validated_data
+        return data
+
+    def create(self, validated_data):
+        """
+        Enqueues the job, unless the user has an identical one pending already, which is returned instead. The
+        `created` attribute of the serializer tells which.
+        """
+        kind = KINDS[validated_data['kind']]
+        job, self.created = Job.objects.enqueue(validated_data['user'], kind.name, validated_data['params'],
+                                                kind.max_attempts)
+        return job
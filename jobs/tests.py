@@ -0,0 +1,231 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+from events.models import Resource, Event
+from jobs.kinds import KINDS, JobError, kind
+from jobs.models import Job
+
+STATEMENT = 'date,amount,description\n2016-05-01,-10.50,Groceries\n2016-05-02,1000,Salary\n'
+
+
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        self.test_user = User.objects.create(username='test_user')
+
+    def test_enqueue_deduplicates_pending(self):
+        job, created = Job.objects.enqueue(self.test_user, 'rebuild_reports', {'b': 1, 'a': 2})
+        same, same_created = Job.objects.enqueue(self.test_user, 'rebuild_reports', {'a': 2, 'b': 1})
+        other, other_created = Job.objects.enqueue(self.test_user, 'rebuild_reports', {'a': 3})
+        foreign, foreign_created = Job.objects.enqueue(User.objects.create(username='other'), 'rebuild_reports',
+                                                       {'a': 2, 'b': 1})
+
+        self.assertEquals((created, same_created, other_created, foreign_created), (True, False, True, True))
+        self.assertEquals(same.id, job.id)
+        self.assertEquals(len({job.id, other.id, foreign.id}), 3)
+
+    def test_enqueue_integrity_error(self):
+        with mock.patch.object(Job.objects, 'create', side_effect=IntegrityError('FOREIGN KEY constraint failed')):
+            with self.assertRaises(IntegrityError):
+                Job.objects.enqueue(self.test_user, 'rebuild_reports')
+
+            self.assertEquals(Job.objects.create.call_count, 2)
+
+    def test_claim(self):
+        job, _ = Job.objects.enqueue(self.test_user, 'rebuild_reports')
+        Job.objects.filter(id=Job.objects.enqueue(self.test_user, 'rebuild_balances')[0].id) \
+            .update(run_after=timezone.now() + timedelta(hours=1))
+
+        claimed = Job.objects.claim('worker')
+
+        self.assertEquals(claimed.id, job.id)
+        self.assertEquals((claimed.status, claimed.attempts, claimed.worker), (Job.RUNNING, 1, 'worker'))
+        # the other job is not due yet
+        self.assertIsNone(Job.objects.claim('worker'))
+        # a running job does not hold back an identical one
+        self.assertTrue(Job.objects.enqueue(self.test_user, 'rebuild_reports')[1])
+
+    @override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_SECONDS=60)
+    def test_fail_retries(self):
+        job, _ = Job.objects.enqueue(self.test_user, 'rebuild_reports')
+        job = Job.objects.claim('worker')
+
+        self.assertTrue(job.fail('boom'))
+        job.refresh_from_db()
+        self.assertEquals((job.status, job.error), (Job.PENDING, 'boom'))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=50))
+        self.assertEquals(Job.objects.enqueue(self.test_user, 'rebuild_reports'), (job, False))
+
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        job = Job.objects.claim('worker')
+        self.assertTrue(job.fail('boom again'))
+        job.refresh_from_db()
+        self.assertEquals((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished)
+
+    def test_fail_superseded(self):
+        Job.objects.enqueue(self.test_user, 'rebuild_reports')
+        job = Job.objects.claim('worker')
+        pending, _ = Job.objects.enqueue(self.test_user, 'rebuild_reports')
+
+        self.assertTrue(job.fail('boom'))
+
+        self.assertEquals(Job.objects.get(id=job.id).status, Job.FAILED)
+        self.assertEquals(Job.objects.get(id=pending.id).status, Job.PENDING)
+
+    def test_requeue_stale(self):
+        Job.objects.enqueue(self.test_user, 'rebuild_reports')
+        job = Job.objects.claim('lost')
+        Job.objects.filter(id=job.id).update(started=timezone.now() - timedelta(hours=2))
+
+        self.assertEquals(Job.objects.requeue_stale(3600), 1)
+
+        self.assertEquals(Job.objects.get(id=job.id).status, Job.PENDING)
+        # the lost worker does not overwrite the outcome of a later attempt
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        Job.objects.claim('worker')
+        self.assertFalse(job.succeed({}))
+        self.assertEquals(Job.objects.get(id=job.id).status, Job.RUNNING)
+
+
+class RunWorkerTestCase(APITransactionTestCase):
+    # the worker closes broken connections between jobs, which the transaction of a TestCase does not survive
+
+    def setUp(self):
+        self.test_user = User.objects.create(username='test_user')
+        self.resource = Resource.objects.create(user=self.test_user, name='cash', initial_balance=100)
+
+    def run_worker(self):
+        out = StringIO()
+        call_command('run_worker', processes=1, burst=True, stdout=out)
+        return out.getvalue()
+
+    def test_rebuild_balances(self):
+        Resource.objects.filter(id=self.resource.id).update(current_balance=0)
+        job, _ = Job.objects.enqueue(self.test_user, 'rebuild_balances')
+
+        out = self.run_worker()
+
+        job.refresh_from_db()
+        self.assertIn('rebuild_balances #{0} succeeded'.format(job.id), out)
+        self.assertEquals(job.get_result(), {'summary': 'Checked 1 resources, 1 fixed.'})
+        self.assertEquals(Resource.objects.get().current_balance, Decimal('100.00'))
+
+    def test_import_statement(self):
+        job, _ = Job.objects.enqueue(self.test_user, 'import_statement', {
+            'resource': 'cash', 'format': 'csv', 'statement': STATEMENT, 'start_row': 1, 'delimiter': ',',
+            'default_category': 'Imported'
+        }, max_attempts=1)
+
+        self.run_worker()
+
+        job.refresh_from_db()
+        self.assertEquals((job.status, job.get_result()), (Job.SUCCEEDED, {'imported': 2}))
+        self.assertEquals(Event.objects.filter(user=self.test_user).count(), 2)
+        self.assertEquals(Resource.objects.get().current_balance, Decimal('1089.50'))
+
+    @override_settings(JOB_MAX_ATTEMPTS=3, JOB_RETRY_SECONDS=0)
+    def test_retries(self):
+        runs = []
+
+        @kind('test_flaky')
+        def flaky(job, params):
+            runs.append(job.attempts)
+            if job.attempts < 2:
+                raise ValueError('flaky')
+            return 'done'
+
+        @kind('test_invalid')
+        def invalid(job, params):
+            raise JobError('invalid')
+
+        self.addCleanup(KINDS.pop, 'test_flaky')
+        self.addCleanup(KINDS.pop, 'test_invalid')
+        flaky_job, _ = Job.objects.enqueue(self.test_user, 'test_flaky')
+        invalid_job, _ = Job.objects.enqueue(self.test_user, 'test_invalid')
+
+        self.run_worker()
+
+        flaky_job.refresh_from_db()
+        invalid_job.refresh_from_db()
+        self.assertEquals(runs, [1, 2])
+        self.assertEquals((flaky_job.status, flaky_job.get_result(), flaky_job.error), (Job.SUCCEEDED, 'done', ''))
+        self.assertEquals((invalid_job.status, invalid_job.attempts, invalid_job.error), (Job.FAILED, 1, 'invalid'))
+
+
+class UserJobsTestCase(APITestCase):
+    def setUp(self):
+        self.test_user = User.objects.create(username='test_user')
+        self.other_user = User.objects.create(username='other_user')
+        Resource.objects.create(user=self.test_user, name='cash', initial_balance=0)
+        self.client.force_login(self.test_user)
+
+    def test_create(self):
+        response = self.client.post('/api/v1/users/test_user/jobs/', {'kind': 'rebuild_reports'}, format='json')
+
+        self.assertEquals(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEquals((response.data['kind'], response.data['status']), ('rebuild_reports', Job.PENDING))
+        self.assertNotIn('params', response.data)
+
+        again = self.client.post('/api/v1/users/test_user/jobs/', {'kind': 'rebuild_reports'}, format='json')
+        self.assertEquals(again.status_code, status.HTTP_200_OK)
+        self.assertEquals(again.data['id'], response.data['id'])
+        self.assertEquals(Job.objects.count(), 1)
+
+    def test_create_import(self):
+        response = self.client.post('/api/v1/users/test_user/jobs/', {
+            'kind': 'import_statement', 'params': {'resource': 'cash', 'format': 'csv', 'statement': STATEMENT}
+        }, format='json')
+
+        self.assertEquals(response.status_code, status.HTTP_202_ACCEPTED)
+        job = Job.objects.get()
+        self.assertEquals(job.max_attempts, 1)
+        self.assertEquals(job.get_params(), {'resource': 'cash', 'format': 'csv', 'statement': STATEMENT,
+                                             'start_row': 1, 'delimiter': ',', 'default_category': 'Imported'})
+
+    def test_create_invalid(self):
+        unknown = self.client.post('/api/v1/users/test_user/jobs/', {'kind': 'unknown'}, format='json')
+        params = self.client.post('/api/v1/users/test_user/jobs/', {
+            'kind': 'import_statement', 'params': {'resource': 'cash', 'format': 'xls'}
+        }, format='json')
+
+        self.assertEquals(unknown.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(params.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(set(params.data['params']), {'format', 'statement'})
+        self.assertFalse(Job.objects.exists())
+
+    def test_list_and_retrieve(self):
+        job, _ = Job.objects.enqueue(self.test_user, 'rebuild_reports')
+        Job.objects.claim('worker').succeed({'summary': 'Rebuilt 0 monthly totals.'})
+        pending, _ = Job.objects.enqueue(self.test_user, 'rebuild_balances')
+        Job.objects.enqueue(self.other_user, 'rebuild_reports')
+
+        listed = self.client.get('/api/v1/users/test_user/jobs/')
+        filtered = self.client.get('/api/v1/users/test_user/jobs/?status=succeeded')
+        retrieved = self.client.get('/api/v1/users/test_user/jobs/{0}/'.format(job.id))
+
+        self.assertEquals([item['id'] for item in listed.data['results']], [pending.id, job.id])
+        self.assertEquals([item['id'] for item in filtered.data['results']], [job.id])
+        self.assertEquals(retrieved.status_code, status.HTTP_200_OK)
+        self.assertEquals((retrieved.data['status'], retrieved.data['result']),
+                          (Job.SUCCEEDED, {'summary': 'Rebuilt 0 monthly totals.'}))
+        self.assertEquals(self.client.get('/api/v1/users/test_user/jobs/?status=done').status_code,
+                          status.HTTP_400_BAD_REQUEST)
+
+    def test_not_owner(self):
+        job, _ = Job.objects.enqueue(self.other_user, 'rebuild_reports')
+
+        self.assertEquals(self.client.get('/api/v1/users/other_user/jobs/').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEquals(self.client.get('/api/v1/users/other_user/jobs/{0}/'.format(job.id)).status_code,
+                          status.HTTP_403_FORBIDDEN)
+        self.assertEquals(self.client.get('/api/v1/users/test_user/jobs/{0}/'.format(job.id)).status_code,
+                          status.HTTP_404_NOT_FOUND)
+        self.assertEquals(self.client.post('/api/v1/users/other_user/jobs/', {'kind': 'rebuild_reports'},
+                                           format='json').status_code, status.HTTP_403_FORBIDDEN)
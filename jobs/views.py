@@ -0,0 +1,48 @@
+from rest_framework import exceptions, permissions, status, viewsets
+from rest_framework.response import Response
+from ppbudget.pagination import KeysetPagination
+from jobs.models import Job
+from jobs.serializers import JobSerializer
+from jobs.permissions import IsJobsOwner
+
+
+class UserJobsViewSet(viewsets.ViewSet):
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    pagination_class = KeysetPagination
+
+    def get_permissions(self):
+        return permissions.IsAuthenticated(), IsJobsOwner(),
+
+    def list(self, request, user_username=None):
+        """
+        The jobs of the user, the latest first, optionally only the ones with the given `status`.
+        """
+        queryset = self.queryset.filter(user__username=user_username).order_by('-id')
+        job_status = request.query_params.get('status')
+        if job_status is not None:
+            if job_status not in dict(Job.STATUSES):
+                raise exceptions.ParseError('status must be one of: {0}.'.format(
+                    ', '.join(value for value, _ in Job.STATUSES)))
+            queryset = queryset.filter(status=job_status)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def retrieve(self, request, pk=None, user_username=None):
+        try:
+            job = self.queryset.get(id=int(pk), user__username=user_username)
+        except (ValueError, Job.DoesNotExist):
+            raise exceptions.NotFound()
+        return Response(self.serializer_class(job).data)
+
+    def create(self, request, user_username=None):
+        """
+        Enqueues a job for the worker processes, 202 Accepted. An identical job of the user that is still pending
+        is returned instead of adding another one, 200 OK.
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED if serializer.created else status.HTTP_200_OK)
@@ -0,0 +1,115 @@
+"""
+The worker loop of `manage.py run_worker` and the pool of processes running it.
+
+Workers poll the jobs table for due pending jobs, so the database is the only broker. SIGTERM and SIGINT stop a
+worker once its current job is done.
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import traceback
+from django.db import close_old_connections, connections
+from jobs.kinds import JobError, run_job
+from jobs.models import Job
+
+
+class Worker(object):
+    def __init__(self, poll_seconds=1.0, stale_seconds=3600, burst=False, log=None):
+        self.name = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.burst = burst
+        self.log = log or (lambda message: None)
+        self.stopping = False
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self):
+        """
+        Runs the due jobs until stopped, or in `burst` mode until none is due.
+        """
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            while not self.stopping:
+                job = Job.objects.claim(self.name)
+                if job is not None:
+                    self.perform(job)
+                    continue
+
+                requeued = Job.objects.requeue_stale(self.stale_seconds)
+                if requeued:
+                    self.log('{0}: requeued {1} stale jobs'.format(self.name, requeued))
+                elif self.burst:
+                    break
+                else:
+                    close_old_connections()
+                    time.sleep(self.poll_seconds)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def perform(self, job):
+        started = time.perf_counter()
+        try:
+            result = run_job(job)
+        except JobError as exc:
+            job.fail(str(exc), retry=False)
+        except Exception as exc:
+            job.fail(''.join(traceback.format_exception_only(type(exc), exc)).strip())
+        else:
+            job.succeed(result)
+        finally:
+            # a connection broken by the job must not fail the following ones
+            close_old_connections()
+
+        self.log('{0}: {1} #{2} {3} in {4:.2f}s (attempt {5}/{6})'.format(
+            self.name, job.kind, job.id, job.status, time.perf_counter() - started, job.attempts, job.max_attempts))
+
+
+def run_worker(**options):
+    Worker(**options).run()
+
+
+class Pool(object):
+    """
+    Runs `processes` workers in forked processes and restarts the ones that die, until it receives SIGTERM or
+    SIGINT, which it passes on to the workers.
+    """
+
+    def __init__(self, processes, **worker_options):
+        self.processes = processes
+        self.worker_options = worker_options
+        self.workers = []
+        self.stopping = False
+
+    def stop(self, *args):
+        self.stopping = True
+        for process in self.workers:
+            if process.is_alive():
+                process.terminate()
+
+    def start_worker(self):
+        # the forked processes must open connections of their own
+        connections.close_all()
+        process = multiprocessing.Process(target=run_worker, kwargs=self.worker_options)
+        process.start()
+        return process
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.workers = [self.start_worker() for _ in range(self.processes)]
+        while not self.stopping and self.workers:
+            time.sleep(1)
+            for position, process in enumerate(self.workers):
+                if process.exitcode not in (None, 0) and not self.stopping:
+                    # killed or crashed, a stale job of it is requeued by the others
+                    self.workers[position] = self.start_worker()
+            # in burst mode the workers exit once nothing is due
+            self.workers = [process for process in self.workers if process.exitcode is None]
+
+        for process in self.workers:
+            process.join()
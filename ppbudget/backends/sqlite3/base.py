@@ -0,0 +1,63 @@
+"""
+SQLite backend tuned for concurrent requests, opted into with SQLITE_TUNED (see the settings).
+
+Every connection switches to WAL journaling, so readers never block the writer and the writer never blocks
+readers, and sets the PRAGMAS below. The `pragmas` option of the database overrides or extends them.
+
+Transactions start with BEGIN IMMEDIATE, taking the write lock up front. A deferred transaction that reads and
+then writes fails with "database is locked" at once when another connection wrote meanwhile, the busy timeout
+is not applied to that upgrade. BEGIN IMMEDIATE is retried with short random sleeps for up to the `begin_timeout`
+option (5 seconds by default) rather than left to the busy handler of SQLite, which sleeps up to 100ms at a time
+and leaves the lock idle meanwhile.
+"""
+import random
+import time
+from collections import OrderedDict
+from itertools import count
+from django.db.backends.sqlite3 import base
+from django.db.utils import OperationalError
+
+PRAGMAS = OrderedDict([
+    ('journal_mode', 'WAL'),
+    # durable at checkpoints instead of at every commit, consistent after a crash in WAL mode
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    # KiB when negative
+    ('cache_size', -64000),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+])
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    begin_backoff = 0.0005
+
+    def get_connection_params(self):
+        params = super(DatabaseWrapper, self).get_connection_params()
+        # options of this backend, the others are passed to sqlite3.connect
+        self.pragmas = OrderedDict(PRAGMAS)
+        self.pragmas.update(params.pop('pragmas', {}))
+        self.begin_timeout = params.pop('begin_timeout', 5)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super(DatabaseWrapper, self).get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute('PRAGMA {0} = {1}'.format(name, value))
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        with self.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout = 0')
+            try:
+                deadline = time.time() + self.begin_timeout
+                for attempt in count():
+                    try:
+                        cursor.execute('BEGIN IMMEDIATE')
+                        return
+                    except OperationalError as error:
+                        if time.time() >= deadline or 'locked' not in str(error):
+                            raise
+                    time.sleep(random.uniform(0, min(self.begin_backoff * 2 ** attempt, 0.01)))
+            finally:
+                cursor.execute('PRAGMA busy_timeout = {0}'.format(self.pragmas['busy_timeout']))
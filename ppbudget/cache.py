@@ -0,0 +1,185 @@
+"""
+Bounded LRU cache of user-scoped API responses.
+
+Entries are keyed by the ETag of `ppbudget.conditional.conditional_list`, which covers the change marker versions
+of the user. A save or delete of the cached data bumps its marker, so the entry is never read again and ages out
+of the cache, in every process sharing a file backend as well.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class LocMemBackend(object):
+    """
+    Per-process backend, an OrderedDict of the pickled entries in least recently used order.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+            except KeyError:
+                return None
+            return self.entries[key]
+
+    def set(self, key, value):
+        """
+        Stores the value and returns the number of evicted entries.
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            evicted = 0
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FileBackend(object):
+    """
+    Backend shared by the processes of a host, one file per entry. The modification time of a file is its last
+    use, the oldest files are removed when there are more than `max_entries`.
+
+    The entries are unpickled and hold user data, so `location` must be a directory only the user running the
+    processes can access, it is created so when missing.
+    """
+
+    def __init__(self, location, max_entries=1000):
+        self.location = location
+        self.max_entries = max_entries
+        os.makedirs(self.location, mode=0o700, exist_ok=True)
+        status = os.stat(self.location)
+        if status.st_uid != os.getuid() or status.st_mode & 0o077:
+            raise ImproperlyConfigured('The response cache directory {0} must be owned by the user running the '
+                                       'application and closed to everyone else (mode 0700).'.format(location))
+
+    def get(self, key):
+        path = self.__entry_path__(key)
+        try:
+            with open(path, 'rb') as entry:
+                value = entry.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return value
+
+    def set(self, key, value):
+        descriptor, temporary = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as entry:
+            entry.write(value)
+        os.replace(temporary, self.__entry_path__(key))
+
+        paths = self.__entries__()
+        evicted = 0
+        if len(paths) > self.max_entries:
+            for path in sorted(paths, key=self.__mtime__)[:len(paths) - self.max_entries]:
+                try:
+                    os.remove(path)
+                    evicted += 1
+                except OSError:
+                    pass
+        return evicted
+
+    def __len__(self):
+        return len(self.__entries__())
+
+    def clear(self):
+        for path in self.__entries__():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __entry_path__(self, key):
+        return os.path.join(self.location, hashlib.md5(key.encode('utf-8')).hexdigest() + '.cache')
+
+    def __entries__(self):
+        return [os.path.join(self.location, name) for name in os.listdir(self.location) if name.endswith('.cache')]
+
+    def __mtime__(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return 0
+
+
+class ResponseCache(object):
+    """
+    Pickles the cached values, so entries never hold on to the serializers or querysets they were built with.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value):
+        evicted = self.backend.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self.lock:
+            self.evictions += evicted
+
+    def stats(self):
+        """
+        Counters of this process since it started, the entries of the backend.
+        """
+        return OrderedDict([
+            ('backend', '{0}.{1}'.format(type(self.backend).__module__, type(self.backend).__name__)),
+            ('entries', len(self.backend)),
+            ('max_entries', self.backend.max_entries),
+            ('hits', self.hits),
+            ('misses', self.misses),
+            ('evictions', self.evictions)
+        ])
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """
+    Returns the process wide ResponseCache configured by the RESPONSE_CACHE setting.
+    """
+    global _response_cache
+    if _response_cache is None:
+        config = getattr(settings, 'RESPONSE_CACHE', {})
+        backend = import_string(config.get('BACKEND', 'ppbudget.cache.LocMemBackend'))
+        _response_cache = ResponseCache(backend(**config.get('OPTIONS', {})))
+    return _response_cache
+
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    global _response_cache
+    if setting == 'RESPONSE_CACHE':
+        _response_cache = None
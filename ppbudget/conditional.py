@@ -0,0 +1,60 @@
+import hashlib
+from functools import wraps
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+from ppbudget.cache import get_response_cache
+from authentication.models import ChangeMarker
+
+
+def conditional_list(*scopes, cache=False):
+    """
+    Answers conditional GETs of a user-scoped list view from the change markers of `scopes`, before the view runs
+    any of its own queries. The ETag also covers the query string and the negotiated media type.
+
+    With `cache` the data of successful responses is kept in the response cache under the ETag, so it is only
+    rebuilt after a change of the markers.
+
+    No Last-Modified is sent: it has a resolution of seconds, so a client revalidating with If-Modified-Since
+    would miss the changes made in the same second as its copy.
+
+    Expects the permissions of the view to have checked that the requesting user owns the listed data.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            markers = ChangeMarker.objects.get_markers(request.user.id, scopes)
+            etag = hashlib.md5('|'.join(
+                [str(request.user.id), request.get_full_path(), request.accepted_media_type or ''] +
+                # the update time guards against versions repeating after a database is restored or recreated
+                ['{0}:{1}:{2}'.format(scope, version, updated_at.isoformat()) for scope, version, updated_at in markers]
+            ).encode('utf-8')).hexdigest()
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None and cache:
+                response = cached_view(view, self, request, etag, *args, **kwargs)
+            elif response is None:
+                response = view(self, request, *args, **kwargs)
+
+            if 200 <= response.status_code < 300 or response.status_code == 304:
+                response['ETag'] = quote_etag(etag)
+                # cached copies must always be revalidated
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_view(view, viewset, request, etag, *args, **kwargs):
+    response_cache = get_response_cache()
+    data = response_cache.get(etag)
+    if data is not None:
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    response = view(viewset, request, *args, **kwargs)
+    if isinstance(response, Response) and response.status_code == 200:
+        response_cache.set(etag, response.data)
+        response['X-Cache'] = 'MISS'
+    return response
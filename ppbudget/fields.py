@@ -0,0 +1,33 @@
+from collections import OrderedDict
+from rest_framework import serializers
+
+
+class NestedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Accepts a primary key on input and renders the related object with `serializer_class` on output, given
+    `fieldset` when it is set (see ppbudget.fieldsets).
+    """
+    serializer_class = None
+    fieldset = None
+
+    def __init__(self, **kwargs):
+        self.serializer_class = kwargs.pop('serializer_class', self.serializer_class)
+        super(NestedPrimaryKeyRelatedField, self).__init__(**kwargs)
+
+    def use_pk_only_optimization(self):
+        return False
+
+    def to_representation(self, value):
+        if self.fieldset is not None:
+            return self.serializer_class(value, context=self.context, fieldset=self.fieldset).data
+        return self.serializer_class(value, context=self.context).data
+
+    def get_choices(self, cutoff=None):
+        queryset = self.get_queryset()
+        if queryset is None:
+            return {}
+
+        if cutoff is not None:
+            queryset = queryset[:cutoff]
+
+        return OrderedDict([(item.pk, self.display_value(item)) for item in queryset])
@@ -0,0 +1,163 @@
+"""
+Sparse fieldsets and expansion of the nested objects, the `?fields=` and `?expand=` parameters of the API.
+
+`?fields=id,event_date,operations.flow` limits a representation to the given fields, a dotted path selects the
+fields of a nested object. `?expand=user,operations.resource` renders the listed relations as nested objects and
+every other relation as its primary key(s), `?expand=` all of them. Without `?expand=` the relations are nested
+as they are by default, so is a relation with fields selected by `?fields=`.
+
+Serializers with SparseFieldsetMixin accept the parsed Fieldset as the `fieldset` argument, their
+`setup_eager_loading` takes it as well, so the queries and joins of the pruned fields are left out too.
+"""
+from rest_framework import exceptions, serializers
+from rest_framework.permissions import SAFE_METHODS
+from ppbudget.fields import NestedPrimaryKeyRelatedField
+
+
+class Fieldset(object):
+    """
+    The fields of a representation: `fields` are the names of the rendered ones, all of them when None, `nested`
+    the Fieldsets of the expanded relations by name. With `collapse` the relations missing in `nested` are rendered
+    as primary keys.
+    """
+
+    def __init__(self, fields=None, collapse=False):
+        self.fields = fields
+        self.collapse = collapse
+        self.nested = {}
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        return self.includes(name) and (not self.collapse or name in self.nested)
+
+    def including(self, *names):
+        """
+        Copy of the fieldset including the given fields as well.
+        """
+        if self.fields is None:
+            return self
+        fieldset = Fieldset(self.fields | set(names), self.collapse)
+        fieldset.nested = self.nested
+        return fieldset
+
+    def child(self, name):
+        """
+        The Fieldset of the relation `name`.
+        """
+        if name in self.nested:
+            return self.nested[name]
+        return COLLAPSED if self.collapse else FULL
+
+    def add_path(self, names, selected):
+        """
+        Adds the relations of the path to `nested`, and its fields to `fields` when they are `selected`.
+        """
+        fieldset = self
+        for position, name in enumerate(names):
+            if selected:
+                fieldset.fields = (fieldset.fields or set()) | {name}
+            if position < len(names) - 1 or not selected:
+                fieldset = fieldset.nested.setdefault(name, Fieldset(collapse=self.collapse))
+
+
+FULL = Fieldset()
+COLLAPSED = Fieldset(collapse=True)
+
+
+def fieldset_param(request):
+    """
+    Returns the Fieldset of the `fields` and `expand` query parameters of a safe request, FULL when there are
+    none of them.
+    """
+    fields, expand = request.query_params.get('fields'), request.query_params.get('expand')
+    if request.method not in SAFE_METHODS or (fields is None and expand is None):
+        return FULL
+
+    fieldset = Fieldset(collapse=expand is not None)
+    for param, value, selected in (('expand', expand, False), ('fields', fields, True)):
+        # an empty expand collapses every relation
+        if value is None or (not value and not selected):
+            continue
+        for path in value.split(','):
+            names = path.strip().split('.')
+            if not all(names):
+                raise exceptions.ParseError('{0} must be a comma separated list of field names.'.format(param))
+            fieldset.add_path(names, selected)
+    return fieldset
+
+
+def is_relation(field):
+    """
+    Whether the serializer field renders related objects nested.
+    """
+    if isinstance(field, serializers.ManyRelatedField):
+        field = field.child_relation
+    return isinstance(field, (serializers.BaseSerializer, NestedPrimaryKeyRelatedField))
+
+
+def collapsed(field):
+    """
+    Read-only field rendering the primary key(s) of the relation instead.
+    """
+    many = isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField))
+    return serializers.PrimaryKeyRelatedField(read_only=True, many=many)
+
+
+class SparseFieldsetMixin(object):
+    """
+    Serializer taking a Fieldset as the `fieldset` argument. The fields it does not include are removed, the
+    relations it does not expand are replaced with their primary keys and the nested serializers are given their
+    own fieldsets.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fieldset = kwargs.pop('fieldset', FULL)
+        super(SparseFieldsetMixin, self).__init__(*args, **kwargs)
+        if fieldset is not FULL:
+            self.apply_fieldset(fieldset)
+
+    def apply_fieldset(self, fieldset):
+        names = set(self.fields)
+        unknown = (fieldset.fields or set()) - names
+        if unknown:
+            raise exceptions.ParseError('Unknown fields: {0}.'.format(', '.join(sorted(unknown))))
+        not_relations = {name for name in fieldset.nested if name not in names or not is_relation(self.fields[name])}
+        if not_relations:
+            raise exceptions.ParseError('Not expandable: {0}.'.format(', '.join(sorted(not_relations))))
+
+        for name in list(self.fields):
+            field = self.fields[name]
+            if not fieldset.includes(name):
+                self.fields.pop(name)
+            elif is_relation(field) and not fieldset.expands(name):
+                self.fields[name] = collapsed(field)
+            elif is_relation(field):
+                nested = field.child if isinstance(field, serializers.ListSerializer) else \
+                    field.child_relation if isinstance(field, serializers.ManyRelatedField) else field
+                if isinstance(nested, NestedPrimaryKeyRelatedField):
+                    # it instantiates the serializer for every related object
+                    nested.fieldset = fieldset.child(name)
+                else:
+                    nested.apply_fieldset(fieldset.child(name))
+
+
+class SparseFieldsetViewMixin(object):
+    """
+    Generic view passing the Fieldset of the request to its serializers and to the `setup_eager_loading` of its
+    serializer class, which prepares the queryset of the view.
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, 'fieldset'):
+            self.fieldset = fieldset_param(self.request)
+        return self.fieldset
+
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(
+            super(SparseFieldsetViewMixin, self).get_queryset(), self.get_fieldset())
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fieldset', self.get_fieldset())
+        return super(SparseFieldsetViewMixin, self).get_serializer(*args, **kwargs)
@@ -0,0 +1,221 @@
+"""
+Per-route request metrics of the serving process, in the Prometheus text exposition format.
+
+Routes are the resolved views, `<viewset>.<action>` for the API, so the user names and ids of the paths do not
+multiply the series. The queries of a request are counted and timed by cursor wrappers installed on the
+connections of the serving thread, which unlike the debug cursors do not format and keep the SQL.
+"""
+import bisect
+import threading
+import time
+from functools import partial
+from django.db import connections
+from django.db.backends import utils
+from ppbudget.cache import get_response_cache
+
+# upper bounds of the request duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_state = threading.local()
+
+
+class TimedCursorWrapper(utils.CursorWrapper):
+    """
+    Adds the queries it runs and their time to the counters of the current thread.
+    """
+
+    def execute(self, sql, params=None):
+        started = time.perf_counter()
+        try:
+            return super(TimedCursorWrapper, self).execute(sql, params)
+        finally:
+            count_query(time.perf_counter() - started)
+
+    def executemany(self, sql, param_list):
+        started = time.perf_counter()
+        try:
+            return super(TimedCursorWrapper, self).executemany(sql, param_list)
+        finally:
+            count_query(time.perf_counter() - started)
+
+
+class TimedCursorDebugWrapper(utils.CursorDebugWrapper, TimedCursorWrapper):
+    pass
+
+
+def count_query(seconds):
+    if getattr(_state, 'started', None) is not None:
+        _state.queries += 1
+        _state.query_seconds += seconds
+
+
+def instrument_connections():
+    """
+    Makes the cursors of the connections of the current thread count their queries.
+    """
+    for connection in connections.all():
+        if 'make_cursor' not in vars(connection):
+            connection.make_cursor = partial(TimedCursorWrapper, db=connection)
+            connection.make_debug_cursor = partial(TimedCursorDebugWrapper, db=connection)
+
+
+def start():
+    """
+    Starts measuring a request served by the current thread.
+    """
+    instrument_connections()
+    _state.started = time.perf_counter()
+    _state.route = None
+    _state.queries, _state.query_seconds = 0, 0.0
+
+
+def set_route(route):
+    _state.route = route
+
+
+def finish():
+    """
+    Ends the measurement of the current thread and returns (route, seconds, queries, query seconds), or None when
+    no request was started.
+    """
+    started = getattr(_state, 'started', None)
+    if started is None:
+        return None
+    _state.started = None
+    return _state.route or 'unresolved', time.perf_counter() - started, _state.queries, _state.query_seconds
+
+
+def view_route(view_func, method):
+    """
+    `<view>.<action>` of a resolved view. The action of a viewset is the one it maps the method to, of other class
+    based views the method, when they handle it.
+    """
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if view_class is None:
+        return '{0}.{1}'.format(view_func.__module__, view_func.__name__)
+
+    method = method.lower()
+    actions = getattr(view_func, 'actions', None)
+    if actions is not None:
+        action = actions.get(method, 'other')
+    else:
+        action = method if method in view_class.http_method_names else 'other'
+    return '{0}.{1}'.format(view_class.__name__, action)
+
+
+class RouteMetrics(object):
+    def __init__(self):
+        # not cumulative, the exposition sums them up
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.seconds = 0.0
+        self.statuses = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.bytes = 0
+
+
+class Registry(object):
+    """
+    Metrics of the requests served by this process since it started, by route.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def record(self, route, seconds, queries, query_seconds, status, size):
+        bucket = bisect.bisect_left(DURATION_BUCKETS, seconds)
+        with self.lock:
+            metrics = self.routes.get(route)
+            if metrics is None:
+                metrics = self.routes[route] = RouteMetrics()
+            metrics.buckets[bucket] += 1
+            metrics.seconds += seconds
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.queries += queries
+            metrics.query_seconds += query_seconds
+            metrics.bytes += size
+
+    def add_bytes(self, route, size):
+        with self.lock:
+            self.routes[route].bytes += size
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+    def render(self):
+        """
+        The metrics of the routes and the counters of the response cache in the text exposition format.
+        """
+        with self.lock:
+            routes = sorted((route, self.copy(metrics)) for route, metrics in self.routes.items())
+
+        lines = []
+        append = lines.append
+        append('# HELP ppbudget_request_duration_seconds Time of serving the requests, by route.')
+        append('# TYPE ppbudget_request_duration_seconds histogram')
+        for route, metrics in routes:
+            label = escape(route)
+            total = 0
+            for bound, count in zip(DURATION_BUCKETS + (float('inf'),), metrics.buckets):
+                total += count
+                append('ppbudget_request_duration_seconds_bucket{{route="{0}",le="{1}"}} {2}'.format(
+                    label, '+Inf' if bound == float('inf') else repr(bound), total))
+            append('ppbudget_request_duration_seconds_sum{{route="{0}"}} {1!r}'.format(label, metrics.seconds))
+            append('ppbudget_request_duration_seconds_count{{route="{0}"}} {1}'.format(label, total))
+
+        append('# HELP ppbudget_requests_total Requests served, by route and status code.')
+        append('# TYPE ppbudget_requests_total counter')
+        for route, metrics in routes:
+            for code, count in sorted(metrics.statuses.items()):
+                append('ppbudget_requests_total{{route="{0}",status="{1}"}} {2}'.format(escape(route), code, count))
+
+        for name, attribute, description in (
+                ('ppbudget_db_queries_total', 'queries', 'Database queries of the requests, by route.'),
+                ('ppbudget_db_query_seconds_total', 'query_seconds', 'Time of the database queries, by route.'),
+                ('ppbudget_response_bytes_total', 'bytes', 'Size of the response bodies, by route.')):
+            append('# HELP {0} {1}'.format(name, description))
+            append('# TYPE {0} counter'.format(name))
+            for route, metrics in routes:
+                append('{0}{{route="{1}"}} {2!r}'.format(name, escape(route), getattr(metrics, attribute)))
+
+        stats = get_response_cache().stats()
+        for key in ('hits', 'misses', 'evictions'):
+            append('# HELP ppbudget_response_cache_{0}_total Response cache {0} of this process.'.format(key))
+            append('# TYPE ppbudget_response_cache_{0}_total counter'.format(key))
+            append('ppbudget_response_cache_{0}_total {1}'.format(key, stats[key]))
+        append('# HELP ppbudget_response_cache_entries Entries of the response cache backend.')
+        append('# TYPE ppbudget_response_cache_entries gauge')
+        append('ppbudget_response_cache_entries {0}'.format(stats['entries']))
+        return '\n'.join(lines) + '\n'
+
+    def copy(self, metrics):
+        copy = RouteMetrics()
+        copy.__dict__.update(metrics.__dict__, buckets=list(metrics.buckets), statuses=dict(metrics.statuses))
+        return copy
+
+
+def escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def count_streamed(registry, route, content):
+    """
+    Passes the chunks of a streaming response through, adding their size to the route once it is sent.
+    """
+    size = 0
+    try:
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+    finally:
+        registry.add_bytes(route, size)
+
+
+_registry = Registry()
+
+
+def get_registry():
+    return _registry
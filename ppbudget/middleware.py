@@ -0,0 +1,62 @@
+import time
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from ppbudget import metrics, routers
+
+PRIMARY_COOKIE = 'primary_until'
+
+
+class ReplicaMiddleware(object):
+    """
+    Routes the reads of safe requests to a read replica (see `ppbudget.routers`).
+
+    A request that writes to the primary sets a cookie pinning the reads of the client to the primary for
+    REPLICA_PIN_SECONDS, so it reads its own writes while the replicas catch up. The cookie holds the end of the
+    window, which is checked here as well, whatever the client does with its expiry.
+    """
+
+    def process_request(self, request):
+        pinned = request.method not in SAFE_METHODS or self.pinned_until(request) > time.time()
+        routers.route_reads(None if pinned else routers.choose_replica())
+
+    def process_response(self, request, response):
+        if routers.reset():
+            window = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+            response.set_cookie(PRIMARY_COOKIE, str(int(time.time() + window)), max_age=window, httponly=True)
+        return response
+
+    def process_exception(self, request, exception):
+        routers.reset()
+
+    def pinned_until(self, request):
+        try:
+            return int(request.COOKIES[PRIMARY_COOKIE])
+        except (KeyError, ValueError):
+            return 0
+
+
+class MetricsMiddleware(object):
+    """
+    Records the latency, queries, response size and status code of every request by route (see
+    `ppbudget.metrics`). It goes first, so the time and queries of the other middleware are included.
+    """
+
+    def process_request(self, request):
+        metrics.start()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics.set_route(metrics.view_route(view_func, request.method))
+
+    def process_response(self, request, response):
+        measured = metrics.finish()
+        if measured is None:
+            return response
+
+        route, seconds, queries, query_seconds = measured
+        registry = metrics.get_registry()
+        if response.streaming:
+            registry.record(route, seconds, queries, query_seconds, response.status_code, 0)
+            response.streaming_content = metrics.count_streamed(registry, route, response.streaming_content)
+        else:
+            registry.record(route, seconds, queries, query_seconds, response.status_code, len(response.content))
+        return response
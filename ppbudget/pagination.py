@@ -0,0 +1,156 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import reduce
+from operator import and_, or_
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over the ordering of the paginated queryset.
+
+    The ordering must end with a unique field (e.g. `id`) and none of its fields may be nullable. Annotations
+    with an output field may be ordered by as well. Besides model instances the pages may be `values()` rows,
+    which must include the ordering fields. The cursor carries the ordering values of the row the page
+    starts after, so every page is a range query over the ordering columns instead of an OFFSET scan.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+
+        values, reverse = self.decode_cursor(request)
+        if reverse:
+            queryset = queryset.order_by(*[self.__reverse_order__(order) for order in self.ordering])
+
+        if values is not None:
+            queryset = queryset.filter(self.get_seek_filter(values, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = tuple(queryset.query.order_by)
+        assert ordering and ordering[-1].lstrip('-') in ('id', 'pk'), (
+            'KeysetPagination requires a queryset ordered by a unique field, e.g. .order_by(..., "id").'
+        )
+        return ordering
+
+    def get_seek_filter(self, values, reverse):
+        """
+        Builds `(a, b, c) > (x, y, z)` for mixed sort directions, led by a plain range on the first
+        column so the database can seek the index instead of testing every row.
+        """
+        terms = []
+        for position, order in enumerate(self.ordering):
+            conditions = [Q(**{self.__field__(previous): values[index]})
+                          for index, previous in enumerate(self.ordering[:position])]
+            conditions.append(Q(**{self.__lookup__(order, reverse, strict=True): values[position]}))
+            terms.append(reduce(and_, conditions))
+
+        leading = Q(**{self.__lookup__(self.ordering[0], reverse, strict=False): values[0]})
+        return leading & reduce(or_, terms)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        values = [self.__value_of__(instance, order) for order in self.ordering]
+        cursor = json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)).decode('utf-8'))
+            values = [self.__field_of__(order).to_python(value)
+                      for order, value in zip(self.ordering, cursor['v'])]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return values, bool(cursor['r'])
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def __field__(self, order):
+        name = order.lstrip('-')
+        return 'id' if name == 'pk' else name
+
+    def __lookup__(self, order, reverse, strict):
+        descending = order.startswith('-') != reverse
+        return '{0}__{1}{2}'.format(self.__field__(order), 'lt' if descending else 'gt', '' if strict else 'e')
+
+    def __reverse_order__(self, order):
+        return order[1:] if order.startswith('-') else '-' + order
+
+    def __field_of__(self, order):
+        if self.__field__(order) in self.annotations:
+            return self.annotations[self.__field__(order)].output_field
+        model = self.model
+        path = self.__field__(order).split('__')
+        for name in path[:-1]:
+            model = model._meta.get_field(name).related_model
+        return model._meta.get_field(path[-1])
+
+    def __value_of__(self, instance, order):
+        if isinstance(instance, dict):
+            # what value_to_string gives for the types that can be ordered by
+            return str(instance[self.__field__(order)])
+        if self.__field__(order) in self.annotations:
+            return str(getattr(instance, self.__field__(order)))
+        return self.__field_of__(order).value_to_string(self.__owner_of__(instance, order))
+
+    def __owner_of__(self, instance, order):
+        for name in self.__field__(order).split('__')[:-1]:
+            instance = getattr(instance, name)
+        return instance
@@ -0,0 +1,62 @@
+from datetime import datetime
+from rest_framework import exceptions
+
+
+def positive_int_param(request, name):
+    """
+    Returns the query parameter `name` as a positive integer, None when it is absent.
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        value = int(value)
+        if value > 0:
+            return value
+    except ValueError:
+        pass
+    raise exceptions.ParseError('{0} must be a positive integer.'.format(name))
+
+
+def date_param(request, name):
+    """
+    Returns the query parameter `name` parsed as an ISO date (YYYY-MM-DD), None when it is absent.
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise exceptions.ParseError('{0} must be a date in the YYYY-MM-DD format.'.format(name))
+
+
+def id_list_param(request, name):
+    """
+    Returns the query parameter `name` as a list of distinct positive integers separated with commas, None when
+    it is absent.
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        ids = sorted({int(item) for item in value.split(',')})
+        if ids and ids[0] > 0:
+            return ids
+    except ValueError:
+        pass
+    raise exceptions.ParseError('{0} must be a comma separated list of positive integers.'.format(name))
+
+
+def bool_param(request, name):
+    """
+    Returns the query parameter `name` as a boolean (true, false, 1 or 0), False when it is absent.
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return False
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise exceptions.ParseError('{0} must be true or false.'.format(name))
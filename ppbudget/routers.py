@@ -0,0 +1,63 @@
+"""
+Read replica routing.
+
+`ReplicaRouter` sends every write to the primary (`default`) database. Reads go to one of the DATABASE_REPLICAS
+aliases only while `ppbudget.middleware.ReplicaMiddleware` serves a safe request that is not pinned to the primary,
+so management commands, signals and all other code outside of requests keep reading what they write.
+"""
+import random
+import threading
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def route_reads(alias):
+    """
+    Sends the reads of the current thread to the `alias` replica, or to the primary when it is None.
+    """
+    _state.alias = alias
+    _state.wrote = False
+
+
+def reset():
+    """
+    Ends the routing of the current thread and returns whether it wrote to the primary meanwhile.
+    """
+    wrote = getattr(_state, 'wrote', False)
+    _state.alias, _state.wrote = None, False
+    return wrote
+
+
+def choose_replica():
+    """
+    One of the DATABASE_REPLICAS aliases at random, or None when there are none.
+    """
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    return random.choice(replicas) if replicas else None
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        alias = getattr(_state, 'alias', None)
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # reads of a transaction on the primary must see its writes
+            return None
+
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # related objects come from the database the instance was read from
+            return instance._state.db
+        return alias
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold copies of the primary data
+        aliases = {DEFAULT_DB_ALIAS} | set(getattr(settings, 'DATABASE_REPLICAS', []))
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
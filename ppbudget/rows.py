@@ -0,0 +1,90 @@
+"""
+Representations of serializers built straight from `values()` rows.
+
+A RowFormat compiles the fields of a serializer once: every plain field becomes a column of the rows with a
+converter giving what the field's `to_representation` gives, related fields rendered as a primary key read the
+`<name>_id` column and the nested ones are filled in by the caller. Building a row is then a loop over the
+columns, without instantiating serializers and fields or resolving attributes for every object.
+"""
+import decimal
+from collections import OrderedDict
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# to_representation of these returns values() values unchanged
+UNCHANGED = (serializers.CharField, serializers.IntegerField)
+
+
+def converter(field):
+    """
+    Function of a non-null model value returning its representation by the serializer field, None when the
+    value is represented as it is.
+    """
+    if type(field) in UNCHANGED:
+        return None
+
+    if isinstance(field, serializers.DecimalField) and field.decimal_places is not None and \
+            not field.localize and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        return lambda value: '{0:f}'.format(value.quantize(exponent, context=context))
+
+    if isinstance(field, serializers.DateTimeField) and \
+            getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601:
+        def datetime_representation(value):
+            value = value.isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return datetime_representation
+
+    if isinstance(field, serializers.DateField) and \
+            getattr(field, 'format', api_settings.DATE_FORMAT).lower() == ISO_8601:
+        return lambda value: value.isoformat()
+
+    return field.to_representation
+
+
+class RowFormat(object):
+    """
+    Representation of the serializer from rows with its columns (see `columns`) prefixed with `prefix`, e.g.
+    'user__' for the user of the rows of another model.
+    """
+
+    def __init__(self, serializer, prefix=''):
+        self.fields = []
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and field.use_pk_only_optimization():
+                self.fields.append((name, prefix + field.source + '_id', None))
+            elif isinstance(field, (serializers.BaseSerializer, serializers.RelatedField,
+                                    serializers.ManyRelatedField)):
+                self.fields.append((name, None, None))
+            else:
+                self.fields.append((name, prefix + field.source, converter(field)))
+
+    @property
+    def columns(self):
+        """
+        Names of the values() columns of the plain fields.
+        """
+        return [column for _, column, _ in self.fields if column is not None]
+
+    @property
+    def nested(self):
+        """
+        Names of the nested fields.
+        """
+        return [name for name, column, _ in self.fields if column is None]
+
+    def __call__(self, row, **nested):
+        """
+        The representation of the row, with the given values of the nested fields.
+        """
+        representation = OrderedDict()
+        for name, column, convert in self.fields:
+            if column is None:
+                representation[name] = nested[name]
+            else:
+                value = row[column]
+                representation[name] = value if convert is None or value is None else convert(value)
+        return representation
@@ -0,0 +1,124 @@
+"""
+Schema objects the models cannot declare, created with raw SQL by the migrations: indexes with descending columns
+and the triggers keeping the full-text index of the event descriptions in step (see events.search).
+
+On SQLite, most schema changes of a later migration remake the whole table, and the objects Django does not know
+about are lost with the old one. A migration changing one of the tables below wraps its operations with
+`remaking(table, ...)`, which creates them again, and `check_raw_sql` fails `migrate` when one is still missing,
+instead of the queries silently slowing down or the search returning stale results.
+"""
+from django.core.management.base import CommandError
+from django.db import connections, migrations
+from django.db.migrations.recorder import MigrationRecorder
+
+
+class RawObject(object):
+    def __init__(self, kind, name, table, create, migration, vendor=None):
+        self.kind = kind
+        self.name = name
+        self.table = table
+        self.create = create
+        self.drop = 'DROP {0} {1}'.format(kind.upper(), name)
+        # (app label, name) of the migration creating it
+        self.migration = migration
+        self.vendor = vendor
+
+
+def index(name, table, columns, migration):
+    return RawObject('index', name, table, 'CREATE INDEX {0} ON {1} ({2})'.format(name, table, columns), migration)
+
+
+def trigger(name, table, event, body, migration, vendor):
+    return RawObject('trigger', name, table, 'CREATE TRIGGER {0} AFTER {1} ON {2} BEGIN {3} END'.format(
+        name, event, table, body), migration, vendor)
+
+
+RAW_OBJECTS = [
+    # the trailing id of the orderings is the rowid SQLite appends to every index
+    index('events_event_user_id_event_date_description', 'events_event', 'user_id, event_date DESC, description',
+          ('events', '0005_operation_event_date')),
+    index('events_operation_resource_id_event_date', 'events_operation', 'resource_id, event_date DESC',
+          ('events', '0005_operation_event_date')),
+    # the tag filters read the event ids of tags, the unique (event_id, tag_id) index leads with the event
+    index('events_event_tags_tag_id_event_id', 'events_event_tags', 'tag_id, event_id',
+          ('events', '0006_event_tags_tag_id_event_id_index')),
+    # the category tree is listed root nodes first
+    index('categories_category_user_id_root_node_event_type_name', 'categories_category',
+          'user_id, root_node DESC, event_type, name', ('categories', '0006_category_user_id_root_node_index')),
+    # the external content fts5 table of the search stores no copy of the descriptions, these keep it in step
+    trigger('events_event_fts_insert', 'events_event', 'INSERT',
+            'INSERT INTO events_event_fts (rowid, description) VALUES (new.id, new.description);',
+            ('events', '0007_event_fts'), 'sqlite'),
+    trigger('events_event_fts_delete', 'events_event', 'DELETE',
+            "INSERT INTO events_event_fts (events_event_fts, rowid, description) "
+            "VALUES ('delete', old.id, old.description);",
+            ('events', '0007_event_fts'), 'sqlite'),
+    trigger('events_event_fts_update', 'events_event', 'UPDATE OF description',
+            "INSERT INTO events_event_fts (events_event_fts, rowid, description) "
+            "VALUES ('delete', old.id, old.description); "
+            "INSERT INTO events_event_fts (rowid, description) VALUES (new.id, new.description);",
+            ('events', '0007_event_fts'), 'sqlite'),
+]
+
+BY_NAME = {raw_object.name: raw_object for raw_object in RAW_OBJECTS}
+
+
+def run_sql(*names):
+    """
+    The RunSQL operation creating the named objects of RAW_OBJECTS.
+    """
+    return migrations.RunSQL([BY_NAME[name].create for name in names],
+                             [BY_NAME[name].drop for name in reversed(names)])
+
+
+def existing_names(connection, table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('SELECT name FROM sqlite_master WHERE tbl_name = %s', [table])
+            return {row[0] for row in cursor.fetchall()}
+        return set(connection.introspection.get_constraints(cursor, table))
+
+
+def missing_objects(connection, table=None):
+    """
+    The objects of RAW_OBJECTS (on `table`) created by an applied migration that the database lacks.
+    """
+    applied = MigrationRecorder(connection).applied_migrations()
+    expected = [raw_object for raw_object in RAW_OBJECTS if raw_object.migration in applied and
+                raw_object.vendor in (None, connection.vendor) and table in (None, raw_object.table)]
+
+    missing, names = [], {}
+    for raw_object in expected:
+        if raw_object.table not in names:
+            names[raw_object.table] = existing_names(connection, raw_object.table)
+        if raw_object.name not in names[raw_object.table]:
+            missing.append(raw_object)
+    return missing
+
+
+def restore(table):
+    def restore_table(apps, schema_editor):
+        for raw_object in missing_objects(schema_editor.connection, table):
+            schema_editor.execute(raw_object.create)
+    return restore_table
+
+
+def remaking(table, *operations):
+    """
+    Wraps `operations`, which may remake `table`, with the creation of its raw objects after them in both
+    directions.
+    """
+    return [migrations.RunPython(migrations.RunPython.noop, restore(table))] + list(operations) + \
+        [migrations.RunPython(restore(table), migrations.RunPython.noop)]
+
+
+def check_raw_sql(sender, using, **kwargs):
+    """
+    post_migrate receiver failing when an object of RAW_OBJECTS created by a migration of the app is missing.
+    """
+    missing = [raw_object for raw_object in missing_objects(connections[using])
+               if raw_object.migration[0] == sender.label]
+    if missing:
+        raise CommandError('Missing {0}. A migration remade the table without ppbudget.schema.remaking.'.format(
+            ', '.join('{0} {1} on {2}'.format(raw_object.kind, raw_object.name, raw_object.table)
+                      for raw_object in missing)))
@@ -43,7 +43,9 @@ INSTALLED_APPS = [
     'dictionaries',
     'categories',
     'tags',
-    'events'
+    'events',
+    'reports',
+    'jobs'
 ]
 
 REST_FRAMEWORK = {
@@ -52,7 +54,17 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10
 }
 
+# Cache of the slow-changing user-scoped list responses, bounded with LRU eviction. For a cache shared by the
+# processes of a host use 'ppbudget.cache.FileBackend' with a 'location' directory in OPTIONS, private to the user
+# running them.
+RESPONSE_CACHE = {
+    'BACKEND': 'ppbudget.cache.LocMemBackend',
+    'OPTIONS': {'max_entries': 1000}
+}
+
 MIDDLEWARE_CLASSES = [
+    'ppbudget.middleware.MetricsMiddleware',
+    'ppbudget.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,10 +103,37 @@ WSGI_APPLICATION = 'ppbudget.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get('DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
     }
 }
 
+# SQLITE_TUNED=1 in the environment switches to the SQLite backend tuned for concurrent requests (WAL, pragmas and
+# IMMEDIATE transactions), see ppbudget.backends.sqlite3
+if os.environ.get('SQLITE_TUNED'):
+    DATABASES['default']['ENGINE'] = 'ppbudget.backends.sqlite3'
+
+# Read replicas of the primary database. DATABASE_REPLICAS=2 in the environment adds the db.replica1.sqlite3 and
+# db.replica2.sqlite3 stand-ins for local testing, refreshed by copying db.sqlite3 over them. Their test databases
+# mirror the primary one.
+for number in range(1, int(os.environ.get('DATABASE_REPLICAS', 0)) + 1):
+    DATABASES['replica{0}'.format(number)] = {
+        'ENGINE': DATABASES['default']['ENGINE'],
+        'NAME': os.path.join(BASE_DIR, 'db.replica{0}.sqlite3'.format(number)),
+        'TEST': {'MIRROR': 'default'}
+    }
+
+DATABASE_REPLICAS = [alias for alias in sorted(DATABASES) if alias != 'default']
+
+DATABASE_ROUTERS = ['ppbudget.routers.ReplicaRouter']
+
+# Seconds the reads of a client stay on the primary after it wrote
+REPLICA_PIN_SECONDS = 10
+
+# Runs of a failing background job (see jobs.kinds) before it is given up, and the seconds before its first retry,
+# doubled with every following one
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
@@ -0,0 +1,48 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class _AssertMaxQueriesContext(CaptureQueriesContext):
+    def __init__(self, test_case, budget, connection):
+        self.test_case = test_case
+        self.budget = budget
+        super(_AssertMaxQueriesContext, self).__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super(_AssertMaxQueriesContext, self).__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+
+        executed = len(self)
+        self.test_case.assertLessEqual(
+            executed, self.budget,
+            '{0} queries executed, the budget is {1}\nCaptured queries were:\n{2}'.format(
+                executed, self.budget, '\n'.join(query['sql'] for query in self.captured_queries)
+            )
+        )
+
+
+class QueryBudgetMixin(object):
+    """
+    Test case mixin pinning the number of queries an endpoint may run.
+
+    Unlike `assertNumQueries` the budget is an upper bound, so it only fails when an endpoint regresses.
+    `assertConstantQueries` additionally checks that the count does not grow with the amount of data.
+    """
+
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS):
+        return _AssertMaxQueriesContext(self, budget, connections[using])
+
+    def assertConstantQueries(self, budget, request, grow, using=DEFAULT_DB_ALIAS):
+        """
+        Runs `request()`, calls `grow()` to add more data, runs `request()` again and asserts that both runs
+        stay within `budget` and execute the same number of queries.
+        """
+        with self.assertMaxQueries(budget, using) as before:
+            request()
+        grow()
+        with self.assertMaxQueries(budget, using) as after:
+            request()
+
+        self.assertEquals(len(before), len(after), 'Query count grows with the data: {0} -> {1}'.format(
+            len(before), len(after)))
@@ -0,0 +1,564 @@
+import os
+import re
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.db.utils import ConnectionHandler, OperationalError
+from django.http import HttpResponse
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APITestCase
+from ppbudget import metrics, routers, schema
+from ppbudget.cache import LocMemBackend, FileBackend
+from ppbudget.fieldsets import FULL, COLLAPSED, fieldset_param
+from ppbudget.middleware import ReplicaMiddleware, PRIMARY_COOKIE
+from ppbudget.routers import ReplicaRouter
+from ppbudget.testing import QueryBudgetMixin
+from dictionaries.models import EventType
+from categories.models import Category
+from tags.models import Tag
+from events.history import balance_history
+from events.models import Resource, Event, Operation, BalanceCheckpoint
+
+FULL_SCAN = re.compile(r'^SCAN ')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific.')
+class QueryPlanTestCase(APITestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on the queries of the list endpoints, which must be served by an index both for
+    filtering and ordering. Table rebuilds of SQLite migrations drop the raw SQL indexes, this catches it.
+    """
+
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        food = Category.objects.create(user=test_user, name='food', event_type=EventType.EXPENSE, root_node=True)
+        Category.objects.create(user=test_user, parent=food, name='bread', event_type=EventType.EXPENSE)
+        tag = Tag.objects.create(user=test_user, name='test_tag')
+        self.resource = Resource.objects.create(user=test_user, name='cash', initial_balance=100)
+        Resource.objects.create(user=test_user, name='card', initial_balance=100)
+
+        for day in range(1, 6):
+            self.event = Event.objects.create(user=test_user, description='test_description',
+                                              event_type=EventType.EXPENSE, event_date=date(2016, 5, day),
+                                              category=food)
+            self.event.tags.add(tag)
+            for resource in Resource.objects.all():
+                Operation.objects.create(event=self.event, resource=resource, flow=-day)
+
+        self.client.force_login(test_user)
+
+    def get_plans(self, url, table):
+        """
+        Requests the first two pages of `url` and returns the query plans of the queries reading from `table`.
+        """
+        plans = []
+        for page in range(2):
+            if url is None:
+                break
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+            for query in context.captured_queries:
+                if query['sql'].startswith('SELECT') and 'FROM "{0}"'.format(table) in query['sql']:
+                    with connection.cursor() as cursor:
+                        cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                        plans.append([row[-1] for row in cursor.fetchall()])
+
+            url = response.data.get('next') if isinstance(response.data, dict) else None
+
+        self.assertTrue(plans, 'No query read from {0}.'.format(table))
+        return plans
+
+    def assertIndexed(self, url, table, sorted_by_index=True):
+        for plan in self.get_plans(url, table):
+            self.assertFalse([step for step in plan if FULL_SCAN.search(step)], 'Full scan: {0}'.format(plan))
+            if sorted_by_index:
+                self.assertFalse([step for step in plan if TEMP_SORT.search(step)], 'Temp sort: {0}'.format(plan))
+
+    def test_user_events(self):
+        self.assertIndexed('/api/v1/users/test_user/events/?page_size=2', 'events_event')
+
+    def test_user_events_tag_filters(self):
+        tag_id = Tag.objects.get().id
+        self.assertIndexed('/api/v1/users/test_user/events/?page_size=2&tags_all={0}&tags_none={0}'.format(tag_id),
+                           'events_event')
+
+    def test_user_events_search(self):
+        # the matches of the full-text index are read first and the events looked up by id, whatever the filters
+        for plan in self.get_plans('/api/v1/users/test_user/events/?page_size=2&q=test&from=2016-01-01',
+                                   'events_event'):
+            steps = [step for step in plan if 'events_event' in step]
+            self.assertTrue(steps[0].startswith('SCAN events_event_fts VIRTUAL TABLE'), plan)
+            self.assertIn('SEARCH events_event USING INTEGER PRIMARY KEY (rowid=?)', steps, plan)
+
+    def test_resource_operations(self):
+        self.assertIndexed('/api/v1/resources/{0}/operations/?page_size=2'.format(self.resource.id),
+                           'events_operation')
+
+    def test_event_operations(self):
+        # sorted by the resource name, which only sorts the operations of the one event
+        self.assertIndexed('/api/v1/events/{0}/operations/?page_size=1'.format(self.event.id), 'events_operation',
+                           sorted_by_index=False)
+
+    def test_user_categories(self):
+        self.assertIndexed('/api/v1/users/test_user/categories/', 'categories_category')
+
+    def test_user_tags(self):
+        self.assertIndexed('/api/v1/users/test_user/tags/', 'tags_tag')
+
+    def test_user_resources(self):
+        self.assertIndexed('/api/v1/users/test_user/resources/?page_size=1', 'events_resource')
+
+
+class RawSchemaTestCase(TestCase):
+    def test_created(self):
+        self.assertEquals(schema.missing_objects(connection), [])
+
+    def test_missing_fails_migrate(self):
+        with connection.cursor() as cursor:
+            cursor.execute(schema.BY_NAME['events_event_user_id_event_date_description'].drop)
+
+        self.assertEquals([raw_object.name for raw_object in schema.missing_objects(connection, 'events_event')],
+                          ['events_event_user_id_event_date_description'])
+        # only the app of the migration creating it is checked
+        schema.check_raw_sql(apps.get_app_config('categories'), 'default')
+        with self.assertRaisesMessage(CommandError, 'index events_event_user_id_event_date_description'):
+            schema.check_raw_sql(apps.get_app_config('events'), 'default')
+
+        with connection.schema_editor() as editor:
+            schema.restore('events_event')(apps, editor)
+        self.assertEquals(schema.missing_objects(connection), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'The full-text triggers are SQLite specific.')
+    def test_missing_trigger(self):
+        with connection.cursor() as cursor:
+            cursor.execute(schema.BY_NAME['events_event_fts_update'].drop)
+
+        with self.assertRaisesMessage(CommandError, 'trigger events_event_fts_update on events_event'):
+            schema.check_raw_sql(apps.get_app_config('events'), 'default')
+
+
+class ConditionalListTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.test_user = User.objects.create(username='test_user')
+        self.category = Category.objects.create(user=self.test_user, name='food', event_type=EventType.EXPENSE,
+                                                root_node=True)
+        self.tag = Tag.objects.create(user=self.test_user, name='test_tag')
+        self.resource = Resource.objects.create(user=self.test_user, name='cash', initial_balance=100)
+        self.event = Event.objects.create(user=self.test_user, description='test_description',
+                                          event_type=EventType.EXPENSE, event_date=date(2016, 5, 1),
+                                          category=self.category)
+        self.event.tags.add(self.tag)
+
+        self.client.force_login(self.test_user)
+
+    def assertNotModified(self, url):
+        etag = self.client.get(url)['ETag']
+
+        # session, user, change marker
+        with self.assertMaxQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEquals(response['ETag'], etag)
+        self.assertEquals(response.content, b'')
+
+    def test_not_modified(self):
+        for url in ('/api/v1/users/test_user/categories/', '/api/v1/users/test_user/tags/',
+                    '/api/v1/users/test_user/resources/', '/api/v1/users/test_user/events/',
+                    '/api/v1/users/test_user/reports/monthly/'):
+            self.assertNotModified(url)
+
+    def test_headers(self):
+        response = self.client.get('/api/v1/users/test_user/events/')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_modified_within_second(self):
+        url = '/api/v1/users/test_user/tags/'
+        since = http_date(time.time() + 1)
+        self.client.get(url)
+        Tag.objects.create(user=self.test_user, name='new_tag')
+
+        # the dates have no say, only the ETag
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(response.data['results']), 2)
+
+    def test_etag_covers_query(self):
+        etag = self.client.get('/api/v1/users/test_user/events/')['ETag']
+
+        response = self.client.get('/api/v1/users/test_user/events/?page_size=1', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+    def test_writes_change_etag(self):
+        urls = {'categories': '/api/v1/users/test_user/categories/', 'tags': '/api/v1/users/test_user/tags/',
+                'resources': '/api/v1/users/test_user/resources/', 'events': '/api/v1/users/test_user/events/'}
+
+        def changed(write):
+            etags = {name: self.client.get(url)['ETag'] for name, url in urls.items()}
+            write()
+            return sorted(name for name, url in urls.items() if self.client.get(url)['ETag'] != etags[name])
+
+        self.assertEquals(changed(lambda: Tag.objects.filter(id=self.tag.id).get().save()), ['events', 'tags'])
+        self.assertEquals(changed(lambda: self.event.tags.remove(self.tag)), ['events'])
+        self.assertEquals(changed(lambda: Operation.objects.create(event=self.event, resource=self.resource,
+                                                                   flow=-1)),
+                          ['events', 'resources'])
+        self.assertEquals(changed(lambda: Category.objects.create(user=self.test_user, name='home',
+                                                                  event_type=EventType.EXPENSE)),
+                          ['categories'])
+        self.assertEquals(changed(lambda: self.client.force_login(self.test_user)), [])
+
+
+class CacheBackendTestCase(SimpleTestCase):
+    def test_locmem_lru(self):
+        backend = LocMemBackend(max_entries=2)
+
+        backend.set('a', b'1')
+        backend.set('b', b'2')
+        backend.get('a')
+        self.assertEquals(backend.set('c', b'3'), 1)
+
+        self.assertEquals(backend.get('a'), b'1')
+        self.assertIsNone(backend.get('b'))
+        self.assertEquals(len(backend), 2)
+
+    def test_file_bounded(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = FileBackend(location=location, max_entries=2)
+
+            for key in ('a', 'b', 'c'):
+                backend.set(key, key.encode('utf-8'))
+
+            self.assertEquals(len(backend), 2)
+            self.assertEquals(backend.get('c'), b'c')
+            self.assertIsNone(backend.get('d'))
+
+    def test_file_private(self):
+        with tempfile.TemporaryDirectory() as parent:
+            location = os.path.join(parent, 'cache')
+            FileBackend(location=location)
+            self.assertEquals(os.stat(location).st_mode & 0o777, 0o700)
+
+            os.chmod(location, 0o755)
+            with self.assertRaisesMessage(ImproperlyConfigured, location):
+                FileBackend(location=location)
+
+
+class ResponseCacheTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        # a new, empty cache for every test
+        cache_settings = override_settings(RESPONSE_CACHE={'BACKEND': 'ppbudget.cache.LocMemBackend',
+                                                           'OPTIONS': {'max_entries': 10}})
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+        self.test_user = User.objects.create(username='test_user')
+        Category.objects.create(user=self.test_user, name='food', event_type=EventType.EXPENSE, root_node=True)
+
+        self.client.force_login(self.test_user)
+
+    def get_tree(self):
+        response = self.client.get('/api/v1/users/test_user/categories/')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_hit_and_invalidation(self):
+        self.assertEquals(self.get_tree()['X-Cache'], 'MISS')
+
+        # session, user, change marker
+        with self.assertMaxQueries(3):
+            response = self.get_tree()
+        self.assertEquals(response['X-Cache'], 'HIT')
+        self.assertEquals([category['name'] for category in response.data], ['food'])
+
+        Category.objects.create(user=self.test_user, name='home', event_type=EventType.EXPENSE, root_node=True)
+
+        response = self.get_tree()
+        self.assertEquals(response['X-Cache'], 'MISS')
+        self.assertEquals([category['name'] for category in response.data], ['food', 'home'])
+
+    def test_stats(self):
+        self.get_tree()
+        self.get_tree()
+        self.client.force_login(User.objects.create(username='admin', is_staff=True))
+
+        response = self.client.get('/api/v1/cache/')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals((response.data['hits'], response.data['misses'], response.data['entries']), (1, 1, 1))
+
+    def test_stats_not_admin(self):
+        response = self.client.get('/api/v1/cache/')
+
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class FieldsetParamTestCase(SimpleTestCase):
+    def fieldset(self, query, method='get'):
+        return fieldset_param(Request(getattr(RequestFactory(), method)('/?' + query)))
+
+    def test_fields(self):
+        fieldset = self.fieldset('fields=id,operations.flow,operations.resource.name')
+
+        self.assertEquals(fieldset.fields, {'id', 'operations'})
+        self.assertFalse(fieldset.includes('user'))
+        self.assertTrue(fieldset.expands('operations'))
+        self.assertEquals(fieldset.child('operations').fields, {'flow', 'resource'})
+        self.assertEquals(fieldset.child('operations').child('resource').fields, {'name'})
+
+    def test_expand(self):
+        fieldset = self.fieldset('expand=operations.resource')
+
+        self.assertTrue(fieldset.includes('user'))
+        self.assertFalse(fieldset.expands('user'))
+        self.assertTrue(fieldset.child('operations').expands('resource'))
+        self.assertFalse(fieldset.child('operations').child('resource').expands('user'))
+        self.assertIs(self.fieldset('expand=').child('user'), COLLAPSED)
+
+    def test_full(self):
+        self.assertIs(self.fieldset(''), FULL)
+        self.assertIs(self.fieldset('fields=id', method='post'), FULL)
+        self.assertIs(FULL.child('user'), FULL)
+
+
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        metrics.get_registry().clear()
+        self.addCleanup(metrics.get_registry().clear)
+
+        self.test_user = User.objects.create(username='test_user')
+        resource = Resource.objects.create(user=self.test_user, name='cash', initial_balance=0)
+        category = Category.objects.create(user=self.test_user, name='food', event_type=EventType.EXPENSE)
+        event = Event.objects.create(user=self.test_user, description='bread', event_type=EventType.EXPENSE,
+                                     category=category, event_date=date(2016, 1, 1))
+        Operation.objects.create(event=event, resource=resource, flow=-5)
+
+        self.client.force_login(self.test_user)
+
+    def scrape(self):
+        self.client.force_login(User.objects.get_or_create(username='admin', is_staff=True)[0])
+        response = self.client.get('/api/v1/metrics/')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode('utf-8')
+
+    def samples(self, text):
+        return dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+
+    def test_routes(self):
+        listed = self.client.get('/api/v1/users/test_user/events/')
+        self.client.get('/api/v1/users/test_user/events/')
+        self.client.get('/api/v1/resources/0/')
+
+        samples = self.samples(self.scrape())
+
+        self.assertEquals(samples['ppbudget_requests_total{route="UserEventsViewSet.list",status="200"}'], '2')
+        self.assertEquals(samples['ppbudget_requests_total{route="ResourceViewSet.retrieve",status="403"}'], '1')
+        self.assertEquals(
+            samples['ppbudget_request_duration_seconds_bucket{route="UserEventsViewSet.list",le="+Inf"}'], '2')
+        self.assertEquals(samples['ppbudget_request_duration_seconds_count{route="UserEventsViewSet.list"}'], '2')
+        self.assertEquals(samples['ppbudget_response_bytes_total{route="UserEventsViewSet.list"}'],
+                          str(2 * len(listed.content)))
+        self.assertGreater(int(samples['ppbudget_db_queries_total{route="UserEventsViewSet.list"}']), 0)
+        self.assertGreater(float(samples['ppbudget_db_query_seconds_total{route="UserEventsViewSet.list"}']), 0)
+        self.assertFalse(any('test_user' in name for name in samples))
+
+    def test_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/v1/users/test_user/resources/')
+        executed = len(context)
+
+        samples = self.samples(self.scrape())
+
+        self.assertEquals(samples['ppbudget_db_queries_total{route="UserResourcesViewSet.list"}'], str(executed))
+
+    def test_streamed_bytes(self):
+        response = self.client.get('/api/v1/users/test_user/events/export/?format=ndjson')
+        content = b''.join(response.streaming_content)
+
+        samples = self.samples(self.scrape())
+
+        self.assertEquals(samples['ppbudget_response_bytes_total{route="UserEventsViewSet.export"}'],
+                          str(len(content)))
+
+    def test_response_cache(self):
+        self.client.get('/api/v1/users/test_user/categories/')
+
+        samples = self.samples(self.scrape())
+
+        self.assertIn('ppbudget_response_cache_misses_total', samples)
+        self.assertIn('ppbudget_response_cache_entries', samples)
+
+    def test_not_admin(self):
+        response = self.client.get('/api/v1/metrics/')
+
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=10)
+class ReplicaRoutingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaMiddleware()
+        self.router = ReplicaRouter()
+
+    def tearDown(self):
+        routers.reset()
+
+    def route(self, request):
+        """
+        Returns the database of a read and a write of the request, and its response.
+        """
+        self.middleware.process_request(request)
+        read = self.router.db_for_read(User)
+        write = self.router.db_for_write(User) if request.method == 'POST' else None
+        return read, write, self.middleware.process_response(request, HttpResponse())
+
+    def test_safe_request_reads_replica(self):
+        read, _, response = self.route(self.factory.get('/'))
+
+        self.assertEquals(read, 'replica1')
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_write_pins_primary(self):
+        read, write, response = self.route(self.factory.post('/'))
+
+        self.assertEquals((read, write), (None, 'default'))
+        self.assertEquals(response.cookies[PRIMARY_COOKIE]['max-age'], 10)
+
+        request = self.factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = response.cookies[PRIMARY_COOKIE].value
+        self.assertIsNone(self.route(request)[0])
+
+    def test_pin_expires(self):
+        request = self.factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = str(int(time.time()) - 1)
+
+        self.assertEquals(self.route(request)[0], 'replica1')
+
+    def test_outside_requests_read_primary(self):
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_transaction_reads_primary(self):
+        routers.route_reads('replica1')
+
+        with mock.patch.object(connections['default'], 'in_atomic_block', True):
+            self.assertIsNone(self.router.db_for_read(User))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertIsNone(self.route(self.factory.get('/'))[0])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaReadsTestCase(TransactionTestCase):
+    """
+    Routes real queries to a replica in a second SQLite file, lagging behind the primary. Outside of a TestCase, as
+    the reads of a transaction never leave the primary.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        connections.databases['replica1'] = {'ENGINE': 'django.db.backends.sqlite3',
+                                             'NAME': os.path.join(self.directory.name, 'db.replica1.sqlite3')}
+        with connections['replica1'].schema_editor() as editor:
+            for model in (Resource, Event, Operation, BalanceCheckpoint):
+                editor.create_model(model)
+
+        test_user = User.objects.create(username='test_user')
+        category = Category.objects.create(user=test_user, name='food', event_type=EventType.EXPENSE)
+        self.resource = Resource.objects.create(user=test_user, name='cash', initial_balance=100)
+        event = Event.objects.create(user=test_user, description='test_description', event_type=EventType.EXPENSE,
+                                     event_date=date(2016, 2, 10), category=category)
+        # not copied to the replica yet
+        Operation.objects.create(event=event, resource=self.resource, flow=-5)
+
+    def tearDown(self):
+        routers.reset()
+        connections['replica1'].close()
+        del connections.databases['replica1']
+        delattr(connections._connections, 'replica1')
+        self.directory.cleanup()
+
+    def test_replica_reads(self):
+        routers.route_reads('replica1')
+
+        self.assertEquals(Operation.objects.count(), 0)
+        self.assertEquals(Operation.objects.using('default').count(), 1)
+
+    def test_checkpoints_read_primary(self):
+        routers.route_reads('replica1')
+
+        opening_balance, _ = balance_history(self.resource, date(2016, 3, 1), date(2016, 3, 31), 'month')
+
+        self.assertEquals(opening_balance, Decimal('95.00'))
+        self.assertEquals(list(BalanceCheckpoint.objects.using('default').values_list('month', 'flows')),
+                          [(date(2016, 3, 1), Decimal('-5.00'))])
+        self.assertFalse(BalanceCheckpoint.objects.using('replica1').exists())
+
+
+class TunedSQLiteTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.databases = ConnectionHandler({
+            alias: {'ENGINE': 'ppbudget.backends.sqlite3', 'NAME': os.path.join(self.directory.name, 'db.sqlite3'),
+                    'OPTIONS': {'pragmas': {'busy_timeout': 1000}, 'begin_timeout': 0.05}}
+            for alias in ('default', 'second')
+        })
+
+    def tearDown(self):
+        for alias in ('default', 'second'):
+            self.databases[alias].close()
+        self.directory.cleanup()
+
+    def pragma(self, name, alias='default'):
+        with self.databases[alias].cursor() as cursor:
+            cursor.execute('PRAGMA ' + name)
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        self.assertEquals(self.pragma('journal_mode'), 'wal')
+        # NORMAL
+        self.assertEquals(self.pragma('synchronous'), 1)
+        self.assertEquals(self.pragma('busy_timeout'), 1000)
+        self.assertEquals(self.pragma('cache_size'), -64000)
+        # MEMORY
+        self.assertEquals(self.pragma('temp_store'), 2)
+
+    def test_immediate_transactions(self):
+        first, second = self.databases['default'], self.databases['second']
+        first.ensure_connection()
+        first._start_transaction_under_autocommit()
+
+        # the write lock is taken when the transaction starts, before any write
+        second.ensure_connection()
+        started = time.time()
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            second._start_transaction_under_autocommit()
+        # retried for the begin timeout instead of waiting for the busy timeout
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEquals(self.pragma('busy_timeout', 'second'), 1000)
+
+        first.connection.rollback()
+        second._start_transaction_under_autocommit()
+        second.connection.rollback()
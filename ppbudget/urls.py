@@ -16,12 +16,15 @@ Including another URLconf
 from django.conf.urls import url, include
 from django.contrib import admin
 from rest_framework_nested import routers
-from ppbudget.views import IndexView
+from ppbudget.views import IndexView, ResponseCacheView, MetricsView
 from authentication.views import UserViewSet, GroupViewSet
 from categories.views import CategoryViewSet, UserCategoriesViewSet
 from tags.views import TagViewSet, UserTagsViewSet
 from events.views import ResourceViewSet, UserResourcesViewSet, ResourceOperationsViewSet, \
-    EventViewSet, UserEventsViewSet, EventOperationsViewSet
+    EventViewSet, UserEventsViewSet, EventOperationsViewSet, EventTagsViewSet, RecurringEventViewSet, \
+    UserRecurringEventsViewSet
+from reports.views import UserReportsViewSet
+from jobs.views import UserJobsViewSet
 
 router = routers.DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -30,6 +33,7 @@ router.register(r'categories', CategoryViewSet)
 router.register(r'tags', TagViewSet)
 router.register(r'resources', ResourceViewSet)
 router.register(r'events', EventViewSet)
+router.register(r'recurring-events', RecurringEventViewSet)
 
 tags_router = routers.NestedSimpleRouter(
     router, r'users', lookup='user'
@@ -51,6 +55,21 @@ events_router = routers.NestedSimpleRouter(
 )
 events_router.register(r'events', UserEventsViewSet)
 
+recurring_events_router = routers.NestedSimpleRouter(
+    router, r'users', lookup='user'
+)
+recurring_events_router.register(r'recurring-events', UserRecurringEventsViewSet)
+
+reports_router = routers.NestedSimpleRouter(
+    router, r'users', lookup='user'
+)
+reports_router.register(r'reports', UserReportsViewSet, base_name='user-reports')
+
+jobs_router = routers.NestedSimpleRouter(
+    router, r'users', lookup='user'
+)
+jobs_router.register(r'jobs', UserJobsViewSet, base_name='user-jobs')
+
 resource_operations_router = routers.NestedSimpleRouter(
     router, r'resources', lookup='resource'
 )
@@ -61,6 +80,11 @@ event_operations_router = routers.NestedSimpleRouter(
 )
 event_operations_router.register(r'operations', EventOperationsViewSet)
 
+event_tags_router = routers.NestedSimpleRouter(
+    router, r'events', lookup='event'
+)
+event_tags_router.register(r'tags', EventTagsViewSet, base_name='event-tags')
+
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^api/v1/', include(router.urls)),
@@ -68,8 +92,14 @@ urlpatterns = [
     url(r'^api/v1/', include(categories_router.urls)),
     url(r'^api/v1/', include(resources_router.urls)),
     url(r'^api/v1/', include(events_router.urls)),
+    url(r'^api/v1/', include(recurring_events_router.urls)),
+    url(r'^api/v1/', include(reports_router.urls)),
+    url(r'^api/v1/', include(jobs_router.urls)),
     url(r'^api/v1/', include(resource_operations_router.urls)),
     url(r'^api/v1/', include(event_operations_router.urls)),
+    url(r'^api/v1/', include(event_tags_router.urls)),
+    url(r'^api/v1/cache/$', ResponseCacheView.as_view(), name='response-cache'),
+    url(r'^api/v1/metrics/$', MetricsView.as_view(), name='metrics'),
     url(r'^api-auth/', include('rest_framework.urls', namespace='rest_framework')),
 
     url('^.*$', IndexView.as_view(), name='index'),
@@ -1,6 +1,12 @@
+from django.http import HttpResponse
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.generic.base import TemplateView
 from django.utils.decorators import method_decorator
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ppbudget.cache import get_response_cache
+from ppbudget.metrics import get_registry, CONTENT_TYPE
 
 
 class IndexView(TemplateView):
@@ -9,3 +15,27 @@ class IndexView(TemplateView):
     @method_decorator(ensure_csrf_cookie)
     def dispatch(self, *args, **kwargs):
         return super(IndexView, self).dispatch(*args, **kwargs)
+
+
+class ResponseCacheView(APIView):
+    """
+    Hit and miss counters of the response cache of the serving process.
+    """
+
+    def get_permissions(self):
+        return permissions.IsAuthenticated(), permissions.IsAdminUser(),
+
+    def get(self, request):
+        return Response(get_response_cache().stats())
+
+
+class MetricsView(APIView):
+    """
+    Request metrics of the serving process in the Prometheus text format.
+    """
+
+    def get_permissions(self):
+        return permissions.IsAuthenticated(), permissions.IsAdminUser(),
+
+    def get(self, request):
+        return HttpResponse(get_registry().render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,51 @@
+from collections import defaultdict
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, Count
+from authentication.models import ChangeMarker
+from events.models import Operation
+from reports.models import MonthlyTotal, month_of
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the monthly report totals from the events and their operations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='username', default=None,
+                            help='Only rebuild the totals of this user.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['username']:
+            users = users.filter(username=options['username'])
+
+        rebuilt = 0
+        for user_id in users.values_list('id', flat=True):
+            with transaction.atomic():
+                rebuilt += self.rebuild(user_id)
+                # the monthly report is versioned with the events
+                ChangeMarker.objects.bump(user_id, (ChangeMarker.EVENTS,))
+
+        self.stdout.write('Rebuilt {0} monthly totals.'.format(rebuilt))
+
+    def rebuild(self, user_id):
+        # aggregated per day by the database, reduced to months here to stay portable across backends
+        rows = Operation.objects.filter(event__user_id=user_id) \
+            .values_list('event__category_id', 'event__event_type', 'event__event_date') \
+            .annotate(total=Sum('flow'), operations=Count('id')).order_by()
+
+        totals = defaultdict(lambda: [0, 0])
+        for category_id, event_type, event_date, total, operations in rows:
+            month_total = totals[(month_of(event_date), category_id, event_type)]
+            month_total[0] += total
+            month_total[1] += operations
+
+        MonthlyTotal.objects.filter(user_id=user_id).delete()
+        MonthlyTotal.objects.bulk_create([
+            MonthlyTotal(user_id=user_id, month=month, category_id=category_id, event_type=event_type,
+                         total=total, operations=operations)
+            for (month, category_id, event_type), (total, operations) in totals.items()
+        ])
+
+        return len(totals)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 08:34
+from __future__ import unicode_literals
+
+from collections import defaultdict
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def create_totals(apps, schema_editor):
+    # the totals of the operations stored before, the write paths only add deltas to them
+    Operation = apps.get_model('events', 'Operation')
+    MonthlyTotal = apps.get_model('reports', 'MonthlyTotal')
+
+    rows = Operation.objects.values_list('event__user_id', 'event__category_id', 'event__event_type',
+                                         'event__event_date').annotate(total=Sum('flow'), operations=Count('id')) \
+        .order_by()
+    totals = defaultdict(lambda: [0, 0])
+    for user_id, category_id, event_type, event_date, total, operations in rows:
+        month_total = totals[(user_id, event_date.replace(day=1), category_id, event_type)]
+        month_total[0] += total
+        month_total[1] += operations
+
+    MonthlyTotal.objects.bulk_create([
+        MonthlyTotal(user_id=user_id, month=month, category_id=category_id, event_type=event_type, total=total,
+                     operations=operations)
+        for (user_id, month, category_id, event_type), (total, operations) in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('categories', '0005_categoryclosure'),
+        ('events', '0003_resource_current_balance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('event_type', models.CharField(choices=[('EX', 'Expense'), ('IN', 'Income'), ('CH', 'Change')], max_length=2)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('operations', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='categories.Category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlytotal',
+            unique_together=set([('user', 'month', 'category', 'event_type')]),
+        ),
+        migrations.RunPython(create_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.contrib.auth.models import User
+from categories.models import Category
+from dictionaries.models import EventType
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return (month.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+class MonthlyTotalManager(models.Manager):
+    def apply_deltas(self, deltas, using=None):
+        """
+        Adds {(user_id, event_date, category_id, event_type): (flow, operations)} to the totals of the months of
+        the given dates, with atomic UPDATE statements and an INSERT for months seen for the first time.
+        """
+        merged = {}
+        for (user_id, event_date, category_id, event_type), (flow, operations) in deltas.items():
+            key = (user_id, month_of(event_date), category_id, event_type)
+            previous_flow, previous_operations = merged.get(key, (0, 0))
+            merged[key] = (previous_flow + flow, previous_operations + operations)
+
+        manager = self.db_manager(using)
+        missing = []
+        for (user_id, month, category_id, event_type), (flow, operations) in merged.items():
+            if not flow and not operations:
+                continue
+            if not manager.filter(user_id=user_id, month=month, category_id=category_id, event_type=event_type) \
+                    .update(total=F('total') + flow, operations=F('operations') + operations):
+                missing.append(self.model(user_id=user_id, month=month, category_id=category_id,
+                                          event_type=event_type, total=flow, operations=operations))
+        if not missing:
+            return
+
+        try:
+            with transaction.atomic(using=manager.db):
+                manager.bulk_create(missing)
+        except IntegrityError:
+            # some of the months were created concurrently in the meantime
+            for total in missing:
+                lookup = {'user_id': total.user_id, 'month': total.month, 'category_id': total.category_id,
+                          'event_type': total.event_type}
+                if not manager.filter(**lookup).update(total=F('total') + total.total,
+                                                       operations=F('operations') + total.operations):
+                    manager.create(total=total.total, operations=total.operations, **lookup)
+
+
+class MonthlyTotal(models.Model):
+    """
+    Sum of the operation flows of a user's events per month, category and event type. Kept up to date by the
+    Event and Operation write paths, `manage.py rebuild_reports` recomputes it.
+    """
+    user = models.ForeignKey(User)
+    month = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    event_type = models.CharField(max_length=2, choices=EventType.EVENT_TYPES)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    operations = models.IntegerField(default=0)
+
+    objects = MonthlyTotalManager()
+
+    def __str__(self):
+        return '{0:%Y-%m} {1}: {2} ({3})'.format(self.month, self.category.name, self.total, self.user.username)
+
+    class Meta:
+        unique_together = ('user', 'month', 'category', 'event_type')
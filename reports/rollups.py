@@ -0,0 +1,68 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db.models import Q, Sum, Count
+from categories.tree import children_map, breadth_first
+from events.models import Operation
+from events.recurrence import projected_totals
+from reports.models import MonthlyTotal, month_of, next_month
+
+
+def category_rollups(categories, user_id, date_from=None, date_to=None, projected=False):
+    """
+    Returns (category, (total, operations), (subtree total, subtree operations)) for every category of the user,
+    parents before their children. With `projected` the totals include the occurrences of the recurring events up
+    to `date_to` that are not stored yet.
+
+    Whole months of the range are read from MonthlyTotal and only the partial months at its ends from the
+    operations, both grouped by category. Subtree totals are then summed in one pass from the leaves up.
+    """
+    first_month = None if date_from is None else \
+        month_of(date_from) if date_from.day == 1 else next_month(date_from)
+    end_month = None if date_to is None else month_of(date_to + timedelta(days=1))
+
+    own = defaultdict(lambda: [0, 0])
+    if first_month is not None and end_month is not None and first_month >= end_month:
+        # no whole month in the range
+        partial = Q(event_date__gte=date_from, event_date__lte=date_to)
+    else:
+        monthly = MonthlyTotal.objects.filter(user_id=user_id)
+        if first_month is not None:
+            monthly = monthly.filter(month__gte=first_month)
+        if end_month is not None:
+            monthly = monthly.filter(month__lt=end_month)
+        for category_id, total, operations in monthly.order_by().values_list('category_id') \
+                .annotate(Sum('total'), Sum('operations')):
+            own[category_id][0] += total
+            own[category_id][1] += operations
+
+        partial = Q()
+        if first_month is not None and date_from < first_month:
+            partial |= Q(event_date__gte=date_from, event_date__lt=first_month)
+        if end_month is not None and end_month <= date_to:
+            partial |= Q(event_date__gte=end_month, event_date__lte=date_to)
+
+    if partial:
+        for category_id, total, operations in Operation.objects.filter(partial, event__user_id=user_id) \
+                .order_by().values_list('event__category_id').annotate(Sum('flow'), Count('id')):
+            own[category_id][0] += total
+            own[category_id][1] += operations
+
+    if projected:
+        for (_, category_id, _), (total, operations) in projected_totals(user_id, date_to, date_from).items():
+            own[category_id][0] += total
+            own[category_id][1] += operations
+
+    children = children_map(categories)
+    parents = {category.id: category.parent_id for category in categories}
+    order = [category_id for category_id, _ in
+             breadth_first([category.id for category in categories if category.parent_id not in children], children)]
+
+    subtree = {category_id: list(own[category_id]) for category_id in order}
+    for category_id in reversed(order):
+        parent_id = parents[category_id]
+        if parent_id in subtree:
+            subtree[parent_id][0] += subtree[category_id][0]
+            subtree[parent_id][1] += subtree[category_id][1]
+
+    lookup = {category.id: category for category in categories}
+    return [(lookup[category_id], tuple(own[category_id]), tuple(subtree[category_id])) for category_id in order]
@@ -0,0 +1,27 @@
+from rest_framework import serializers
+from reports.models import MonthlyTotal
+
+
+class MonthlyTotalSerializer(serializers.ModelSerializer):
+    month = serializers.DateField(format='%Y-%m')
+    category_name = serializers.CharField(source='category.name')
+
+    class Meta:
+        model = MonthlyTotal
+        fields = ('month', 'category', 'category_name', 'event_type', 'total', 'operations')
+        read_only_fields = fields
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('category')
+
+
+class CategoryRollupSerializer(serializers.Serializer):
+    category = serializers.IntegerField()
+    category_name = serializers.CharField()
+    parent = serializers.IntegerField(allow_null=True)
+    event_type = serializers.CharField()
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    operations = serializers.IntegerField()
+    subtree_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+    subtree_operations = serializers.IntegerField()
@@ -0,0 +1,269 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.test import APITestCase
+from ppbudget.testing import QueryBudgetMixin
+from dictionaries.models import EventType
+from categories.models import Category
+from events.models import Resource, Event, Operation, RecurringEvent, RecurringFlow
+from events.bulk import create_events
+from reports.models import MonthlyTotal
+
+
+class MonthlyTotalTestCase(APITestCase):
+    def setUp(self):
+        self.test_user = User.objects.create(username='test_user')
+        self.food = Category.objects.create(user=self.test_user, name='food', event_type=EventType.EXPENSE)
+        self.home = Category.objects.create(user=self.test_user, name='home', event_type=EventType.EXPENSE)
+        self.cash = Resource.objects.create(user=self.test_user, name='cash', initial_balance=100)
+        self.card = Resource.objects.create(user=self.test_user, name='card', initial_balance=100)
+
+        self.event = Event.objects.create(user=self.test_user, description='groceries', event_type=EventType.EXPENSE,
+                                          event_date=date(2016, 5, 10), category=self.food)
+        self.operation = Operation.objects.create(event=self.event, resource=self.cash, flow=-10)
+        Operation.objects.create(event=self.event, resource=self.card, flow=-5)
+
+    def totals(self):
+        return {(total.month, total.category.name, total.event_type): (total.total, total.operations)
+                for total in MonthlyTotal.objects.filter(user=self.test_user).exclude(operations=0)}
+
+    def assertRebuildMatches(self):
+        # the incrementally maintained totals must equal the ones recomputed from scratch
+        totals = self.totals()
+        call_command('rebuild_reports', stdout=StringIO())
+        self.assertEquals(totals, self.totals())
+
+    def test_create(self):
+        self.assertEquals(self.totals(), {
+            (date(2016, 5, 1), 'food', EventType.EXPENSE): (Decimal('-15.00'), 2)
+        })
+        self.assertRebuildMatches()
+
+    def test_update_operation(self):
+        operation = Operation.objects.get(id=self.operation.id)
+        operation.flow = -20
+        operation.save()
+
+        self.assertEquals(self.totals(), {
+            (date(2016, 5, 1), 'food', EventType.EXPENSE): (Decimal('-25.00'), 2)
+        })
+        self.assertRebuildMatches()
+
+    def test_move_operation(self):
+        other = Event.objects.create(user=self.test_user, description='rent', event_type=EventType.EXPENSE,
+                                     event_date=date(2016, 6, 1), category=self.home)
+        operation = Operation.objects.get(id=self.operation.id)
+        operation.event = other
+        operation.save()
+
+        self.assertEquals(self.totals(), {
+            (date(2016, 5, 1), 'food', EventType.EXPENSE): (Decimal('-5.00'), 1),
+            (date(2016, 6, 1), 'home', EventType.EXPENSE): (Decimal('-10.00'), 1)
+        })
+        self.assertRebuildMatches()
+
+    def test_move_event(self):
+        event = Event.objects.get(id=self.event.id)
+        event.event_date = date(2016, 4, 30)
+        event.category = self.home
+        event.save()
+
+        self.assertEquals(self.totals(), {
+            (date(2016, 4, 1), 'home', EventType.EXPENSE): (Decimal('-15.00'), 2)
+        })
+        self.assertRebuildMatches()
+
+    def test_string_dates(self):
+        event = Event.objects.create(user=self.test_user, description='rent', event_type=EventType.EXPENSE,
+                                     event_date='2016-06-05', category=self.home)
+        Operation.objects.create(event=event, resource=self.cash, flow=-30)
+        event.event_date = '2016-07-05'
+        event.save()
+
+        self.assertEquals(self.totals(), {
+            (date(2016, 5, 1), 'food', EventType.EXPENSE): (Decimal('-15.00'), 2),
+            (date(2016, 7, 1), 'home', EventType.EXPENSE): (Decimal('-30.00'), 1)
+        })
+        self.assertEquals(Operation.objects.get(event=event).event_date, date(2016, 7, 5))
+        self.assertRebuildMatches()
+
+    def test_delete(self):
+        Operation.objects.get(id=self.operation.id).delete()
+        self.assertEquals(self.totals(), {
+            (date(2016, 5, 1), 'food', EventType.EXPENSE): (Decimal('-5.00'), 1)
+        })
+
+        self.event.delete()
+        self.assertEquals(self.totals(), {})
+        self.assertRebuildMatches()
+
+    def test_create_events(self):
+        create_events(self.test_user, [
+            {'description': 'bread', 'event_type': EventType.EXPENSE, 'event_date': date(2016, 5, day),
+             'category': self.food, 'operations': [{'resource': self.cash, 'flow': Decimal('-1.00')}]}
+            for day in (1, 2, 3)
+        ] + [
+            {'description': 'paint', 'event_type': EventType.EXPENSE, 'event_date': date(2016, 7, 1),
+             'category': self.home, 'operations': [{'resource': self.card, 'flow': Decimal('-30.00')}]}
+        ])
+
+        self.assertEquals(self.totals(), {
+            (date(2016, 5, 1), 'food', EventType.EXPENSE): (Decimal('-18.00'), 5),
+            (date(2016, 7, 1), 'home', EventType.EXPENSE): (Decimal('-30.00'), 1)
+        })
+        self.assertRebuildMatches()
+
+
+class UserReportsTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        test_user = User.objects.create(username='test_user')
+        other_user = User.objects.create(username='other_user')
+        food = Category.objects.create(user=test_user, name='food', event_type=EventType.EXPENSE)
+        salary = Category.objects.create(user=test_user, name='salary', event_type=EventType.INCOME)
+        cash = Resource.objects.create(user=test_user, name='cash', initial_balance=100)
+
+        for month in (3, 4, 5):
+            for day in (1, 15):
+                event = Event.objects.create(user=test_user, description='groceries', event_type=EventType.EXPENSE,
+                                             event_date=date(2016, month, day), category=food)
+                Operation.objects.create(event=event, resource=cash, flow=-month)
+            event = Event.objects.create(user=test_user, description='salary', event_type=EventType.INCOME,
+                                         event_date=date(2016, month, 28), category=salary)
+            Operation.objects.create(event=event, resource=cash, flow=1000)
+
+        self.client.force_login(test_user)
+        self.other_user = other_user
+
+    def test_get_monthly(self):
+        # session, user, change markers, totals
+        with self.assertMaxQueries(4):
+            response = self.client.get('/api/v1/users/test_user/reports/monthly/?from=2016-04-10&to=2016-05-01')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals([(row['month'], row['category_name'], row['event_type'], row['total'], row['operations'])
+                           for row in response.data], [
+            ('2016-04', 'food', EventType.EXPENSE, '-8.00', 2),
+            ('2016-04', 'salary', EventType.INCOME, '1000.00', 1),
+            ('2016-05', 'food', EventType.EXPENSE, '-10.00', 2),
+            ('2016-05', 'salary', EventType.INCOME, '1000.00', 1)
+        ])
+
+    def test_get_monthly_projected(self):
+        food = Category.objects.get(name='food')
+        rent = Category.objects.create(user=food.user, name='rent', event_type=EventType.EXPENSE)
+        for category, start_date, flow in ((food, date(2016, 5, 20), -1), (rent, date(2016, 5, 31), -100)):
+            recurring_event = RecurringEvent.objects.create(
+                user=food.user, description=category.name, event_type=EventType.EXPENSE, category=category,
+                frequency=RecurringEvent.MONTHLY, start_date=start_date)
+            RecurringFlow.objects.create(recurring_event=recurring_event, resource=Resource.objects.get(), flow=flow)
+
+        response = self.client.get('/api/v1/users/test_user/reports/monthly/?from=2016-05-01&to=2016-06-01'
+                                   '&projected=true')
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        # the months are whole, the projections of June are up to its end
+        self.assertEquals([(row['month'], row['category_name'], row['total'], row['operations'])
+                           for row in response.data], [
+            ('2016-05', 'food', '-11.00', 3),
+            ('2016-05', 'rent', '-100.00', 1),
+            ('2016-05', 'salary', '1000.00', 1),
+            ('2016-06', 'food', '-1.00', 1),
+            ('2016-06', 'rent', '-100.00', 1)
+        ])
+        self.assertEquals(self.client.get('/api/v1/users/test_user/reports/monthly/?projected=true').status_code,
+                          status.HTTP_400_BAD_REQUEST)
+
+    def test_get_monthly_invalid_date(self):
+        response = self.client.get('/api/v1/users/test_user/reports/monthly/?from=2016-13-01')
+
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_monthly_other_user(self):
+        self.client.force_login(self.other_user)
+
+        response = self.client.get('/api/v1/users/test_user/reports/monthly/')
+
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CategoryRollupsTestCase(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.test_user = User.objects.create(username='test_user')
+        self.food = Category.objects.create(user=self.test_user, name='food', event_type=EventType.EXPENSE,
+                                            root_node=True)
+        self.groceries = Category.objects.create(user=self.test_user, parent=self.food, name='groceries',
+                                                 event_type=EventType.EXPENSE)
+        self.restaurants = Category.objects.create(user=self.test_user, parent=self.food, name='restaurants',
+                                                   event_type=EventType.EXPENSE)
+        self.fast_food = Category.objects.create(user=self.test_user, parent=self.restaurants, name='fast food',
+                                                 event_type=EventType.EXPENSE)
+        self.cash = Resource.objects.create(user=self.test_user, name='cash', initial_balance=100)
+
+        for event_date, category, flow in [(date(2016, 4, 20), self.groceries, -1), (date(2016, 5, 1), self.food, -2),
+                                           (date(2016, 5, 15), self.fast_food, -4),
+                                           (date(2016, 5, 31), self.restaurants, -8),
+                                           (date(2016, 6, 3), self.fast_food, -16),
+                                           (date(2016, 6, 20), self.groceries, -32)]:
+            self.create_event(event_date, category, flow)
+
+        self.client.force_login(self.test_user)
+
+    def create_event(self, event_date, category, flow):
+        event = Event.objects.create(user=self.test_user, description='test_description',
+                                     event_type=EventType.EXPENSE, event_date=event_date, category=category)
+        Operation.objects.create(event=event, resource=self.cash, flow=flow)
+
+    def get_rollups(self, query=''):
+        response = self.client.get('/api/v1/users/test_user/reports/categories/' + query)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return {row['category_name']: (row['total'], row['subtree_total'], row['subtree_operations'])
+                for row in response.data}
+
+    def test_get_range(self):
+        # April and June are partial months, May is read from the monthly totals
+        self.assertEquals(self.get_rollups('?from=2016-04-15&to=2016-06-05'), {
+            'food': ('-2.00', '-31.00', 5),
+            'groceries': ('-1.00', '-1.00', 1),
+            'restaurants': ('-8.00', '-28.00', 3),
+            'fast food': ('-20.00', '-20.00', 2)
+        })
+
+    def test_get_within_month(self):
+        self.assertEquals(self.get_rollups('?from=2016-05-02&to=2016-05-30'), {
+            'food': ('0.00', '-4.00', 1),
+            'groceries': ('0.00', '0.00', 0),
+            'restaurants': ('0.00', '-4.00', 1),
+            'fast food': ('-4.00', '-4.00', 1)
+        })
+
+    def test_get_all(self):
+        rollups = self.get_rollups()
+
+        self.assertEquals(rollups['food'], ('-2.00', '-63.00', 6))
+        self.assertEquals(list(rollups), ['food', 'groceries', 'restaurants', 'fast food'])
+
+    def test_get_projected(self):
+        recurring_event = RecurringEvent.objects.create(
+            user=self.test_user, description='lunch', event_type=EventType.EXPENSE, category=self.fast_food,
+            frequency=RecurringEvent.WEEKLY, start_date=date(2016, 5, 30))
+        RecurringFlow.objects.create(recurring_event=recurring_event, resource=self.cash, flow=-64)
+
+        rollups = self.get_rollups('?from=2016-04-15&to=2016-06-05&projected=true')
+
+        self.assertEquals(rollups['fast food'], ('-84.00', '-84.00', 3))
+        self.assertEquals(rollups['food'], ('-2.00', '-95.00', 6))
+
+    def test_get_queries(self):
+        def grow():
+            parent = self.fast_food
+            for index in range(5):
+                parent = Category.objects.create(user=self.test_user, parent=parent, name='level ' + str(index),
+                                                 event_type=EventType.EXPENSE)
+                self.create_event(date(2016, 5, 10), parent, -1)
+
+        # session, user, change markers, categories, monthly totals, partial months
+        self.assertConstantQueries(6, lambda: self.get_rollups('?from=2016-04-15&to=2016-06-05'), grow)
+        self.assertEquals(self.get_rollups('?from=2016-04-15&to=2016-06-05')['food'], ('-2.00', '-36.00', 10))
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from rest_framework import exceptions, permissions, viewsets
+from rest_framework.decorators import list_route
+from rest_framework.response import Response
+from ppbudget.conditional import conditional_list
+from ppbudget.params import date_param, bool_param
+from authentication.models import ChangeMarker
+from categories.models import Category
+from events.recurrence import projected_totals
+from reports.models import MonthlyTotal, month_of, next_month
+from reports.rollups import category_rollups
+from reports.serializers import MonthlyTotalSerializer, CategoryRollupSerializer
+from reports.permissions import IsReportsOwner
+
+
+class UserReportsViewSet(viewsets.ViewSet):
+    queryset = MonthlyTotalSerializer.setup_eager_loading(MonthlyTotal.objects.all())
+    serializer_class = MonthlyTotalSerializer
+
+    def get_permissions(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return permissions.IsAuthenticated(), IsReportsOwner(),
+
+    @list_route(methods=['get'])
+    @conditional_list(ChangeMarker.EVENTS, ChangeMarker.CATEGORIES)
+    def monthly(self, request, user_username=None):
+        """
+        Totals of the operation flows per month, category and event type, optionally limited to the months
+        between `from` and `to` (inclusive, YYYY-MM-DD). `?projected=true` adds the occurrences of the recurring
+        events up to the month of `to` that are not stored yet.
+        """
+        queryset = self.queryset.filter(user__username=user_username).exclude(operations=0)
+
+        date_from, date_to = date_param(request, 'from'), date_param(request, 'to')
+        if date_from is not None:
+            queryset = queryset.filter(month__gte=month_of(date_from))
+        if date_to is not None:
+            queryset = queryset.filter(month__lte=month_of(date_to))
+
+        queryset = queryset.order_by('month', 'event_type', 'category__name', 'category_id')
+        if projected_param(request, date_to):
+            # whole months, like the stored totals
+            totals = with_projected(list(queryset), request.user.id, next_month(date_to) - timedelta(days=1),
+                                    None if date_from is None else month_of(date_from))
+        else:
+            totals = queryset
+        serializer = self.serializer_class(totals, many=True)
+
+        return Response(serializer.data)
+
+    @list_route(methods=['get'])
+    @conditional_list(ChangeMarker.EVENTS, ChangeMarker.CATEGORIES)
+    def categories(self, request, user_username=None):
+        """
+        Totals of every category between `from` and `to` (inclusive, YYYY-MM-DD), both of its own operations and
+        including all of its subcategories. Parents are listed before their children. `?projected=true` adds the
+        occurrences of the recurring events up to `to` that are not stored yet.
+        """
+        categories = list(Category.objects.filter(user=request.user).order_by('-root_node', 'event_type', 'name')
+                          .only('id', 'parent_id', 'name', 'event_type'))
+        date_to = date_param(request, 'to')
+        rollups = category_rollups(categories, request.user.id, date_param(request, 'from'), date_to,
+                                   projected_param(request, date_to))
+
+        serializer = CategoryRollupSerializer([{
+            'category': category.id, 'category_name': category.name, 'parent': category.parent_id,
+            'event_type': category.event_type, 'total': total, 'operations': operations,
+            'subtree_total': subtree_total, 'subtree_operations': subtree_operations
+        } for category, (total, operations), (subtree_total, subtree_operations) in rollups], many=True)
+
+        return Response(serializer.data)
+
+
+def projected_param(request, date_to):
+    projected = bool_param(request, 'projected')
+    if projected and date_to is None:
+        raise exceptions.ParseError('to is required with projected.')
+    return projected
+
+
+def with_projected(totals, user_id, date_to, date_from=None):
+    """
+    Adds the projected totals of the recurring events to the MonthlyTotal rows, in their order.
+    """
+    rows = {(total.month, total.category_id, total.event_type): total for total in totals}
+    projected = projected_totals(user_id, date_to, date_from)
+    categories = Category.objects.in_bulk({category_id for _, category_id, _ in projected})
+    for (month, category_id, event_type), (total, operations) in projected.items():
+        row = rows.get((month, category_id, event_type))
+        if row is None:
+            row = rows[(month, category_id, event_type)] = MonthlyTotal(
+                user_id=user_id, month=month, category=categories[category_id], event_type=event_type)
+        row.total += total
+        row.operations += operations
+    return sorted(rows.values(), key=lambda row: (row.month, row.event_type, row.category.name, row.category_id))
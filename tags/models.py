@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from authentication.models import ChangeMarker
 
 
 class Tag(models.Model):
@@ -14,3 +17,10 @@ class Tag(models.Model):
 
     class Meta:
         unique_together = ('user', 'name')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tag_markers(sender, instance, using, **kwargs):
+    # events nest their tags
+    ChangeMarker.objects.bump(instance.user_id, (ChangeMarker.TAGS, ChangeMarker.EVENTS), using=using)
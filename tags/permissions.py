@@ -5,7 +5,7 @@ from tags.models import Tag
 class IsTagOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, tag: Tag):
         if request.user:
-            return tag.user == request.user
+            return tag.user_id == request.user.id
         return False
 
 
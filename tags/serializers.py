@@ -1,11 +1,19 @@
 from rest_framework import serializers
+from ppbudget.fieldsets import FULL, SparseFieldsetMixin
 from authentication.serializers import UserSerializer
 from tags.models import Tag
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True, required=False, default=serializers.CurrentUserDefault())
 
+    @staticmethod
+    def setup_eager_loading(queryset, fieldset=FULL, prefix=''):
+        if fieldset.expands('user'):
+            queryset = UserSerializer.setup_eager_loading(queryset.select_related(prefix + 'user'),
+                                                          fieldset.child('user'), prefix + 'user__')
+        return queryset
+
     class Meta:
         model = Tag
         fields = ('id', 'user', 'name', 'created_at', 'updated_at')
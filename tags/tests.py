@@ -76,9 +76,11 @@ class TagTestCase(APITestCase):
 
         # test view and serializer
         self.assertEquals(response.status_code, status.HTTP_200_OK)
-        self.assertEquals(len(response.data), 1)
-        self.assertEquals(response.data[0]['user']['username'], 'test_user_1')
-        self.assertEquals(response.data[0]['name'], 'test_tag_1')
+        self.assertEquals(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+        self.assertEquals(response.data['results'][0]['user']['username'], 'test_user_1')
+        self.assertEquals(response.data['results'][0]['name'], 'test_tag_1')
 
     def test_post_tag_no_auth(self):
         url = '/api/v1/tags/'
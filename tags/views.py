@@ -1,11 +1,14 @@
 from rest_framework import permissions, viewsets
+from ppbudget.conditional import conditional_list
+from ppbudget.fieldsets import SparseFieldsetViewMixin, fieldset_param
+from ppbudget.pagination import KeysetPagination
+from authentication.models import ChangeMarker
 from tags.models import Tag
 from tags.serializers import TagSerializer
 from tags.permissions import IsTagOwner, IsTagsOwner
-from rest_framework.response import Response
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.order_by('name')
     serializer_class = TagSerializer
 
@@ -26,14 +29,20 @@ class TagViewSet(viewsets.ModelViewSet):
 
 
 class UserTagsViewSet(viewsets.ViewSet):
-    queryset = Tag.objects.select_related('user').all()
+    queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
         if self.request.method in permissions.SAFE_METHODS:
             return permissions.IsAuthenticated(), IsTagsOwner(),
 
+    @conditional_list(ChangeMarker.TAGS, cache=True)
     def list(self, request, user_username=None):
-        queryset = self.queryset.filter(user__username=user_username)
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        fieldset = fieldset_param(request)
+        queryset = self.serializer_class.setup_eager_loading(self.queryset, fieldset) \
+            .filter(user__username=user_username).order_by('name', 'id')
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.serializer_class(page, many=True, fieldset=fieldset)
+        return paginator.get_paginated_response(serializer.data)